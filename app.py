@@ -1,7 +1,8 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
 from config import Config
-from extensions import db, migrate, jwt
+from extensions import db, migrate, jwt, notification_hub, activity_buffer, http_client, password_hasher, token_blocklist, account_purger, notification_broadcaster
+from utils import user_cache
 from datetime import timedelta
 
 def create_app(config_class=Config):
@@ -13,9 +14,16 @@ def create_app(config_class=Config):
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
+    notification_hub.init_app(app)
+    activity_buffer.init_app(app)
+    http_client.init_app(app)
+    password_hasher.init_app(app)
+    token_blocklist.init_app(app, jwt)
+    account_purger.init_app(app)
+    notification_broadcaster.init_app(app)
+    user_cache.init_app(app)
 
     # Enable CORS
-    app.config["DEBUG"] = True  # o usa app.debug directamente
     app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(minutes=15)
     app.config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(days=7)
 
@@ -45,6 +53,10 @@ def create_app(config_class=Config):
     app.register_blueprint(news_bp, url_prefix="/news")
     app.register_blueprint(activity_bp, url_prefix="/activity")
 
+    # Las dependencias del análisis de ledger se cargan en el primer uso salvo que se pida precargarlas
+    from routes.ledger_analysis import warm_up_ledger
+    warm_up_ledger(app)
+
     return app
 
 
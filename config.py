@@ -13,9 +13,35 @@ class Config:
         os.environ.get("JWT_SECRET_KEY") or "jwt-secret-key-change-in-production"
     )
     PORT = int(os.environ.get("PORT", 5000))
+    # Debug only for development (flask run --debug sets FLASK_DEBUG); also opens CORS to any origin
+    DEBUG = os.environ.get("FLASK_DEBUG", "false").lower() in ("1", "true")
+    # Preload ledger_cli/matplotlib: off (first use), eager (at startup) or background (thread per worker)
+    LEDGER_WARMUP = os.environ.get("LEDGER_WARMUP", "off").lower()
 
     # Security configuration
     BCRYPT_LOG_ROUNDS = int(os.environ.get("BCRYPT_LOG_ROUNDS", 12))
+    # Password hashing pool (0 = automatic); requests beyond MAX_PENDING get 503
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 0))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 0))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 10))
+    # Revoked JWT store: per-process Bloom filter synced from revoked_tokens
+    TOKEN_BLOCKLIST_CAPACITY = int(os.environ.get("TOKEN_BLOCKLIST_CAPACITY", 100000))
+    TOKEN_BLOCKLIST_ERROR_RATE = float(os.environ.get("TOKEN_BLOCKLIST_ERROR_RATE", 0.001))
+    TOKEN_BLOCKLIST_SYNC_INTERVAL = int(os.environ.get("TOKEN_BLOCKLIST_SYNC_INTERVAL", 10))
+    TOKEN_BLOCKLIST_REBUILD_INTERVAL = int(os.environ.get("TOKEN_BLOCKLIST_REBUILD_INTERVAL", 3600))
+    # Background purge of deleted accounts (batched deletes per table)
+    USER_PURGE_ENABLED = os.environ.get("USER_PURGE_ENABLED", "true").lower() == "true"
+    USER_PURGE_BATCH_SIZE = int(os.environ.get("USER_PURGE_BATCH_SIZE", 1000))
+    USER_PURGE_BATCH_PAUSE = float(os.environ.get("USER_PURGE_BATCH_PAUSE", 0.05))
+    USER_PURGE_STALE_AFTER = int(os.environ.get("USER_PURGE_STALE_AFTER", 300))
+    # Per-process cache of user profiles (current user lookups)
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 60))
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get("USER_CACHE_MAX_ENTRIES", 10000))
+    # Admin bulk user import (POST /users/bulk). Each password is a bcrypt hash (~0.4 s of CPU
+    # at 12 rounds); the whole batch must hash within USERS_BULK_HASH_TIMEOUT (below WEB_TIMEOUT)
+    USERS_BULK_MAX_ITEMS = int(os.environ.get("USERS_BULK_MAX_ITEMS", 50))
+    USERS_BULK_HASH_TIMEOUT = float(os.environ.get("USERS_BULK_HASH_TIMEOUT", 20))
+    USERS_BULK_BATCH_SIZE = int(os.environ.get("USERS_BULK_BATCH_SIZE", 500))
 
     # Database configuration
     SQLALCHEMY_DATABASE_URI = (
@@ -29,8 +55,69 @@ class Config:
     SQLALCHEMY_ENGINE_OPTIONS = {
         "pool_pre_ping": True,
         "pool_recycle": 300,
+        # Naive datetimes are UTC (datetime.utcnow); pin the session so timestamptz conversions match
+        "connect_args": {"options": "-c timezone=UTC"},
     }
 
+    # Notification stream (SSE) configuration
+    NOTIFICATIONS_PG_NOTIFY = os.environ.get("NOTIFICATIONS_PG_NOTIFY", "true").lower() == "true"
+    NOTIFICATIONS_PG_CHANNEL = os.environ.get("NOTIFICATIONS_PG_CHANNEL", "ledgerflow_notifications")
+    NOTIFICATIONS_STREAM_KEEPALIVE = int(os.environ.get("NOTIFICATIONS_STREAM_KEEPALIVE", 15))
+    NOTIFICATIONS_STREAM_QUEUE_SIZE = int(os.environ.get("NOTIFICATIONS_STREAM_QUEUE_SIZE", 100))
+    # Open streams per worker process (0 = unlimited); each holds a gthread thread, so by
+    # default up to 8 threads (half of WEB_THREADS when smaller) stay free for normal requests
+    NOTIFICATIONS_STREAM_MAX_PER_WORKER = int(os.environ.get(
+        "NOTIFICATIONS_STREAM_MAX_PER_WORKER",
+        max(1, int(os.environ.get("WEB_THREADS", 8)) - min(8, int(os.environ.get("WEB_THREADS", 8)) // 2)),
+    ))
+    # Lifetime (seconds) of the single-use ticket that opens a stream
+    NOTIFICATIONS_STREAM_TICKET_TTL = int(os.environ.get("NOTIFICATIONS_STREAM_TICKET_TTL", 30))
+
+    # Background fan-out of broadcasts (flask notifications run-broadcasts)
+    NOTIFICATIONS_BROADCAST_ENABLED = os.environ.get("NOTIFICATIONS_BROADCAST_ENABLED", "true").lower() == "true"
+    NOTIFICATIONS_BROADCAST_BATCH_SIZE = int(os.environ.get("NOTIFICATIONS_BROADCAST_BATCH_SIZE", 5000))
+    NOTIFICATIONS_BROADCAST_STALE_AFTER = int(os.environ.get("NOTIFICATIONS_BROADCAST_STALE_AFTER", 300))
+
+    # Notification retention (flask notifications retention)
+    NOTIFICATIONS_RETENTION_DAYS = int(os.environ.get("NOTIFICATIONS_RETENTION_DAYS", 90))
+    NOTIFICATIONS_RETENTION_BATCH_SIZE = int(os.environ.get("NOTIFICATIONS_RETENTION_BATCH_SIZE", 1000))
+    NOTIFICATIONS_RETENTION_MODE = os.environ.get("NOTIFICATIONS_RETENTION_MODE", "archive")  # archive, delete
+    NOTIFICATIONS_PARTITION_MONTHS_AHEAD = int(os.environ.get("NOTIFICATIONS_PARTITION_MONTHS_AHEAD", 3))
+    # Max wait (ms) for the parent table lock when creating or detaching a partition; retried later on timeout
+    NOTIFICATIONS_PARTITION_LOCK_TIMEOUT_MS = int(os.environ.get("NOTIFICATIONS_PARTITION_LOCK_TIMEOUT_MS", 1000))
+
+    # User activity ingestion buffer
+    ACTIVITY_BUFFER_ENABLED = os.environ.get("ACTIVITY_BUFFER_ENABLED", "true").lower() == "true"
+    ACTIVITY_BUFFER_MAX_SIZE = int(os.environ.get("ACTIVITY_BUFFER_MAX_SIZE", 10000))
+    ACTIVITY_BUFFER_BATCH_SIZE = int(os.environ.get("ACTIVITY_BUFFER_BATCH_SIZE", 500))
+    ACTIVITY_BUFFER_FLUSH_INTERVAL = float(os.environ.get("ACTIVITY_BUFFER_FLUSH_INTERVAL", 2.0))
+    ACTIVITY_EXPORT_BATCH_SIZE = int(os.environ.get("ACTIVITY_EXPORT_BATCH_SIZE", 1000))
+    ACTIVITY_PARTITION_MONTHS_AHEAD = int(os.environ.get("ACTIVITY_PARTITION_MONTHS_AHEAD", 3))  # flask activity partitions
+    # Max wait (ms) for the user_activity lock when creating a partition; retried later on timeout
+    ACTIVITY_PARTITION_LOCK_TIMEOUT_MS = int(os.environ.get("ACTIVITY_PARTITION_LOCK_TIMEOUT_MS", 1000))
+
+    # Currency rates cache (seconds)
+    CURRENCY_RATES_TTL = int(os.environ.get("CURRENCY_RATES_TTL", 300))
+    CURRENCY_RATES_STALE_TTL = int(os.environ.get("CURRENCY_RATES_STALE_TTL", 3600))  # served while refreshing
+    CURRENCY_BATCH_MAX_ITEMS = int(os.environ.get("CURRENCY_BATCH_MAX_ITEMS", 10000))
+
+    # News cache (seconds); every category is prefetched in the background
+    NEWS_CACHE_TTL = int(os.environ.get("NEWS_CACHE_TTL", 300))
+    NEWS_CACHE_STALE_TTL = int(os.environ.get("NEWS_CACHE_STALE_TTL", 3600))
+    NEWS_PREFETCH_COUNT = int(os.environ.get("NEWS_PREFETCH_COUNT", 50))
+    NEWS_REFRESH_ENABLED = os.environ.get("NEWS_REFRESH_ENABLED", "true").lower() == "true"
+    NEWS_REFRESH_INTERVAL = int(os.environ.get("NEWS_REFRESH_INTERVAL", 240))
+
+    # External service status probes (seconds); skipped for providers with recent real calls
+    SERVICE_STATUS_PROBE_INTERVAL = int(os.environ.get("SERVICE_STATUS_PROBE_INTERVAL", 300))
+
+    # External API HTTP client (seconds)
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 2.0))
+    HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 5.0))
+    HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 20))
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_BREAKER_FAILURE_THRESHOLD", 3))
+    CIRCUIT_BREAKER_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_BREAKER_RESET_TIMEOUT", 30))
+
     # API Keys for external services
     FREE_CURRENCY_API_KEY = os.environ.get("FREE_CURRENCY_API_KEY")
     BING_NEWS_API_KEY = os.environ.get("BING_NEWS_API_KEY")
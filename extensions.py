@@ -1,6 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
+from utils.notification_hub import NotificationHub
+from utils.activity_buffer import ActivityBuffer
+from utils.http_client import HttpClient
+from utils.password_hasher import PasswordHasher
+from utils.token_blocklist import TokenBlocklist
+from utils.account_purger import AccountPurger
+from utils.notification_broadcaster import NotificationBroadcaster
 
 # Initialize SQLAlchemy
 db = SQLAlchemy()
@@ -9,4 +16,25 @@ db = SQLAlchemy()
 migrate = Migrate()
 
 # Initialize JWT
-jwt = JWTManager() 
\ No newline at end of file
+jwt = JWTManager()
+
+# Initialize notification event hub (SSE)
+notification_hub = NotificationHub()
+
+# Initialize user activity ingestion buffer
+activity_buffer = ActivityBuffer()
+
+# Initialize pooled HTTP client for external APIs
+http_client = HttpClient()
+
+# Initialize bounded password hashing pool
+password_hasher = PasswordHasher()
+
+# Initialize revoked JWT store (Bloom filter over revoked_tokens)
+token_blocklist = TokenBlocklist()
+
+# Initialize background purge of deleted accounts
+account_purger = AccountPurger()
+
+# Initialize background fan-out of system notification broadcasts
+notification_broadcaster = NotificationBroadcaster()
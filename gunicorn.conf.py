@@ -0,0 +1,70 @@
+"""
+Configuración de gunicorn para producción
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Todos los valores se pueden ajustar con variables de entorno (ver env.example).
+
+Se usan workers gthread: cada stream SSE (/users/notifications/stream) ocupa
+un hilo mientras está abierto. Cada worker acepta como mucho
+NOTIFICATIONS_STREAM_MAX_PER_WORKER streams (por defecto WEB_THREADS menos
+min(8, WEB_THREADS / 2)) y responde 503 al resto, así los hilos restantes
+quedan siempre para las peticiones normales. Los hilos de los streams están
+casi siempre esperando en una cola, por eso el dockerfile usa WEB_THREADS=32.
+Con gthread el timeout sólo vigila que el worker siga vivo, no la duración
+de la petición, por lo que los streams largos no se cortan.
+
+Reinicio sin cortes: `kill -HUP <pid del master>` levanta workers nuevos y
+deja terminar a los anteriores (hasta WEB_GRACEFUL_TIMEOUT). Con
+WEB_PRELOAD=true los workers se crean desde el código cargado en el master;
+para desplegar código nuevo reinicie el contenedor o use USR2 + QUIT.
+"""
+import multiprocessing
+import os
+
+
+def _int(name, default):
+    return int(os.environ.get(name, default))
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 3000)}"
+
+worker_class = "gthread"
+workers = _int("WEB_CONCURRENCY", max(2, multiprocessing.cpu_count()))
+threads = _int("WEB_THREADS", 8)
+
+# Carga la app una vez en el master y la comparte entre workers (copy-on-write)
+preload_app = os.environ.get("WEB_PRELOAD", "true").lower() == "true"
+
+# Reciclar workers cada max_requests (con jitter para no reiniciarlos todos a la vez)
+max_requests = _int("WEB_MAX_REQUESTS", 1000)
+max_requests_jitter = _int("WEB_MAX_REQUESTS_JITTER", 100)
+
+timeout = _int("WEB_TIMEOUT", 30)
+graceful_timeout = _int("WEB_GRACEFUL_TIMEOUT", 30)
+keepalive = _int("WEB_KEEPALIVE", 5)
+
+# Heartbeat de los workers en memoria (evita bloqueos en discos lentos de contenedores)
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+accesslog = os.environ.get("WEB_ACCESS_LOG", "-") or None
+# Formato por defecto con la ruta sin query string (%(U)s en lugar de %(r)s): las URLs pueden llevar credenciales
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(m)s %(U)s %(H)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+errorlog = "-"
+loglevel = os.environ.get("WEB_LOG_LEVEL", "info")
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+def post_fork(server, worker):
+    # Las conexiones abiertas en el master no se comparten entre procesos
+    from extensions import db
+    from wsgi import app
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+    # Los hilos no sobreviven al fork: la precarga en segundo plano arranca en cada worker
+    if app.config.get("LEDGER_WARMUP") == "background":
+        from routes.ledger_analysis import start_ledger_warmup
+
+        start_ledger_warmup()
@@ -1,4 +1,9 @@
+import hashlib
+import json
+
 from ledger_cli import LedgerParser, LedgerAnalyst
+from hook.ledger_valuation import CurrencyValuation
+from utils.cache import TTLCache
 
 default_opts = {
     "taxes": {
@@ -7,6 +12,50 @@ default_opts = {
     },
 }
 
+DEFAULT_PARENT_ACCOUNTS = {
+    "Assets": "Assets",
+    "Liabilities": "Liabilities",
+    "Equity": "Equity",
+    "Income": "Income",
+    "Expenses": "Expenses",
+}
+
+# Resultados de parseo por (contenido, cuentas padre, opts); las analíticas de un
+# mismo archivo reutilizan el parseo en lugar de repetirlo en cada llamada
+PARSE_CACHE_TTL = 300
+PARSE_CACHE_MAX_ENTRIES = 32
+_parse_cache = TTLCache(max_entries=PARSE_CACHE_MAX_ENTRIES)
+
+
+def custom_parent_accounts(parents_accounts: dict = None):
+    """
+    Cuentas padre configuradas por el usuario, o None si usa las de por defecto
+
+    Con None el parser detecta las cuentas padre del propio archivo. Las claves
+    que falten se completan con los valores por defecto.
+    """
+    if not isinstance(parents_accounts, dict):
+        return None
+    merged = dict(DEFAULT_PARENT_ACCOUNTS)
+    for key, value in parents_accounts.items():
+        if key in merged and isinstance(value, str) and value.strip():
+            merged[key] = value.strip()
+    return None if merged == DEFAULT_PARENT_ACCOUNTS else merged
+
+
+def parse_cache_key(file, file_accounts, opts, parents_accounts):
+    """Clave del caché de parseo, o None si las entradas no son texto (p. ej. archivos abiertos)"""
+    if not isinstance(file, str) or not isinstance(file_accounts, (str, type(None))):
+        return None
+    digest = hashlib.sha256(file.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update((file_accounts or "").encode("utf-8"))
+    return (
+        digest.hexdigest(),
+        json.dumps(opts, sort_keys=True, default=str),
+        tuple(sorted(parents_accounts.items())) if parents_accounts else None,
+    )
+
 
 def normalize_taxes(metadata: dict, opts: dict) -> dict:
     taxes_opt = opts.get("taxes")
@@ -34,10 +83,47 @@ def normalize_taxes(metadata: dict, opts: dict) -> dict:
 
 
 def parse_ledger(
-    file: str = None, file_accounts: str = None, opts: dict = default_opts
+    file: str = None,
+    file_accounts: str = None,
+    opts: dict = default_opts,
+    valuation: CurrencyValuation = None,
+    parents_accounts: dict = None,
 ):
-    """Parsea un archivo de ledger y devuelve un diccionario con los datos o None si fallan."""
+    """
+    Parsea un archivo de ledger y devuelve un diccionario con los datos o None si fallan.
+
+    Con parents_accounts (las cuentas padre de las configuraciones del usuario)
+    se usan esas en lugar de detectarlas del archivo. Con valuation, las
+    transacciones resueltas se convierten a su moneda de reporte.
+
+    El resultado del parseo se cachea por contenido, cuentas padre y opts; la
+    valoración se aplica sobre una copia en cada llamada.
+    """
+
+    parents_accounts = custom_parent_accounts(parents_accounts)
+    key = parse_cache_key(file, file_accounts, opts, parents_accounts)
+    if key is None:
+        result = _parse_ledger(file, file_accounts, opts, parents_accounts)
+    else:
+        result = _parse_cache.get(
+            key,
+            lambda: _parse_ledger(file, file_accounts, opts, parents_accounts),
+            ttl=PARSE_CACHE_TTL,
+            cacheable=lambda parsed: parsed[0] is not None,
+        )
 
+    result = list(result)
+    metadata, transactions_resolved = result[5], result[7]
+    try:
+        if valuation is not None and transactions_resolved:
+            result[7] = valuation.convert(transactions_resolved, metadata)
+    except Exception as e:
+        print(f"[ERROR] currency valuation failed: {e}")
+
+    return tuple(result)
+
+
+def _parse_ledger(file, file_accounts, opts, parents_accounts):
     ledger = None
     ledger_document = None
     transactions = None
@@ -51,17 +137,11 @@ def parse_ledger(
         ledger = LedgerParser(
             file=file,
             file_accounts=file_accounts,
-            parents_accounts={
-                "Assets": "Assets",
-                "Liabilities": "Liabilities",
-                "Equity": "Equity",
-                "Income": "Income",
-                "Expenses": "Expenses",
-            },
+            parents_accounts=dict(parents_accounts or DEFAULT_PARENT_ACCOUNTS),
         )
     except Exception as e:
         print(f"[ERROR] ledger instantiation failed: {e}")
-        return None, None, None, None, None, None, None
+        return None, None, None, None, None, None, None, None
 
     try:
         transactions = ledger.parse_transactions()
@@ -89,7 +169,10 @@ def parse_ledger(
         print(f"[ERROR] parse_metadata_yaml failed: {e}")
 
     try:
-        parents = ledger.detected_parents_accounts()
+        if parents_accounts:
+            parents = dict(parents_accounts)
+        else:
+            parents = ledger.detected_parents_accounts()
     except Exception as e:
         print(f"[ERROR] detected_parents_accounts failed: {e}")
 
@@ -126,7 +209,11 @@ def parse_ledger(
 
 
 def calculates_ledger(
-    file: str = None, file_accounts: str = None, opts: dict = default_opts
+    file: str = None,
+    file_accounts: str = None,
+    opts: dict = default_opts,
+    valuation: CurrencyValuation = None,
+    parents_accounts: dict = None,
 ):
     """Calcula los balances de un archivo de ledger"""
 
@@ -138,7 +225,7 @@ def calculates_ledger(
 
     try:
         ledger, _, _, accounts, _, _, _, transactions_resolved = parse_ledger(
-            file, file_accounts, opts
+            file, file_accounts, opts, valuation, parents_accounts
         )
     except Exception as e:
         print(f"[ERROR] parse_ledger failed: {e}")
@@ -198,7 +285,11 @@ def calculates_ledger(
 
 
 def analyze_ledger(
-    file: str = None, file_accounts: str = None, opts: dict = default_opts
+    file: str = None,
+    file_accounts: str = None,
+    opts: dict = default_opts,
+    valuation: CurrencyValuation = None,
+    parents_accounts: dict = None,
 ):
     """Analiza un archivo de ledger"""
 
@@ -225,7 +316,7 @@ def analyze_ledger(
 
     try:
         _, _, _, accounts, _, _, parents, transactions_resolved = parse_ledger(
-            file, file_accounts, opts
+            file, file_accounts, opts, valuation, parents_accounts
         )
     except Exception as e:
         print(f"[ERROR] parse_ledger failed: {e}")
@@ -331,20 +422,22 @@ def analyze_ledger_compare(
     month1: str = None,
     month2: str = None,
     opts: dict = default_opts,
+    parents_accounts: dict = None,
 ):
     """Analiza un archivo de ledger"""
 
-    _, _, _, accounts, _, _, _, transactions_resolved = parse_ledger(
-        file, file_accounts, opts
+    _, _, _, accounts, _, _, parents, transactions_resolved = parse_ledger(
+        file, file_accounts, opts, parents_accounts=parents_accounts
     )
+    parents = parents or DEFAULT_PARENT_ACCOUNTS
 
     analyze_ledger = LedgerAnalyst(
         transactions=transactions_resolved,
         accounts=accounts,
-        income_parents=("Income", "Income"),
-        expense_parents=["Expenses", "Expenses"],
-        asset_parents={"Assets", "Assets"},
-        liability_parents=("Liabilities", "Liabilities"),
+        income_parents=(parents["Income"], "Income"),
+        expense_parents=[parents["Expenses"], "Expenses"],
+        asset_parents={parents["Assets"], "Assets"},
+        liability_parents=(parents["Liabilities"], "Liabilities"),
     )
 
     compare_result = analyze_ledger.compare_months(month1=month1, month2=month2)
@@ -352,21 +445,26 @@ def analyze_ledger_compare(
 
 
 def analyze_ledger_alerts(
-    file=None, file_accounts=None, threshold=1.5, opts: dict = default_opts
+    file=None,
+    file_accounts=None,
+    threshold=1.5,
+    opts: dict = default_opts,
+    parents_accounts: dict = None,
 ):
     """Analiza un archivo de ledger"""
 
-    _, _, _, accounts, _, _, _, transactions_resolved = parse_ledger(
-        file, file_accounts, opts
+    _, _, _, accounts, _, _, parents, transactions_resolved = parse_ledger(
+        file, file_accounts, opts, parents_accounts=parents_accounts
     )
+    parents = parents or DEFAULT_PARENT_ACCOUNTS
 
     analyze_ledger = LedgerAnalyst(
         transactions=transactions_resolved,
         accounts=accounts,
-        income_parents=("Income", "Income"),
-        expense_parents=["Expenses", "Expenses"],
-        asset_parents={"Assets", "Assets"},
-        liability_parents=("Liabilities", "Liabilities"),
+        income_parents=(parents["Income"], "Income"),
+        expense_parents=[parents["Expenses"], "Expenses"],
+        asset_parents={parents["Assets"], "Assets"},
+        liability_parents=(parents["Liabilities"], "Liabilities"),
     )
 
     alerts = analyze_ledger.detect_unusual_expenses(threshold=threshold)
@@ -0,0 +1,181 @@
+import copy
+import re
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Unidades del parser que no identifican una moneda concreta
+GENERIC_UNITS = {"$", "N/A", ""}
+
+CURRENCY_PROPERTIES = ("currency", "commodity")
+
+_CURRENCY_CODE = re.compile(r"^[A-Z]{3}$")
+
+RateKey = Tuple[date, str]
+
+
+def is_currency_code(value) -> bool:
+    return isinstance(value, str) and bool(_CURRENCY_CODE.match(value.strip().upper()))
+
+
+def transaction_date(value: str) -> date:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        return datetime.strptime(value, "%Y/%m/%d").date()
+
+
+class CurrencyValuation:
+    """
+    Convierte los movimientos de un ledger a una moneda de reporte
+
+    La moneda de cada movimiento sale de la propiedad de la transacción
+    (-currency: EUR o -commodity: EUR), de su unidad si es un código ISO, de
+    la clave currency de los metadatos YAML o de default_currency, en ese
+    orden.
+
+    rates_provider recibe un conjunto de (fecha, moneda) y devuelve las tasas
+    USD->moneda vigentes en cada fecha. Se consulta una sola vez por
+    (fecha, moneda) durante la vida de la instancia, de modo que se puede
+    reutilizar entre parse_ledger y calculates_ledger. latest_rates, si se
+    indica, devuelve tasas USD->moneda actuales para los pares sin histórico.
+
+    postings_converted cuenta los movimientos distintos convertidos durante
+    la vida de la instancia: convertir de nuevo las mismas transacciones no
+    los cuenta dos veces.
+    """
+
+    def __init__(
+        self,
+        reporting_currency: str,
+        rates_provider: Callable[[Iterable[RateKey]], Dict[RateKey, float]],
+        default_currency: str = None,
+        latest_rates: Callable[[], Optional[Dict[str, float]]] = None,
+    ):
+        self.reporting_currency = reporting_currency.upper()
+        self.default_currency = default_currency.upper() if default_currency else None
+        self.rates_provider = rates_provider
+        self.latest_rates = latest_rates
+        self._rates: Dict[RateKey, float] = {}
+        self._estimated = set()
+        self._missing = set()
+        self._latest = None
+        # (posición de la transacción, posición del movimiento) ya convertidos
+        self._converted = set()
+
+    @property
+    def postings_converted(self) -> int:
+        return len(self._converted)
+
+    def posting_currency(self, transaction: dict, posting: dict, fallback: str) -> str:
+        for prop in transaction.get("properties") or []:
+            if prop.get("key", "").lower() in CURRENCY_PROPERTIES and is_currency_code(prop.get("value")):
+                return prop["value"].strip().upper()
+        unit = posting.get("unit")
+        if unit not in GENERIC_UNITS and is_currency_code(unit):
+            return unit.strip().upper()
+        return fallback
+
+    def convert(self, transactions: List[dict], metadata: dict = None) -> List[dict]:
+        """Retorna una copia de las transacciones con los importes en la moneda de reporte"""
+        if not transactions:
+            return transactions
+
+        fallback = self.default_currency
+        if not fallback and isinstance(metadata, dict) and is_currency_code(metadata.get("currency")):
+            fallback = metadata["currency"].strip().upper()
+        fallback = fallback or "USD"
+
+        converted = copy.deepcopy(transactions)
+        postings, locations, amounts, keys = [], [], [], []
+        for transaction_index, transaction in enumerate(converted):
+            try:
+                on = transaction_date(transaction["date"])
+            except (KeyError, ValueError):
+                continue
+            for posting_index, posting in enumerate(transaction.get("accounts") or []):
+                postings.append(posting)
+                locations.append((transaction_index, posting_index))
+                amounts.append(posting.get("amount") or 0.0)
+                keys.append((on, self.posting_currency(transaction, posting, fallback)))
+        if not postings:
+            return converted
+
+        # numpy se importa aquí y no al cargar el módulo: lo importan las rutas al arrancar la app
+        import numpy as np
+
+        # Un factor por (fecha, moneda) distinto; los movimientos sólo indexan el arreglo
+        unique_keys = list(dict.fromkeys(keys))
+        self._load_rates(unique_keys)
+        factors = np.array([self._factor(key) for key in unique_keys], dtype=float)
+        position = {key: index for index, key in enumerate(unique_keys)}
+        posting_factors = factors[[position[key] for key in keys]]
+        values = np.round(np.array(amounts, dtype=float) * posting_factors, 4)
+
+        for posting, location, key, factor, value in zip(
+            postings, locations, keys, posting_factors.tolist(), values.tolist()
+        ):
+            if np.isnan(factor):
+                # Sin tasa: el movimiento queda en su moneda original
+                posting["unit"] = key[1]
+                continue
+            posting["original_amount"] = posting.get("amount")
+            posting["original_currency"] = key[1]
+            posting["amount"] = value
+            posting["unit"] = self.reporting_currency
+            self._converted.add(location)
+
+        return converted
+
+    def summary(self) -> dict:
+        """Resumen de la valoración para incluir en la respuesta"""
+        return {
+            "reporting_currency": self.reporting_currency,
+            "postings_converted": self.postings_converted,
+            "rates_used": len(self._rates),
+            "estimated_with_latest_rates": [
+                {"date": on.isoformat(), "currency": code} for on, code in sorted(self._estimated)
+            ],
+            "missing_rates": [
+                {"date": on.isoformat(), "currency": code} for on, code in sorted(self._missing)
+            ],
+        }
+
+    def _load_rates(self, keys: List[RateKey]):
+        wanted = set()
+        for on, code in keys:
+            if code != self.reporting_currency:
+                wanted.add((on, code))
+                wanted.add((on, self.reporting_currency))
+        pending = [key for key in wanted if key not in self._rates and key not in self._missing]
+        if not pending:
+            return
+
+        found = self.rates_provider(pending)
+        for key in pending:
+            rate = found.get(key)
+            if rate is None:
+                rate = self._latest_rate(key[1])
+                if rate is not None:
+                    self._estimated.add(key)
+            if rate:
+                self._rates[key] = rate
+            else:
+                self._missing.add(key)
+
+    def _latest_rate(self, code: str) -> Optional[float]:
+        if self.latest_rates is None:
+            return None
+        if self._latest is None:
+            self._latest = self.latest_rates() or {}
+        return self._latest.get(code)
+
+    def _factor(self, key: RateKey) -> float:
+        on, code = key
+        if code == self.reporting_currency:
+            return 1.0
+        source_rate = self._rates.get(key)
+        target_rate = self._rates.get((on, self.reporting_currency))
+        if not source_rate or not target_rate:
+            self._missing.add(key if not source_rate else (on, self.reporting_currency))
+            return float("nan")
+        return target_rate / source_rate
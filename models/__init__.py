@@ -2,8 +2,12 @@
 from .user import User
 from .file import File
 from .user_settings import UserSettings
-from .notification import Notification, NotificationImportance
-from .user_activity import UserActivity
+from .notification import Notification, NotificationImportance, NotificationCounter, NotificationArchive
+from .user_activity import UserActivity, UserActivityRollup
+from .exchange_rate import ExchangeRate
+from .revoked_token import RevokedToken
+from .account_deletion import AccountDeletion
+from .notification_broadcast import NotificationBroadcast
 
 __all__ = [
     "User",
@@ -11,5 +15,12 @@ __all__ = [
     "UserSettings",
     "Notification",
     "NotificationImportance",
+    "NotificationCounter",
+    "NotificationArchive",
     "UserActivity",
+    "UserActivityRollup",
+    "ExchangeRate",
+    "RevokedToken",
+    "AccountDeletion",
+    "NotificationBroadcast",
 ]
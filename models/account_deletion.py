@@ -0,0 +1,43 @@
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import UUID
+from extensions import db
+
+
+class AccountDeletion(db.Model):
+    """Borrado de cuenta en curso: el usuario ya está marcado y sus datos se purgan por lotes
+
+    No tiene clave foránea a users porque sobrevive al borrado del usuario
+    como registro del proceso.
+    """
+
+    __tablename__ = "account_deletions"
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    user_id = db.Column(UUID(as_uuid=True), primary_key=True)
+    status = db.Column(db.String(20), default=STATUS_PENDING, nullable=False, index=True)
+    # Filas eliminadas por tabla: {"user_activity": 1200, "notifications": 35, ...}
+    progress = db.Column(db.JSON, default=dict, nullable=False)
+    current_step = db.Column(db.String(50), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    requested_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Se actualiza en cada lote; un proceso puede retomar el borrado si deja de avanzar
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "user_id": str(self.user_id),
+            "status": self.status,
+            "progress": self.progress or {},
+            "current_step": self.current_step,
+            "error": self.error,
+            "requested_at": self.requested_at.isoformat() if self.requested_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f"<AccountDeletion {self.user_id} - {self.status}>"
@@ -0,0 +1,133 @@
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import String, column, func, select, true, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from extensions import db
+
+
+class ExchangeRate(db.Model):
+    """Tasa de cambio histórica: 1 unidad de base equivale a rate unidades de quote en rate_date"""
+
+    __tablename__ = "exchange_rates"
+
+    # Orden de la clave pensado para la búsqueda "a fecha": (base, quote) fijos y rate_date descendente
+    base = db.Column(db.String(10), primary_key=True)
+    quote = db.Column(db.String(10), primary_key=True)
+    rate_date = db.Column(db.Date, primary_key=True)
+    rate = db.Column(db.Numeric(24, 12, asdecimal=False), nullable=False)
+    source = db.Column(db.String(50), nullable=True)
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            "base": self.base,
+            "quote": self.quote,
+            "date": self.rate_date.isoformat(),
+            "rate": self.rate,
+            "source": self.source,
+        }
+
+    @classmethod
+    def bulk_upsert(cls, rows: Iterable[Dict[str, Any]], batch_size: int = 1000) -> int:
+        """
+        Inserta o actualiza tasas en lotes (INSERT ... ON CONFLICT) dentro de la transacción actual
+
+        Cada fila necesita base, quote, rate_date y rate; source es opcional.
+
+        Returns:
+            Número de filas escritas
+        """
+        fetched_at = datetime.utcnow()
+        total = 0
+        batch = []
+
+        def write(values):
+            stmt = pg_insert(cls.__table__).values(values)
+            db.session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[cls.base, cls.quote, cls.rate_date],
+                    set_={
+                        "rate": stmt.excluded.rate,
+                        "source": stmt.excluded.source,
+                        "fetched_at": stmt.excluded.fetched_at,
+                    },
+                )
+            )
+
+        for row in rows:
+            batch.append({
+                "base": row["base"].upper(),
+                "quote": row["quote"].upper(),
+                "rate_date": row["rate_date"],
+                "rate": row["rate"],
+                "source": row.get("source"),
+                "fetched_at": fetched_at,
+            })
+            if len(batch) >= batch_size:
+                write(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            write(batch)
+            total += len(batch)
+        return total
+
+    @classmethod
+    def latest_date(cls, base: str) -> Optional[date]:
+        """Última fecha almacenada para la moneda base"""
+        return db.session.execute(
+            select(func.max(cls.rate_date)).where(cls.base == base.upper())
+        ).scalar()
+
+    @classmethod
+    def as_of(cls, base: str, quote: str, on: date) -> Optional["ExchangeRate"]:
+        """Tasa vigente en la fecha: la más reciente con rate_date <= on"""
+        return db.session.execute(
+            select(cls)
+            .where(cls.base == base.upper(), cls.quote == quote.upper(), cls.rate_date <= on)
+            .order_by(cls.rate_date.desc())
+            .limit(1)
+        ).scalar_one_or_none()
+
+    @classmethod
+    def snapshot_as_of(cls, base: str, on: date, quotes: List[str] = None) -> Dict[str, Tuple[float, date]]:
+        """
+        Todas las tasas de la base vigentes en la fecha
+
+        Cada quote se resuelve con un LATERAL (ORDER BY rate_date DESC LIMIT 1),
+        es decir, una sola búsqueda en la clave primaria (base, quote,
+        rate_date) en lugar de recorrer todo el histórico de la base. Sin lista
+        de quotes, las distintas se enumeran con un CTE recursivo que salta de
+        una a la siguiente por el índice (Postgres no tiene skip scan).
+
+        Returns:
+            {quote: (rate, rate_date)}
+        """
+        base = base.upper()
+        if quotes:
+            quote_list = values(column("quote", String), name="quotes").data(
+                [(quote,) for quote in {quote.upper() for quote in quotes}]
+            )
+        else:
+            quote_list = (
+                select(func.min(cls.quote).label("quote")).where(cls.base == base).cte("quotes", recursive=True)
+            )
+            quote_list = quote_list.union_all(
+                select(
+                    select(func.min(cls.quote))
+                    .where(cls.base == base, cls.quote > quote_list.c.quote)
+                    .scalar_subquery()
+                ).where(quote_list.c.quote.isnot(None))
+            )
+
+        latest = (
+            select(cls.rate, cls.rate_date)
+            .where(cls.base == base, cls.quote == quote_list.c.quote, cls.rate_date <= on)
+            .order_by(cls.rate_date.desc())
+            .limit(1)
+            .lateral("latest")
+        )
+        stmt = select(quote_list.c.quote, latest.c.rate, latest.c.rate_date).select_from(
+            quote_list.join(latest, true())
+        )
+        return {quote: (rate, rate_date) for quote, rate, rate_date in db.session.execute(stmt)}
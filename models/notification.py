@@ -1,9 +1,11 @@
-from sqlalchemy import Column, String, Boolean, DateTime, Text, ForeignKey, Enum
-from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Boolean, Integer, DateTime, Text, ForeignKey, Enum, Index, delete, event, func, inspect, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import relationship, object_session
+from sqlalchemy.dialects.postgresql import UUID, insert as pg_insert
 import uuid
 from datetime import datetime
-from extensions import db
+from extensions import db, notification_hub
+from utils.partitions import add_default_partition
 import enum
 
 
@@ -17,6 +19,12 @@ class NotificationImportance(enum.Enum):
 
 class Notification(db.Model):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        # Cubre el listado por usuario/estado ordenado por fecha y el conteo de no leídas
+        Index('ix_notifications_user_read_created', 'user_id', 'is_read', 'created_at'),
+        # Particionada por mes en Postgres (ver utils.partitions)
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
@@ -30,7 +38,8 @@ class Notification(db.Model):
     importance = Column(Enum(NotificationImportance), default=NotificationImportance.NORMAL, nullable=False)
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Forma parte de la clave primaria porque es la clave de partición
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, primary_key=True)
     read_at = Column(DateTime, nullable=True)  # Null por defecto ya que no se ha leído
     
     # Relationships
@@ -39,6 +48,18 @@ class Notification(db.Model):
     def __repr__(self):
         return f'<Notification {self.id} - {self.title}>'
     
+    def to_dict(self):
+        """Convierte la notificación a diccionario (sin contenido, para eventos en tiempo real)"""
+        return {
+            'id': str(self.id),
+            'user_id': str(self.user_id),
+            'title': self.title,
+            'is_read': self.is_read,
+            'importance': self.importance.value if self.importance else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'read_at': self.read_at.isoformat() if self.read_at else None
+        }
+    
     def mark_as_read(self):
         """Marca la notificación como leída"""
         if not self.is_read:
@@ -48,4 +69,301 @@ class Notification(db.Model):
     def mark_as_unread(self):
         """Marca la notificación como no leída"""
         self.is_read = False
-        self.read_at = None 
\ No newline at end of file
+        self.read_at = None 
+
+    @staticmethod
+    def broadcast_id(batch_id, user_id) -> uuid.UUID:
+        """Id de la notificación de un usuario dentro de una difusión, derivable sin consultar la base de datos"""
+        return uuid.uuid5(uuid.UUID(str(batch_id)), str(user_id))
+
+    @classmethod
+    def bulk_create(cls, user_ids, title, content, importance=NotificationImportance.NORMAL, batch_id=None, created_at=None):
+        """
+        Crea la misma notificación para varios usuarios con INSERT multi-fila y retorna cuántas se crearon
+
+        Emite un solo evento de difusión por llamada en lugar de uno por
+        destinatario: cada worker lo resuelve sólo para sus streams abiertos
+        (ver _resolve_broadcast), gracias a que el id de cada fila se deriva
+        del lote y del usuario. Con el mismo batch_id y created_at, repetir la
+        llamada no duplica filas ni incrementa dos veces los contadores.
+        """
+        if not user_ids:
+            return 0
+        
+        batch_id = batch_id or uuid.uuid4()
+        created_at = created_at or datetime.utcnow()
+        rows = [
+            {
+                'id': cls.broadcast_id(batch_id, user_id),
+                'user_id': user_id,
+                'title': title,
+                'content': content,
+                'is_read': False,
+                'importance': importance,
+                'created_at': created_at,
+            }
+            for user_id in user_ids
+        ]
+        # Core insert: evita instanciar objetos ORM y se envía en un solo INSERT multi-fila
+        inserted = db.session.execute(
+            pg_insert(cls.__table__).values(rows).on_conflict_do_nothing().returning(cls.user_id)
+        ).scalars().all()
+        if not inserted:
+            return 0
+        
+        db.session.execute(
+            NotificationCounter.__table__.update()
+            .where(NotificationCounter.user_id.in_(inserted))
+            .values(unread_count=NotificationCounter.unread_count + 1)
+        )
+        notification_hub.emit(
+            db.session, notification_hub.BROADCAST, 'broadcast',
+            {
+                'batch_id': str(batch_id),
+                'created_at': created_at.isoformat(),
+                # Rango de usuarios del lote: un mismo batch_id puede repartirse en varias llamadas
+                'user_range': [str(min(inserted)), str(max(inserted))],
+            }
+        )
+        return len(inserted)
+
+    @classmethod
+    def bulk_mark_as_read(cls, user_id, ids=None):
+        """Marca como leídas las notificaciones del usuario en un solo UPDATE y retorna cuántas cambiaron"""
+        query = cls.query.filter_by(user_id=user_id, is_read=False)
+        if ids is not None:
+            query = query.filter(cls.id.in_(ids))
+        updated = query.update(
+            {cls.is_read: True, cls.read_at: datetime.utcnow()},
+            synchronize_session=False,
+        )
+        # Se resta lo actualizado: fijar 0 borraría las notificaciones creadas mientras tanto
+        NotificationCounter.adjust(user_id, -updated)
+        return updated
+
+    @classmethod
+    def bulk_mark_as_unread(cls, user_id, ids=None):
+        """Marca como no leídas las notificaciones del usuario en un solo UPDATE y retorna cuántas cambiaron"""
+        query = cls.query.filter_by(user_id=user_id, is_read=True)
+        if ids is not None:
+            query = query.filter(cls.id.in_(ids))
+        updated = query.update(
+            {cls.is_read: False, cls.read_at: None},
+            synchronize_session=False,
+        )
+        NotificationCounter.adjust(user_id, updated)
+        return updated
+
+    @classmethod
+    def bulk_delete(cls, user_id, ids=None, is_read=None, importance=None, before=None):
+        """Elimina las notificaciones del usuario que cumplan los filtros en un solo DELETE"""
+        conditions = [cls.user_id == user_id]
+        if ids is not None:
+            conditions.append(cls.id.in_(ids))
+        if is_read is not None:
+            conditions.append(cls.is_read == is_read)
+        if importance is not None:
+            conditions.append(cls.importance == importance)
+        if before is not None:
+            conditions.append(cls.created_at < before)
+        
+        # RETURNING permite saber cuántas no leídas se borraron sin otra consulta
+        deleted = db.session.execute(
+            delete(cls).where(*conditions).returning(cls.is_read),
+            execution_options={'synchronize_session': False},
+        ).scalars().all()
+        NotificationCounter.adjust(user_id, -sum(1 for read in deleted if not read))
+        return len(deleted)
+
+
+add_default_partition(Notification.__table__)
+
+
+class NotificationArchive(db.Model):
+    """Notificaciones leídas antiguas movidas fuera de la tabla principal por el job de retención"""
+    __tablename__ = 'notifications_archive'
+    __table_args__ = (
+        Index('ix_notifications_archive_user_created', 'user_id', 'created_at'),
+    )
+    
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    title = Column(String(255), nullable=False)
+    content = Column(Text, nullable=False)
+    is_read = Column(Boolean, default=True, nullable=False)
+    importance = Column(Enum(NotificationImportance), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    read_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<NotificationArchive {self.id} - {self.title}>'
+
+
+class NotificationCounter(db.Model):
+    """Contador de notificaciones no leídas por usuario"""
+    __tablename__ = 'notification_counters'
+    
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    unread_count = Column(Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f'<NotificationCounter {self.user_id} - {self.unread_count}>'
+    
+    @classmethod
+    def get_unread_count(cls, user_id):
+        """
+        Obtiene el contador por clave primaria, inicializándolo con un COUNT la primera vez
+
+        La inicialización es un único INSERT ... SELECT count(*) ... ON CONFLICT
+        DO NOTHING, sin bloquear la fila del usuario: si otra petición lo crea a
+        la vez gana la primera. Una notificación confirmada entre el COUNT y el
+        INSERT no se cuenta (su incremento no encontró el contador); esas
+        desviaciones las corrige `flask notifications reconcile-counters`.
+        """
+        counter = db.session.get(cls, user_id)
+        if counter is not None:
+            return counter.unread_count
+        
+        user_id = uuid.UUID(str(user_id))
+        try:
+            unread_count = db.session.execute(
+                pg_insert(cls)
+                .from_select(
+                    ['user_id', 'unread_count'],
+                    select(literal(user_id, UUID(as_uuid=True)), func.count())
+                    .select_from(Notification)
+                    .where(Notification.user_id == user_id, Notification.is_read.is_(False))
+                )
+                .on_conflict_do_nothing(index_elements=['user_id'])
+                .returning(cls.unread_count)
+            ).scalar()
+            if unread_count is None:
+                # Otra petición lo inicializó primero
+                unread_count = db.session.execute(
+                    select(cls.unread_count).where(cls.user_id == user_id)
+                ).scalar()
+            db.session.commit()
+        except IntegrityError:
+            # El usuario ya no existe
+            db.session.rollback()
+            return 0
+        return unread_count
+    
+    @classmethod
+    def reconcile(cls, user_id=None, batch_size=500):
+        """
+        Recalcula los contadores a partir de las notificaciones no leídas y corrige los desviados
+
+        Bloquea cada lote de contadores antes de contar: los cambios en curso
+        terminan antes del COUNT y los nuevos aplican su delta después de la
+        corrección. Emite el valor corregido a los streams del usuario.
+
+        Returns:
+            {'checked': contadores revisados, 'fixed': contadores corregidos}
+        """
+        checked = fixed = 0
+        last_user_id = None
+        while True:
+            query = select(cls.user_id, cls.unread_count).order_by(cls.user_id).limit(batch_size).with_for_update()
+            if user_id is not None:
+                query = query.where(cls.user_id == user_id)
+            elif last_user_id is not None:
+                query = query.where(cls.user_id > last_user_id)
+            counters = db.session.execute(query).all()
+            if not counters:
+                break
+            
+            user_ids = [counter.user_id for counter in counters]
+            actual = dict(db.session.execute(
+                select(Notification.user_id, func.count())
+                .where(Notification.user_id.in_(user_ids), Notification.is_read.is_(False))
+                .group_by(Notification.user_id)
+            ).all())
+            events = []
+            for counter_user_id, stored in counters:
+                unread_count = actual.get(counter_user_id, 0)
+                if unread_count != stored:
+                    db.session.execute(
+                        update(cls).where(cls.user_id == counter_user_id).values(unread_count=unread_count)
+                    )
+                    events.append((counter_user_id, 'unread_count', {'unread_count': unread_count}))
+            if events:
+                notification_hub.emit_many(db.session, events)
+            db.session.commit()
+            
+            checked += len(counters)
+            fixed += len(events)
+            last_user_id = user_ids[-1]
+            if user_id is not None or len(counters) < batch_size:
+                break
+        return {'checked': checked, 'fixed': fixed}
+    
+    @classmethod
+    def adjust(cls, user_id, delta):
+        """Suma delta al contador dentro de la transacción actual (si aún no existe no hace nada)"""
+        if delta:
+            _apply_counter_delta(db.session, db.session.connection(), user_id, delta)
+    
+
+def _apply_counter_delta(session, connection, user_id, delta):
+    """Aplica delta al contador y emite el nuevo valor a los streams del usuario"""
+    unread_count = connection.execute(
+        NotificationCounter.__table__.update()
+        .where(NotificationCounter.user_id == user_id)
+        .values(unread_count=NotificationCounter.unread_count + delta)
+        .returning(NotificationCounter.unread_count)
+    ).scalar()
+    if unread_count is not None:
+        notification_hub.emit(
+            session, user_id, 'unread_count', {'unread_count': unread_count}, connection=connection
+        )
+
+
+@notification_hub.on_broadcast
+def _resolve_broadcast(user_ids, data):
+    """Eventos de una difusión para los usuarios con stream abierto en este proceso (una consulta por lote)"""
+    first, last = (uuid.UUID(value) for value in data['user_range'])
+    user_ids = [user_id for user_id in (uuid.UUID(str(value)) for value in user_ids) if first <= user_id <= last]
+    if not user_ids:
+        return []
+    ids = [Notification.broadcast_id(data['batch_id'], user_id) for user_id in user_ids]
+    rows = db.session.execute(
+        select(Notification, NotificationCounter.unread_count)
+        .outerjoin(NotificationCounter, NotificationCounter.user_id == Notification.user_id)
+        .where(
+            Notification.created_at == datetime.fromisoformat(data['created_at']),
+            Notification.id.in_(ids),
+        )
+    ).all()
+    events = []
+    for notification, unread_count in rows:
+        events.append((notification.user_id, 'notification', notification.to_dict()))
+        if unread_count is not None:
+            events.append((notification.user_id, 'unread_count', {'unread_count': unread_count}))
+    return events
+
+
+# Mantener el contador sincronizado con los cambios hechos a través del ORM
+@event.listens_for(Notification, 'after_insert')
+def _notification_inserted(mapper, connection, target):
+    session = object_session(target)
+    notification_hub.emit(session, target.user_id, 'notification', target.to_dict(), connection=connection)
+    if not target.is_read:
+        _apply_counter_delta(session, connection, target.user_id, 1)
+
+
+@event.listens_for(Notification, 'after_update')
+def _notification_updated(mapper, connection, target):
+    history = inspect(target).attrs.is_read.history
+    if not history.has_changes():
+        return
+    was_read = history.deleted[0] if history.deleted else None
+    if was_read is not None and bool(was_read) != bool(target.is_read):
+        _apply_counter_delta(object_session(target), connection, target.user_id, -1 if target.is_read else 1)
+
+
+@event.listens_for(Notification, 'after_delete')
+def _notification_deleted(mapper, connection, target):
+    if not target.is_read:
+        _apply_counter_delta(object_session(target), connection, target.user_id, -1)
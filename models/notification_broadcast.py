@@ -0,0 +1,75 @@
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import UUID
+from extensions import db
+
+
+class NotificationBroadcast(db.Model):
+    """Difusión de una notificación del sistema que se reparte en segundo plano
+
+    Su id es también el lote de las notificaciones creadas (ver
+    Notification.broadcast_id) y created_at la fecha de todas ellas, así que
+    repetir un lote tras una interrupción no crea duplicados. last_user_id es
+    el cursor de la paginación por clave: se confirma junto con cada lote.
+    """
+
+    __tablename__ = "notification_broadcasts"
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    id = db.Column(UUID(as_uuid=True), primary_key=True)
+    status = db.Column(db.String(20), default=STATUS_PENDING, nullable=False, index=True)
+    title = db.Column(db.String(255), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    importance = db.Column(db.String(20), nullable=False)
+    # Filtros del segmento serializados con NotificationSegmentSchema
+    segment = db.Column(db.JSON, default=dict, nullable=False)
+    requested_by = db.Column(UUID(as_uuid=True), nullable=True)
+    total = db.Column(db.Integer, default=0, nullable=False)
+    processed = db.Column(db.Integer, default=0, nullable=False)
+    created = db.Column(db.Integer, default=0, nullable=False)
+    last_user_id = db.Column(UUID(as_uuid=True), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Se actualiza en cada lote; un proceso puede retomar la difusión si deja de avanzar
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    @staticmethod
+    def segment_query(segment):
+        """Consulta de usuarios destinatarios a partir de los filtros del segmento (ya cargados con el esquema)"""
+        from models.user import User
+
+        query = User.query.filter(User.deleted_at.is_(None))
+        if segment.get("user_ids"):
+            query = query.filter(User.id.in_(segment["user_ids"]))
+        if segment.get("privilege"):
+            query = query.filter(User.privilege == segment["privilege"])
+        if segment.get("login_type"):
+            query = query.filter(User.login_type == segment["login_type"])
+        if segment.get("email_verified") is not None:
+            query = query.filter(User.email_verified == segment["email_verified"])
+        if segment.get("created_after"):
+            query = query.filter(User.created_at >= segment["created_after"])
+        if segment.get("created_before"):
+            query = query.filter(User.created_at < segment["created_before"])
+        return query
+
+    def to_dict(self):
+        return {
+            "id": str(self.id),
+            "status": self.status,
+            "title": self.title,
+            "importance": self.importance,
+            "total": self.total,
+            "processed": self.processed,
+            "created": self.created,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f"<NotificationBroadcast {self.id} - {self.status}>"
@@ -0,0 +1,63 @@
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import UUID, insert as pg_insert
+from extensions import db
+
+
+class RevokedToken(db.Model):
+    """Token JWT revocado (logout); se conserva hasta que el token expira"""
+
+    __tablename__ = "revoked_tokens"
+
+    # Tickets del stream de notificaciones ya consumidos (ver utils.stream_tickets)
+    STREAM_TICKET = "ticket"
+
+    jti = db.Column(db.String(64), primary_key=True)
+    token_type = db.Column(db.String(10), nullable=False)
+    user_id = db.Column(UUID(as_uuid=True), nullable=True, index=True)
+    # Hora del servidor de base de datos: es la marca que usan los procesos para sincronizarse
+    revoked_at = db.Column(db.DateTime, server_default=func.now(), nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    @classmethod
+    def revoke(cls, jti: str, token_type: str, user_id: Optional[str], expires_at: datetime):
+        """Registra el jti dentro de la transacción actual (idempotente)"""
+        db.session.execute(
+            pg_insert(cls.__table__)
+            .values(jti=jti, token_type=token_type, user_id=user_id, expires_at=expires_at)
+            .on_conflict_do_nothing(index_elements=[cls.jti])
+        )
+
+    @classmethod
+    def claim(cls, jti: str, token_type: str, user_id: Optional[str], expires_at: datetime) -> bool:
+        """Registra el jti si aún no existía; False si ya estaba (credencial de un solo uso ya usada)"""
+        return db.session.execute(
+            pg_insert(cls.__table__)
+            .values(jti=jti, token_type=token_type, user_id=user_id, expires_at=expires_at)
+            .on_conflict_do_nothing(index_elements=[cls.jti])
+            .returning(cls.jti)
+        ).first() is not None
+
+    @classmethod
+    def active_jtis(cls, revoked_after: datetime = None) -> List[str]:
+        """jti de tokens revocados que aún no expiraron, opcionalmente sólo los revocados después de una fecha"""
+        # Los tickets del stream consumidos no son JWT: no entran en el filtro de Bloom
+        query = select(cls.jti).where(cls.expires_at > datetime.utcnow(), cls.token_type != cls.STREAM_TICKET)
+        if revoked_after is not None:
+            query = query.where(cls.revoked_at > revoked_after)
+        return list(db.session.execute(query).scalars())
+
+    @classmethod
+    def is_revoked(cls, jti: str) -> bool:
+        return db.session.execute(select(cls.jti).where(cls.jti == jti)).first() is not None
+
+    @classmethod
+    def database_now(cls) -> datetime:
+        return db.session.execute(select(func.now())).scalar().replace(tzinfo=None)
+
+    @classmethod
+    def purge_expired(cls) -> int:
+        """Elimina los registros de tokens ya expirados"""
+        result = db.session.execute(db.delete(cls).where(cls.expires_at <= datetime.utcnow()))
+        return result.rowcount
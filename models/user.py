@@ -2,8 +2,7 @@ import uuid
 from datetime import datetime
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
-from extensions import db
-import bcrypt
+from extensions import db, password_hasher
 
 class User(db.Model):
     """Modelo de Usuario"""
@@ -37,6 +36,8 @@ class User(db.Model):
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    # Marcado al solicitar el borrado; la fila se elimina cuando termina la purga en segundo plano
+    deleted_at = db.Column(db.DateTime, nullable=True, index=True)
     
     # Relationships
     settings = relationship("UserSettings", back_populates="user", uselist=False)
@@ -48,16 +49,30 @@ class User(db.Model):
             self.id = uuid.uuid4()
     
     def set_password(self, password):
-        """Encripta y guarda la contraseña"""
+        """Encripta y guarda la contraseña (coste BCRYPT_LOG_ROUNDS, en el pool de hashing)"""
         if password:
-            salt = bcrypt.gensalt()
-            self.password_hash = bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+            self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
         """Verifica si la contraseña es correcta"""
         if not self.password_hash:
             return False
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return password_hasher.verify(password, self.password_hash)
+    
+    @staticmethod
+    def unique_violation_message(error):
+        """Mensaje para un IntegrityError de email o username duplicado, o None si es otra restricción"""
+        diag = getattr(error.orig, 'diag', None)
+        constraint = getattr(diag, 'constraint_name', None) or str(error.orig)
+        if 'email' in constraint:
+            return 'El email ya está registrado'
+        if 'username' in constraint:
+            return 'El username ya está en uso'
+        return None
+    
+    def password_needs_rehash(self):
+        """Indica si el hash guardado usa un coste distinto del configurado"""
+        return bool(self.password_hash) and password_hasher.needs_rehash(self.password_hash)
     
     def to_dict(self):
         """Convierte el usuario a diccionario (sin password)"""
@@ -1,11 +1,23 @@
 import uuid
-from datetime import datetime
-from sqlalchemy.dialects.postgresql import UUID
+from collections import Counter
+from datetime import datetime, timezone
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import UUID, insert as pg_insert
+from sqlalchemy.orm import joinedload
 from extensions import db
+from models.file import File
+from utils.partitions import add_default_partition
 
 
 class UserActivity(db.Model):
     __tablename__ = "user_activity"
+    __table_args__ = (
+        db.Index("ix_user_activity_user_created", "user_id", "created_at"),
+        # BRIN: índice diminuto para rangos de fecha sobre filas insertadas en orden
+        db.Index("ix_user_activity_created_brin", "created_at", postgresql_using="brin"),
+        # Particionada por mes en Postgres (ver utils.partitions)
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = db.Column(UUID(as_uuid=True), db.ForeignKey("users.id"), nullable=False)
@@ -15,9 +27,137 @@ class UserActivity(db.Model):
     ip_address = db.Column(db.String, nullable=False)
     user_agent = db.Column(db.String, nullable=True)
 
+    # Forma parte de la clave primaria porque es la clave de partición
     created_at = db.Column(
-        db.DateTime(timezone=True), default=datetime.utcnow, nullable=False
+        db.DateTime(timezone=True), default=datetime.utcnow, nullable=False, primary_key=True
     )
 
     user = db.relationship("User", backref="activities")
-    file = db.relationship("File", backref="activities", lazy="joined")
+    # Sin carga automática: File incluye el contenido completo del ledger, las
+    # consultas que necesiten el archivo deben pedir solo las columnas necesarias
+    file = db.relationship("File", backref="activities", lazy="select")
+
+    @classmethod
+    def with_file_summary(cls):
+        """Query que carga del archivo relacionado solo id y nombre"""
+        return cls.query.options(joinedload(cls.file).load_only(File.id, File.name))
+
+
+add_default_partition(UserActivity.__table__)
+
+
+class UserActivityRollup(db.Model):
+    """Conteo de actividad agregado por hora y por día para (usuario, evento, archivo)"""
+
+    __tablename__ = "user_activity_rollups"
+
+    GRANULARITY_HOUR = "hour"
+    GRANULARITY_DAY = "day"
+    GRANULARITIES = (GRANULARITY_HOUR, GRANULARITY_DAY)
+
+    # Las actividades sin archivo se agrupan bajo el UUID nulo (parte de la clave primaria)
+    NO_FILE = uuid.UUID(int=0)
+
+    granularity = db.Column(db.String(10), primary_key=True)
+    bucket_start = db.Column(db.DateTime(timezone=True), primary_key=True)
+    user_id = db.Column(UUID(as_uuid=True), primary_key=True)
+    event = db.Column(db.String, primary_key=True)
+    file_id = db.Column(UUID(as_uuid=True), primary_key=True, default=NO_FILE)
+    event_count = db.Column(db.BigInteger, default=0, nullable=False)
+
+    __table_args__ = (
+        db.Index(
+            "ix_user_activity_rollups_user_bucket", "user_id", "granularity", "bucket_start"
+        ),
+    )
+
+    @staticmethod
+    def bucket(value, granularity):
+        """Inicio (UTC, sin zona) de la hora o del día que contiene value"""
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        if granularity == UserActivityRollup.GRANULARITY_HOUR:
+            return value.replace(minute=0, second=0, microsecond=0)
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @classmethod
+    def increment(cls, rows, sign=1):
+        """
+        Suma (o resta con sign=-1) las actividades a sus agregados horario y diario
+
+        Se ejecuta en la transacción actual con un único INSERT ... ON CONFLICT.
+        """
+        counts = Counter()
+        for row in rows:
+            for granularity in cls.GRANULARITIES:
+                key = (
+                    granularity,
+                    cls.bucket(row["created_at"], granularity),
+                    row["user_id"],
+                    row["event"],
+                    row.get("file_id") or cls.NO_FILE,
+                )
+                counts[key] += sign
+        if not counts:
+            return
+
+        # Orden estable para que dos workers no se bloqueen mutuamente
+        values = [
+            {
+                "granularity": granularity,
+                "bucket_start": bucket_start,
+                "user_id": user_id,
+                "event": event,
+                "file_id": file_id,
+                "event_count": count,
+            }
+            for (granularity, bucket_start, user_id, event, file_id), count in sorted(
+                counts.items(), key=lambda item: tuple(str(part) for part in item[0])
+            )
+            if count
+        ]
+        if not values:
+            return
+        stmt = pg_insert(cls.__table__).values(values)
+        db.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[
+                    cls.granularity,
+                    cls.bucket_start,
+                    cls.user_id,
+                    cls.event,
+                    cls.file_id,
+                ],
+                set_={"event_count": cls.event_count + stmt.excluded.event_count},
+            )
+        )
+
+    @classmethod
+    def rebuild(cls, start, end):
+        """Recalcula desde user_activity los agregados de los días completos entre start y end"""
+        start = cls.bucket(start, cls.GRANULARITY_DAY)
+        end = cls.bucket(end, cls.GRANULARITY_DAY)
+        db.session.execute(
+            delete(cls).where(cls.bucket_start >= start, cls.bucket_start < end)
+        )
+        for granularity in cls.GRANULARITIES:
+            # Mismos límites que bucket(): truncado en UTC sea cual sea la zona de la sesión
+            bucket_start = func.timezone(
+                "UTC", func.date_trunc(granularity, func.timezone("UTC", UserActivity.created_at))
+            )
+            file_id = func.coalesce(UserActivity.file_id, literal(cls.NO_FILE, UUID(as_uuid=True)))
+            db.session.execute(
+                insert(cls).from_select(
+                    ["granularity", "bucket_start", "user_id", "event", "file_id", "event_count"],
+                    select(
+                        literal(granularity),
+                        bucket_start,
+                        UserActivity.user_id,
+                        UserActivity.event,
+                        file_id,
+                        func.count(),
+                    )
+                    .where(UserActivity.created_at >= start, UserActivity.created_at < end)
+                    .group_by(bucket_start, UserActivity.user_id, UserActivity.event, file_id),
+                )
+            )
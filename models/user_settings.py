@@ -1,6 +1,6 @@
 from sqlalchemy import Column, String, Boolean, Integer, JSON, ForeignKey
 from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, insert as pg_insert
 import uuid
 from extensions import db
 
@@ -51,5 +51,23 @@ class UserSettings(db.Model):
     # Relationships
     user = relationship("User", back_populates="settings")
 
+    @classmethod
+    def get_or_create(cls, user_id):
+        """Configuraciones del usuario, creándolas con los valores por defecto si no existen
+
+        El INSERT ... ON CONFLICT DO NOTHING evita el error de unicidad cuando
+        dos peticiones las crean a la vez.
+        """
+        settings = cls.query.filter_by(user_id=user_id).first()
+        if settings is None:
+            db.session.execute(
+                pg_insert(cls.__table__)
+                .values(id=uuid.uuid4(), user_id=user_id)
+                .on_conflict_do_nothing(index_elements=[cls.user_id])
+            )
+            db.session.commit()
+            settings = cls.query.filter_by(user_id=user_id).first()
+        return settings
+
     def __repr__(self):
         return f"<UserSettings {self.user_id}>"
@@ -1,10 +1,16 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, create_refresh_token
-from extensions import db
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, create_refresh_token, get_jwt, decode_token
+from extensions import db, token_blocklist
 from models.user import User
+from models.revoked_token import RevokedToken
 from schemas.user_schema import UserCreateSchema, UserLoginSchema, UserResponseSchema
 from marshmallow import ValidationError
+from sqlalchemy.exc import IntegrityError
+from utils.password_hasher import HasherBusyError
+from utils.user_cache import current_user_profile
 import traceback
+import click
+import json
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -20,14 +26,6 @@ def register():
         # Validar datos de entrada
         data = user_create_schema.load(request.json)
         
-        # Verificar si el email ya existe
-        if User.query.filter_by(email=data['email']).first():
-            return jsonify({'error': 'El email ya está registrado'}), 400
-        
-        # Verificar si el username ya existe
-        if User.query.filter_by(username=data['username']).first():
-            return jsonify({'error': 'El username ya está en uso'}), 400
-        
         vatar_url = "https://api.dicebear.com/6.x/bottts-neutral/svg?seed=" + data["username"]
 
         
@@ -45,23 +43,36 @@ def register():
         if 'password' in data and data['password']:
             user.set_password(data['password'])
         
-        # Guardar en base de datos
+        # Un solo INSERT: los índices únicos de email y username detectan los duplicados
         db.session.add(user)
+        db.session.flush()
+        # Serializar antes del commit evita recargar el usuario después
+        user_id = str(user.id)
+        user_data = user_response_schema.dump(user)
         db.session.commit()
         
         # Generar token JWT
-        access_token = create_access_token(identity=str(user.id))
-        refresh_token = create_refresh_token(identity=str(user.id))
+        access_token = create_access_token(identity=user_id)
+        refresh_token = create_refresh_token(identity=user_id)
         
         return jsonify({
             'message': 'Usuario registrado exitosamente',
-            'user': user_response_schema.dump(user),
+            'user': user_data,
             'access_token': access_token,
             'refresh_token': refresh_token
         }), 201
         
+    except IntegrityError as e:
+        db.session.rollback()
+        message = User.unique_violation_message(e)
+        if message:
+            return jsonify({'error': message}), 400
+        return jsonify({'error': 'Error interno del servidor'}), 500
     except ValidationError as e:
         return jsonify({'error': 'Datos inválidos', 'details': e.messages}), 400
+    except HasherBusyError:
+        db.session.rollback()
+        return jsonify({'error': 'Servidor ocupado, intenta de nuevo en unos segundos'}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Error interno del servidor'}), 500
@@ -71,10 +82,17 @@ def login():
     try:
         data = user_login_schema.load(request.json)
         user = User.query.filter_by(email=data['email']).first()
-        if not user:
+        if not user or user.deleted_at is not None:
             return jsonify({'error': 'Credenciales inválidas'}), 401
         if not user.check_password(data['password']):
             return jsonify({'error': 'Credenciales inválidas'}), 401
+        if user.password_needs_rehash():
+            # Actualiza el hash al coste configurado; si falla el login sigue siendo válido
+            try:
+                user.set_password(data['password'])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
         access_token = create_access_token(identity=str(user.id))
         refresh_token = create_refresh_token(identity=str(user.id))
         return jsonify({
@@ -85,6 +103,8 @@ def login():
         }), 200
     except ValidationError as e:
         return jsonify({'error': 'Datos inválidos', 'details': e.messages}), 400
+    except HasherBusyError:
+        return jsonify({'error': 'Servidor ocupado, intenta de nuevo en unos segundos'}), 503, {'Retry-After': '1'}
     except Exception as e:
         traceback.print_exc()  # <-- Esto imprime el stacktrace completo
         return jsonify({'error': 'Error interno del servidor'}), 500
@@ -95,7 +115,14 @@ def validate_token():
     """Validar si el token de acceso actual es válido"""
     try:
         # Si llegamos aquí, el token es válido
-        # El decorador @jwt_required() ya se encarga de validar el token
+        # El decorador @jwt_required() ya se encarga de validar el token;
+        # además el usuario debe seguir existiendo (consulta servida desde caché)
+        if not current_user_profile():
+            return jsonify({
+                'message': 'Usuario no encontrado',
+                'valid': False
+            }), 401
+        
         return jsonify({
             'message': 'Token válido',
             'valid': True
@@ -110,6 +137,9 @@ def validate_token():
 def refresh():
     try:
         identity = get_jwt_identity()
+        # Cuentas eliminadas (o en proceso de eliminación) no renuevan tokens
+        if not current_user_profile():
+            return jsonify({'error': 'Usuario no encontrado'}), 401
         new_access_token = create_access_token(identity=identity)
         return jsonify({
             'access_token': new_access_token
@@ -122,8 +152,7 @@ def refresh():
 def get_current_user():
     """Obtener información del usuario actual"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_user_profile()
         
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -133,4 +162,44 @@ def get_current_user():
         }), 200
         
     except Exception as e:
-        return jsonify({'error': 'Error interno del servidor'}), 500 
\ No newline at end of file
+        return jsonify({'error': 'Error interno del servidor'}), 500 
+
+
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required(verify_type=False)
+def logout():
+    """
+    Revocar el token actual (access o refresh)
+
+    Opcionalmente revoca también el refresh token enviado en el body:
+    {"refresh_token": "..."}
+    """
+    try:
+        payloads = [get_jwt()]
+        refresh_token = (request.get_json(silent=True) or {}).get('refresh_token')
+        if refresh_token:
+            try:
+                payload = decode_token(refresh_token, allow_expired=True)
+            except Exception:
+                return jsonify({'error': 'refresh_token inválido'}), 400
+            if payload.get('sub') != get_jwt_identity():
+                return jsonify({'error': 'refresh_token inválido'}), 400
+            payloads.append(payload)
+        
+        for payload in payloads:
+            token_blocklist.revoke(payload)
+        db.session.commit()
+        
+        return jsonify({'message': 'Sesión cerrada', 'revoked': len(payloads)}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+
+@auth_bp.cli.command('purge-revoked-tokens')
+def purge_revoked_tokens_command():
+    """Elimina de revoked_tokens los tokens que ya expiraron"""
+    deleted = RevokedToken.purge_expired()
+    db.session.commit()
+    click.echo(json.dumps({'deleted': deleted, 'blocklist': token_blocklist.stats()}))
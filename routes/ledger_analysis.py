@@ -4,26 +4,18 @@ from extensions import db
 from models.user import User
 from models.file import File
 from utils.temp_file_manager import TempFileManager
-from hook.ledger_parser import (
-    parse_ledger,
-    calculates_ledger,
-    analyze_ledger,
-    analyze_ledger_compare,
-    analyze_ledger_alerts,
-)
+from hook.ledger_valuation import CurrencyValuation, is_currency_code
+from utils.exchange_rates import latest_usd_rates, usd_rates_for
+from utils.user_cache import cached_user_settings
 from utils.validates import has_any_value
 from marshmallow import ValidationError
+import logging
+import threading
+import time
 import uuid
 import os
 
-# Importar las clases de ledger-cli-toolkit
-try:
-    from ledger_cli import LedgerParser, LedgerAnalyst
-
-except ImportError as e:
-    # Fallback si no está instalada la librería
-    LedgerParser = None
-    LedgerAnalyst = None
+logger = logging.getLogger(__name__)
 
 ledger_analysis_bp = Blueprint("ledger_analysis", __name__)
 
@@ -59,9 +51,66 @@ def safe_calculation(
 
 
 def validate_ledger_library():
-    """Verifica que la librería ledger-cli-toolkit esté disponible"""
-    if not all([LedgerParser, LedgerAnalyst]):
+    """
+    Verifica que la librería ledger-cli-toolkit esté disponible y retorna hook.ledger_parser
+
+    El módulo (y con él ledger_cli, matplotlib y yaml) se importa en el primer
+    uso y no al cargar la aplicación, así los workers arrancan sin pagar ese
+    coste hasta que llega el primer análisis.
+    """
+    try:
+        import hook.ledger_parser as ledger_parser
+    except ImportError:
         raise ImportError("La librería ledger-cli-toolkit no está instalada")
+    return ledger_parser
+
+
+_warmup_pid = None
+_warmup_lock = threading.Lock()
+
+
+def _load_ledger():
+    started = time.perf_counter()
+    try:
+        validate_ledger_library()
+        logger.info(f"Ledger libraries loaded in {time.perf_counter() - started:.2f}s")
+    except ImportError as e:
+        logger.warning(f"Ledger warm-up skipped: {str(e)}")
+
+
+def start_ledger_warmup():
+    """
+    Lanza la precarga en un hilo, una sola vez por proceso
+
+    Con gunicorn se llama tras el fork (post_fork) y no en el master: un
+    worker que heredara un import a medias de otro hilo se quedaría bloqueado
+    para siempre en el lock de ese módulo en su primer análisis.
+    """
+    global _warmup_pid
+    pid = os.getpid()
+    if _warmup_pid == pid:
+        return
+    with _warmup_lock:
+        if _warmup_pid == pid:
+            return
+        _warmup_pid = pid
+    threading.Thread(target=_load_ledger, name="ledger-warmup", daemon=True).start()
+
+
+def warm_up_ledger(app):
+    """
+    Precarga las dependencias del análisis de ledger según LEDGER_WARMUP
+
+    - off: se importan con el primer análisis
+    - eager: se importan ya (con gunicorn y WEB_PRELOAD, una sola vez en el master)
+    - background: se importan en un hilo de cada proceso que atiende peticiones,
+      iniciado tras el fork de gunicorn o, si no, con la primera petición
+    """
+    mode = app.config.get("LEDGER_WARMUP", "off")
+    if mode == "eager":
+        _load_ledger()
+    elif mode == "background":
+        app.before_request(start_ledger_warmup)
 
 
 def get_user_file(file_id: str, user_id: str) -> File:
@@ -97,6 +146,39 @@ def get_user_file(file_id: str, user_id: str) -> File:
     return file
 
 
+def get_currency_valuation():
+    """
+    Crea la valoración en moneda de reporte si la petición la pide
+
+    Query params: currency (moneda de reporte) y default_currency (moneda de los
+    movimientos que no indican una).
+
+    Raises:
+        ValueError: Si algún código de moneda no es válido
+    """
+    reporting_currency = request.args.get("currency")
+    if not reporting_currency:
+        return None
+
+    default_currency = request.args.get("default_currency")
+    if not is_currency_code(reporting_currency) or (
+        default_currency and not is_currency_code(default_currency)
+    ):
+        raise ValueError("Código de moneda inválido")
+
+    return CurrencyValuation(
+        reporting_currency,
+        usd_rates_for,
+        default_currency=default_currency,
+        latest_rates=latest_usd_rates,
+    )
+
+
+def get_parent_accounts(user_id: str):
+    """Cuentas padre de las configuraciones del usuario (servidas desde caché)"""
+    return cached_user_settings(user_id).get("parent_accounts")
+
+
 @ledger_analysis_bp.route("/parser/<file_id>", methods=["GET"])
 @jwt_required()
 def analyze_ledger_parser(file_id):
@@ -105,10 +187,12 @@ def analyze_ledger_parser(file_id):
         current_user_id = get_jwt_identity()
 
         # validar librería
-        validate_ledger_library()
+        ledger = validate_ledger_library()
 
         # Obtener archivo
         file = get_user_file(file_id, current_user_id)
+        valuation = get_currency_valuation()
+        parent_accounts = get_parent_accounts(current_user_id)
 
         (
             _,
@@ -119,14 +203,24 @@ def analyze_ledger_parser(file_id):
             metadata,
             parents,
             transactions_resolved,
-        ) = parse_ledger(file.file_content, file.file_content)
+        ) = ledger.parse_ledger(
+            file.file_content,
+            file.file_content,
+            valuation=valuation,
+            parents_accounts=parent_accounts,
+        )
         (
             balances,
             balances_by_parents,
             state_results,
             balances_by_details,
             period,
-        ) = calculates_ledger(file.file_content, file.file_content)
+        ) = ledger.calculates_ledger(
+            file.file_content,
+            file.file_content,
+            valuation=valuation,
+            parents_accounts=parent_accounts,
+        )
 
         if has_any_value(
             balances, balances_by_parents, state_results, balances_by_details, period
@@ -149,6 +243,7 @@ def analyze_ledger_parser(file_id):
                             "balances_by_details": balances_by_details,
                             "period": period,
                             "parents": parents,
+                            "valuation": valuation.summary() if valuation else None,
                         },
                     }
                 ),
@@ -175,10 +270,11 @@ def analyze_ledger_analyst(file_id):
         current_user_id = get_jwt_identity()
 
         # Validar librería
-        validate_ledger_library()
+        ledger = validate_ledger_library()
 
         # Obtener archivo
         file = get_user_file(file_id, current_user_id)
+        valuation = get_currency_valuation()
 
         (
             daily,
@@ -201,7 +297,12 @@ def analyze_ledger_analyst(file_id):
             income_dependency,
             cumulative_net_income,
             months,
-        ) = analyze_ledger(file=file.file_content, file_accounts=file.file_content)
+        ) = ledger.analyze_ledger(
+            file=file.file_content,
+            file_accounts=file.file_content,
+            valuation=valuation,
+            parents_accounts=get_parent_accounts(current_user_id),
+        )
 
         if has_any_value(
             daily,
@@ -250,6 +351,7 @@ def analyze_ledger_analyst(file_id):
                             "income_dependency": income_dependency,
                             "cumulative_net_income": cumulative_net_income,
                             "months": months,
+                            "valuation": valuation.summary() if valuation else None,
                         },
                     }
                 ),
@@ -275,7 +377,7 @@ def compare_months(file_id):
         current_user_id = get_jwt_identity()
 
         # Validar librería
-        validate_ledger_library()
+        ledger = validate_ledger_library()
 
         # Obtener parámetros
         data = request.get_json()
@@ -288,11 +390,12 @@ def compare_months(file_id):
         # Obtener archivo
         file = get_user_file(file_id, current_user_id)
 
-        compare_result = analyze_ledger_compare(
+        compare_result = ledger.analyze_ledger_compare(
             file=file.file_content,
             file_accounts=file.file_content,
             month1=month1,
             month2=month2,
+            parents_accounts=get_parent_accounts(current_user_id),
         )
 
         if compare_result:
@@ -316,7 +419,7 @@ def detect_alerts(file_id):
         current_user_id = get_jwt_identity()
 
         # Validar librería
-        validate_ledger_library()
+        ledger = validate_ledger_library()
 
         # Obtener umbral
         data = request.get_json() or {}
@@ -325,10 +428,11 @@ def detect_alerts(file_id):
         # Obtener archivo
         file = get_user_file(file_id, current_user_id)
 
-        alerts = analyze_ledger_alerts(
+        alerts = ledger.analyze_ledger_alerts(
             file=file.file_content,
             file_accounts=file.file_content,
             threshold=threshold,
+            parents_accounts=get_parent_accounts(current_user_id),
         )
 
         if alerts:
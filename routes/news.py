@@ -1,7 +1,11 @@
 from flask import Blueprint, jsonify, request, current_app
+import click
+import json
 import logging
-from datetime import datetime
+import math
+from datetime import date, datetime
 from utils.api_services import CurrencyService, NewsService, ServiceStatus
+from utils.exchange_rates import backfill_rates, load_rates, rates_as_of, read_rates_csv, refresh_rates
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -104,6 +108,116 @@ def currency_convert():
             'error': 'Internal server error'
         }), 500
 
+@news_bp.route('/currency/convert/batch', methods=['POST'])
+def currency_convert_batch():
+    """Convert many amounts between currencies using a single rates snapshot"""
+    data = request.get_json(silent=True) or {}
+    conversions = data.get('conversions')
+    max_items = current_app.config.get('CURRENCY_BATCH_MAX_ITEMS', 10000)
+
+    if not isinstance(conversions, list) or not conversions:
+        return jsonify({
+            'success': False,
+            'error': 'conversions must be a non-empty list'
+        }), 400
+
+    if len(conversions) > max_items:
+        return jsonify({
+            'success': False,
+            'error': f'A batch can contain at most {max_items} conversions'
+        }), 400
+
+    items = []
+    for position, item in enumerate(conversions):
+        try:
+            amount = float(item.get('amount', 1))
+            if not math.isfinite(amount):
+                raise ValueError(amount)
+            items.append({
+                'amount': amount,
+                'from_currency': str(item.get('from', 'USD')).upper(),
+                'to_currency': str(item.get('to', 'EUR')).upper()
+            })
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'error': f'Invalid conversion at position {position}'
+            }), 400
+
+    try:
+        currency_service = get_currency_service()
+        result = currency_service.convert_batch(items)
+        if not result['success']:
+            return jsonify(result), 500
+        return jsonify(result)
+
+    except Exception as e:
+        logger.error(f"Batch conversion error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Internal server error'
+        }), 500
+
+@news_bp.route('/currency/historical', methods=['GET'])
+def currency_historical():
+    """Get exchange rates in effect on a date from the local rates store"""
+    try:
+        on = date.fromisoformat(request.args.get('date', date.today().isoformat()))
+        amount = float(request.args.get('amount', 1))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid date (YYYY-MM-DD) or amount parameter'
+        }), 400
+
+    from_currency = request.args.get('from', 'USD').upper()
+    to_currency = request.args.get('to')
+
+    try:
+        if to_currency is None:
+            rates = rates_as_of(from_currency, on)
+            if not rates:
+                return jsonify({
+                    'success': False,
+                    'error': f'No historical rates for {from_currency} on {on.isoformat()}'
+                }), 404
+            return jsonify({
+                'success': True,
+                'base_currency': from_currency,
+                'date': on.isoformat(),
+                'rates': {quote: rate for quote, (rate, _) in rates.items()}
+            })
+
+        to_currency = to_currency.upper()
+        if to_currency == from_currency:
+            rate, rate_date = 1.0, on
+        else:
+            found = rates_as_of(from_currency, on, [to_currency]).get(to_currency)
+            if found is None:
+                return jsonify({
+                    'success': False,
+                    'error': f'No historical rate for {from_currency}/{to_currency} on {on.isoformat()}'
+                }), 404
+            rate, rate_date = found
+
+        return jsonify({
+            'success': True,
+            'amount': amount,
+            'from_currency': from_currency,
+            'to_currency': to_currency,
+            'converted_amount': round(amount * rate, 4),
+            'rate': round(rate, 6),
+            'date': on.isoformat(),
+            'rate_date': rate_date.isoformat()
+        })
+
+    except Exception as e:
+        logger.error(f"Historical rates error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Internal server error'
+        }), 500
+
 @news_bp.route('/news', methods=['GET'])
 def get_news_endpoint():
     """Get news by category"""
@@ -153,4 +267,37 @@ def get_crypto_news():
 def get_news_status():
     """Get status of news and currency services"""
     service_status = get_service_status()
-    return jsonify(service_status.get_status()) 
\ No newline at end of file
+    return jsonify(service_status.get_status())
+
+
+@news_bp.cli.command('rates-backfill')
+@click.option('--start', required=True, help='Primer día (YYYY-MM-DD)')
+@click.option('--end', default=None, help='Último día (YYYY-MM-DD), por defecto hoy')
+@click.option('--base', default='USD', help='Moneda base')
+def rates_backfill_command(start, end, base):
+    """Descarga y guarda las tasas históricas de un rango de fechas"""
+    result = backfill_rates(
+        date.fromisoformat(start),
+        date.fromisoformat(end) if end else date.today(),
+        base.upper()
+    )
+    click.echo(json.dumps(result))
+
+
+@news_bp.cli.command('rates-refresh')
+@click.option('--base', default='USD', help='Moneda base')
+@click.option('--lookback-days', type=int, default=7, help='Días a descargar si aún no hay tasas guardadas')
+def rates_refresh_command(base, lookback_days):
+    """Completa las tasas históricas hasta hoy (ejecutar a diario)"""
+    click.echo(json.dumps(refresh_rates(base.upper(), lookback_days)))
+
+
+@news_bp.cli.command('rates-load')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--source', default='csv', help='Origen a registrar si el CSV no tiene columna source')
+@click.option('--batch-size', type=int, default=1000, help='Filas por INSERT')
+def rates_load_command(path, source, batch_size):
+    """Carga masiva de tasas desde un CSV con columnas date,base,quote,rate[,source]"""
+    with open(path, newline='') as stream:
+        written = load_rates(read_rates_csv(stream, source), batch_size=batch_size)
+    click.echo(json.dumps({'rates_written': written}))
@@ -1,20 +1,43 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.notification import Notification, NotificationImportance
-from models.user import User
+from models.notification import Notification, NotificationImportance, NotificationCounter
+from models.notification_broadcast import NotificationBroadcast
 from schemas.notification_schema import (
     notification_schema, 
     notification_list_schema, 
     notification_update_schema,
-    notification_create_schema
+    notification_create_schema,
+    notification_bulk_schema,
+    notification_bulk_delete_schema,
+    notification_broadcast_schema,
+    notification_segment_schema
 )
-from extensions import db
+from extensions import db, notification_hub, notification_broadcaster, token_blocklist
+from utils.notification_retention import run_retention
+from utils.partitions import convert_to_partitioned, ensure_current_partitions
+from utils.stream_tickets import issue_stream_ticket, redeem_stream_ticket, ticket_ttl
+from utils.user_cache import current_user_is_admin
 from sqlalchemy.exc import IntegrityError
+from marshmallow import ValidationError
 import uuid
+import json
+import queue
+import click
 
 notifications_bp = Blueprint('notifications', __name__)
 
 
+@notifications_bp.before_request
+def ensure_notification_partitions():
+    """Crea las particiones del mes en curso y siguientes en la primera petición de cada mes"""
+    config = current_app.config
+    ensure_current_partitions(
+        Notification.__tablename__,
+        config.get('NOTIFICATIONS_PARTITION_MONTHS_AHEAD', 3),
+        config.get('NOTIFICATIONS_PARTITION_LOCK_TIMEOUT_MS', 1000)
+    )
+
+
 @notifications_bp.route('/notifications', methods=['GET'])
 @jwt_required()
 def get_user_notifications():
@@ -162,11 +185,10 @@ def create_system_notification():
                 'error': 'user_id is required for system notifications'
             }), 400
         
-        # Validar con el esquema completo
-        validated_data = notification_schema.load(data)
+        # Validar con el esquema completo (post_load ya construye la Notification)
+        notification = notification_schema.load(data)
         
         # Crear la notificación
-        notification = Notification(**validated_data)
         db.session.add(notification)
         db.session.commit()
         
@@ -184,6 +206,87 @@ def create_system_notification():
         }), 500
 
 
+@notifications_bp.route('/notifications/broadcast', methods=['POST'])
+@jwt_required()
+def broadcast_system_notification():
+    """Difunde una notificación del sistema a todos los usuarios o a un segmento (solo admin)
+
+    Sólo registra la difusión y la encola: el reparto por lotes lo hace
+    NotificationBroadcaster en segundo plano, así que no depende de que el
+    cliente siga conectado. Responde 202 con la URL de estado.
+    """
+    try:
+        if not current_user_is_admin():
+            return jsonify({
+                'success': False,
+                'error': 'Access denied'
+            }), 403
+        
+        data = notification_broadcast_schema.load(request.get_json() or {})
+        broadcast = NotificationBroadcast(
+            id=uuid.uuid4(),
+            status=NotificationBroadcast.STATUS_PENDING,
+            title=data['title'],
+            content=data['content'],
+            importance=NotificationImportance(data['importance']).value,
+            segment=notification_segment_schema.dump(data['segment']),
+            requested_by=uuid.UUID(get_jwt_identity()),
+            total=NotificationBroadcast.segment_query(data['segment']).count(),
+        )
+        db.session.add(broadcast)
+        db.session.commit()
+        notification_broadcaster.schedule(broadcast.id)
+        
+        status_url = url_for('notifications.get_broadcast_status', broadcast_id=broadcast.id)
+        return jsonify({
+            'success': True,
+            'data': broadcast.to_dict(),
+            'status_url': status_url
+        }), 202, {'Location': status_url}
+        
+    except ValidationError as e:
+        return jsonify({
+            'success': False,
+            'error': e.messages
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@notifications_bp.route('/notifications/broadcast/<uuid:broadcast_id>', methods=['GET'])
+@jwt_required()
+def get_broadcast_status(broadcast_id):
+    """Estado y progreso de una difusión (solo admin)"""
+    try:
+        if not current_user_is_admin():
+            return jsonify({
+                'success': False,
+                'error': 'Access denied'
+            }), 403
+        
+        broadcast = db.session.get(NotificationBroadcast, broadcast_id)
+        if not broadcast:
+            return jsonify({
+                'success': False,
+                'error': 'Broadcast not found'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': broadcast.to_dict()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @notifications_bp.route('/notifications/<uuid:notification_id>', methods=['PUT'])
 @jwt_required()
 def update_notification(notification_id):
@@ -355,23 +458,124 @@ def mark_all_notifications_as_read():
     try:
         current_user_id = get_jwt_identity()
         
-        # Obtener todas las notificaciones no leídas
-        unread_notifications = Notification.query.filter_by(
-            user_id=current_user_id,
-            is_read=False
-        ).all()
+        # Un solo UPDATE sobre todas las no leídas
+        updated = Notification.bulk_mark_as_read(current_user_id)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'updated': updated
+            },
+            'message': f'{updated} notifications marked as read'
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@notifications_bp.route('/notifications/read', methods=['POST'])
+@jwt_required()
+def mark_selected_notifications_as_read():
+    """Marca como leídas las notificaciones seleccionadas"""
+    try:
+        current_user_id = get_jwt_identity()
+        
+        data = notification_bulk_schema.load(request.get_json() or {})
+        
+        updated = Notification.bulk_mark_as_read(current_user_id, ids=data['ids'])
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'updated': updated
+            },
+            'message': f'{updated} notifications marked as read'
+        }), 200
+        
+    except ValidationError as e:
+        return jsonify({
+            'success': False,
+            'error': e.messages
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@notifications_bp.route('/notifications/unread', methods=['POST'])
+@jwt_required()
+def mark_selected_notifications_as_unread():
+    """Marca como no leídas las notificaciones seleccionadas"""
+    try:
+        current_user_id = get_jwt_identity()
+        
+        data = notification_bulk_schema.load(request.get_json() or {})
+        
+        updated = Notification.bulk_mark_as_unread(current_user_id, ids=data['ids'])
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'updated': updated
+            },
+            'message': f'{updated} notifications marked as unread'
+        }), 200
+        
+    except ValidationError as e:
+        return jsonify({
+            'success': False,
+            'error': e.messages
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@notifications_bp.route('/notifications', methods=['DELETE'])
+@jwt_required()
+def delete_notifications():
+    """Elimina las notificaciones del usuario que cumplan los filtros"""
+    try:
+        current_user_id = get_jwt_identity()
         
-        # Marcar todas como leídas
-        for notification in unread_notifications:
-            notification.mark_as_read()
+        data = notification_bulk_delete_schema.load(request.get_json() or {})
         
+        importance = data.get('importance')
+        deleted = Notification.bulk_delete(
+            current_user_id,
+            ids=data.get('ids'),
+            is_read=data.get('is_read'),
+            importance=NotificationImportance(importance) if importance else None,
+            before=data.get('before')
+        )
         db.session.commit()
         
         return jsonify({
             'success': True,
-            'message': f'{len(unread_notifications)} notifications marked as read'
+            'data': {
+                'deleted': deleted
+            },
+            'message': f'{deleted} notifications deleted'
         }), 200
         
+    except ValidationError as e:
+        return jsonify({
+            'success': False,
+            'error': e.messages
+        }), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -387,10 +591,7 @@ def get_unread_count():
     try:
         current_user_id = get_jwt_identity()
         
-        unread_count = Notification.query.filter_by(
-            user_id=current_user_id,
-            is_read=False
-        ).count()
+        unread_count = NotificationCounter.get_unread_count(current_user_id)
         
         return jsonify({
             'success': True,
@@ -403,4 +604,169 @@ def get_unread_count():
         return jsonify({
             'success': False,
             'error': str(e)
-        }), 500 
\ No newline at end of file
+        }), 500
+
+
+@notifications_bp.route('/notifications/stream/ticket', methods=['POST'])
+@jwt_required()
+def create_stream_ticket():
+    """Emite un ticket de un solo uso para abrir el stream SSE (EventSource no permite cabeceras)"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'ticket': issue_stream_ticket(get_jwt_identity()),
+            'expires_in': ticket_ttl()
+        }
+    }), 201
+
+
+@notifications_bp.route('/notifications/stream', methods=['GET'])
+def stream_notifications():
+    """Stream SSE con las nuevas notificaciones y cambios del contador de no leídas
+
+    Se abre con ?ticket= obtenido de POST /notifications/stream/ticket; el
+    token de acceso nunca va en la URL. Cada ticket sirve una sola vez: al
+    reconectar, el cliente pide uno nuevo.
+    """
+    keepalive = current_app.config.get('NOTIFICATIONS_STREAM_KEEPALIVE', 15)
+    if not notification_hub.acquire_stream():
+        # Sin hilos libres para otro stream: el cliente puede consultar /unread-count mientras tanto
+        return jsonify({
+            'success': False,
+            'error': 'Demasiados streams abiertos, inténtalo más tarde'
+        }), 503, {'Retry-After': str(keepalive)}
+    
+    current_user_id = redeem_stream_ticket(request.args.get('ticket'))
+    if current_user_id is None or not token_blocklist.is_active_user(current_user_id) \
+            or token_blocklist.is_revoked(token_blocklist.user_key(current_user_id)):
+        notification_hub.release_stream()
+        db.session.remove()
+        return jsonify({
+            'success': False,
+            'error': 'Ticket inválido, caducado o ya usado'
+        }), 401
+    
+    dsn = None
+    if notification_hub.use_pg_notify and db.engine.dialect.name == 'postgresql':
+        dsn = db.engine.url.set(drivername='postgresql').render_as_string(hide_password=False)
+    subscription = notification_hub.subscribe(current_user_id, dsn=dsn)
+    closed = []
+    
+    def close_stream():
+        # Se llama al cerrar la respuesta, aunque el generador no haya llegado a arrancar
+        if not closed:
+            closed.append(True)
+            notification_hub.unsubscribe(current_user_id, subscription)
+            notification_hub.release_stream()
+    
+    try:
+        # Estado inicial para que el cliente no tenga que consultarlo por separado
+        unread_count = NotificationCounter.get_unread_count(current_user_id)
+    except Exception as e:
+        close_stream()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    finally:
+        # El stream es de larga duración: no retener la conexión a la base de datos
+        db.session.remove()
+    
+    def format_event(event_name, data):
+        return f'event: {event_name}\ndata: {json.dumps(data, default=str)}\n\n'
+    
+    def generate():
+        try:
+            yield f'retry: {keepalive * 1000}\n\n'
+            yield format_event('unread_count', {'unread_count': unread_count})
+            while True:
+                try:
+                    event_name, data = subscription.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_event(event_name, data)
+        finally:
+            close_stream()
+    
+    response = Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    response.call_on_close(close_stream)
+    return response
+
+
+@notifications_bp.cli.command('retention')
+@click.option('--days', type=int, default=None, help='Edad mínima (en días) de las notificaciones leídas a archivar')
+@click.option('--batch-size', type=int, default=None, help='Filas por lote')
+@click.option('--max-batches', type=int, default=None, help='Número máximo de lotes en esta ejecución')
+@click.option('--delete', 'delete_only', is_flag=True, default=None, help='Eliminar en lugar de archivar')
+def retention_command(days, batch_size, max_batches, delete_only):
+    """Archiva notificaciones leídas antiguas y mantiene las particiones mensuales
+
+    Eliminar una partición vacía bloquea la tabla notifications por completo
+    durante unos milisegundos (DETACH PARTITION). El bloqueo se espera como
+    máximo NOTIFICATIONS_PARTITION_LOCK_TIMEOUT_MS; si no se obtiene, la
+    partición se deja para la siguiente ejecución. Conviene programarlo en
+    horas de poco tráfico.
+    """
+    config = current_app.config
+    if delete_only is None:
+        delete_only = config.get('NOTIFICATIONS_RETENTION_MODE', 'archive') == 'delete'
+    
+    result = run_retention(
+        older_than_days=days if days is not None else config.get('NOTIFICATIONS_RETENTION_DAYS', 90),
+        batch_size=batch_size if batch_size is not None else config.get('NOTIFICATIONS_RETENTION_BATCH_SIZE', 1000),
+        max_batches=max_batches,
+        delete_only=delete_only,
+        months_ahead=config.get('NOTIFICATIONS_PARTITION_MONTHS_AHEAD', 3),
+        lock_timeout_ms=config.get('NOTIFICATIONS_PARTITION_LOCK_TIMEOUT_MS', 1000)
+    )
+    click.echo(json.dumps(result))
+
+
+@notifications_bp.cli.command('partition-table')
+@click.option('--keep-old', is_flag=True, help='Conservar la tabla original como notifications_unpartitioned')
+@click.option('--lock-timeout-ms', type=int, default=5000, help='Espera máxima por el bloqueo de la tabla')
+def partition_table_command(keep_old, lock_timeout_ms):
+    """Convierte una tabla notifications sin particionar en la tabla particionada por mes
+
+    Crea la tabla particionada con su partición DEFAULT y las mensuales que
+    cubren los datos, copia las filas y sustituye a la original en una sola
+    transacción. Bloquea notifications durante la copia: ejecutar una vez,
+    tras `flask db upgrade` y con la aplicación detenida.
+    """
+    result = convert_to_partitioned(
+        Notification.__table__,
+        months_ahead=current_app.config.get('NOTIFICATIONS_PARTITION_MONTHS_AHEAD', 3),
+        keep_old=keep_old,
+        lock_timeout_ms=lock_timeout_ms
+    )
+    click.echo(json.dumps(result))
+
+
+@notifications_bp.cli.command('run-broadcasts')
+@click.option('--limit', type=int, default=None, help='Número máximo de difusiones a procesar')
+@click.option('--retry-failed', is_flag=True, help='Reintentar también las difusiones fallidas')
+def run_broadcasts_command(limit, retry_failed):
+    """Reparte las difusiones pendientes o abandonadas (retoman desde su último lote)"""
+    if retry_failed:
+        NotificationBroadcast.query.filter_by(status=NotificationBroadcast.STATUS_FAILED).update(
+            {'status': NotificationBroadcast.STATUS_PENDING}
+        )
+        db.session.commit()
+    results = notification_broadcaster.run_pending(limit)
+    click.echo(json.dumps({'processed': len(results), 'broadcasts': results}))
+
+
+@notifications_bp.cli.command('reconcile-counters')
+@click.option('--user-id', default=None, help='Recalcular sólo el contador de este usuario')
+@click.option('--batch-size', type=int, default=500, help='Contadores por lote')
+def reconcile_counters_command(user_id, batch_size):
+    """Recalcula los contadores de no leídas a partir de las notificaciones"""
+    click.echo(json.dumps(NotificationCounter.reconcile(user_id=user_id, batch_size=batch_size)))
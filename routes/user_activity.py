@@ -1,54 +1,99 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from marshmallow import ValidationError
-from extensions import db
-from models.user_activity import UserActivity
+from extensions import db, activity_buffer
+from utils.partitions import convert_to_partitioned, ensure_monthly_partitions
+from utils.user_cache import current_user_is_admin
+from models.file import File
+from models.user_activity import UserActivity, UserActivityRollup
 from schemas.user_activity_schema import (
     CreateUserActivitySchema,
+    CreateUserActivityBatchSchema,
     UpdateUserActivitySchema,
     UserActivityResponseSchema,
 )
 from datetime import datetime
+from sqlalchemy import tuple_
+import base64
+import click
+import csv
+import io
+import json
+import logging
 import uuid
 
+logger = logging.getLogger(__name__)
+
 activity_bp = Blueprint("activity", __name__)
 
 create_schema = CreateUserActivitySchema()
+batch_create_schema = CreateUserActivityBatchSchema()
 update_schema = UpdateUserActivitySchema()
 response_schema = UserActivityResponseSchema()
 
 
+def build_activity_rows(user_id, events):
+    """Construye las filas de actividad con los datos de la petición actual"""
+    # Obtener IP real de la petición
+    ip_address = request.headers.get("X-Forwarded-For", request.remote_addr)
+    # Obtener user-agent de la petición
+    user_agent = request.headers.get("User-Agent")
+    created_at = datetime.utcnow()
+
+    return [
+        {
+            "id": uuid.uuid4(),
+            "user_id": uuid.UUID(str(user_id)),
+            "event": data["event"],
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "file_id": data.get("file_id"),
+            "created_at": created_at,
+        }
+        for data in events
+    ]
+
+
 @activity_bp.route("/", methods=["POST"])
 @jwt_required()
 def create_activity():
-    """Registrar una nueva actividad del usuario"""
+    """Registrar una nueva actividad del usuario (se escribe en segundo plano)"""
     try:
         user_id = get_jwt_identity()
         # Carga solo los campos que el usuario puede enviar (sin ip_address ni user_agent)
         data = create_schema.load(request.json, partial=("ip_address", "user_agent"))
 
-        # Obtener IP real de la petición
-        ip_address = request.headers.get("X-Forwarded-For", request.remote_addr)
-        # Obtener user-agent de la petición
-        user_agent = request.headers.get("User-Agent")
-
-        activity = UserActivity(
-            user_id=user_id,
-            event=data["event"],
-            ip_address=ip_address,
-            user_agent=user_agent,
-            file_id=data.get("file_id"),
-        )
-        db.session.add(activity)
-        db.session.commit()
+        rows = build_activity_rows(user_id, [data])
+        if not activity_buffer.add(rows):
+            return jsonify({"error": "Servicio ocupado, intenta de nuevo"}), 503
 
-        return jsonify({"activity": response_schema.dump(activity)}), 201
+        return jsonify({"activity": response_schema.dump(rows[0])}), 202
 
     except ValidationError as err:
         return jsonify({"error": "Datos inválidos", "details": err.messages}), 400
-    except Exception as e:
-        print(e)
-        db.session.rollback()
+    except Exception:
+        logger.exception("Error registering activity")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+
+@activity_bp.route("/batch", methods=["POST"])
+@jwt_required()
+def create_activities_batch():
+    """Registrar varias actividades del usuario en una sola petición"""
+    try:
+        user_id = get_jwt_identity()
+        data = batch_create_schema.load(request.json)
+
+        rows = build_activity_rows(user_id, data["events"])
+        if not activity_buffer.add(rows):
+            return jsonify({"error": "Servicio ocupado, intenta de nuevo"}), 503
+
+        return jsonify({"accepted": len(rows)}), 202
+
+    except ValidationError as err:
+        return jsonify({"error": "Datos inválidos", "details": err.messages}), 400
+    except Exception:
+        logger.exception("Error registering activity batch")
         return jsonify({"error": "Error interno del servidor"}), 500
 
 
@@ -59,7 +104,8 @@ def get_user_activities():
     try:
         user_id = get_jwt_identity()
         activities = (
-            UserActivity.query.filter_by(user_id=user_id)
+            UserActivity.with_file_summary()
+            .filter(UserActivity.user_id == user_id)
             .order_by(UserActivity.created_at.desc())
             .all()
         )
@@ -69,14 +115,31 @@ def get_user_activities():
         return jsonify({"error": "Error interno del servidor"}), 500
 
 
+def encode_cursor(activity):
+    """Cursor opaco con la posición (created_at, id) de la última actividad de la página"""
+    raw = f"{activity.created_at.isoformat()}|{activity.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    created_at, activity_id = raw.split("|", 1)
+    return datetime.fromisoformat(created_at), uuid.UUID(activity_id)
+
+
 @activity_bp.route("/user/range", methods=["GET"])
 @jwt_required()
 def get_user_activities_by_date():
-    """Obtener actividades del usuario autenticado en un rango de fecha"""
+    """Obtener actividades del usuario autenticado en un rango de fecha
+
+    Con 'limit' responde por páginas (paginación por clave con 'cursor')
+    """
     try:
         user_id = get_jwt_identity()
         start = request.args.get("start")
         end = request.args.get("end")
+        limit = request.args.get("limit", type=int)
+        cursor = request.args.get("cursor")
 
         if not start or not end:
             return jsonify({"error": "Parámetros 'start' y 'end' requeridos"}), 400
@@ -84,17 +147,48 @@ def get_user_activities_by_date():
         start_date = datetime.fromisoformat(start)
         end_date = datetime.fromisoformat(end)
 
-        activities = (
-            UserActivity.query.filter(
+        query = (
+            UserActivity.with_file_summary()
+            .filter(
                 UserActivity.user_id == user_id,
                 UserActivity.created_at >= start_date,
                 UserActivity.created_at <= end_date,
             )
-            .order_by(UserActivity.created_at.desc())
-            .all()
+            .order_by(UserActivity.created_at.desc(), UserActivity.id.desc())
         )
 
-        return jsonify({"activities": response_schema.dump(activities, many=True)}), 200
+        if limit is None and not cursor:
+            activities = query.all()
+            return jsonify({"activities": response_schema.dump(activities, many=True)}), 200
+
+        if cursor:
+            try:
+                cursor_created_at, cursor_id = decode_cursor(cursor)
+            except Exception:
+                return jsonify({"error": "Cursor inválido"}), 400
+            query = query.filter(
+                tuple_(UserActivity.created_at, UserActivity.id)
+                < tuple_(cursor_created_at, cursor_id)
+            )
+
+        limit = min(max(limit or 100, 1), 1000)
+        activities = query.limit(limit + 1).all()
+        has_more = len(activities) > limit
+        activities = activities[:limit]
+
+        return (
+            jsonify(
+                {
+                    "activities": response_schema.dump(activities, many=True),
+                    "pagination": {
+                        "limit": limit,
+                        "has_more": has_more,
+                        "next_cursor": encode_cursor(activities[-1]) if has_more else None,
+                    },
+                }
+            ),
+            200,
+        )
 
     except ValueError:
         return jsonify({"error": "Formato de fecha inválido. Usa ISO 8601."}), 400
@@ -102,22 +196,220 @@ def get_user_activities_by_date():
         return jsonify({"error": "Error interno del servidor"}), 500
 
 
+EXPORT_COLUMNS = [
+    "id",
+    "user_id",
+    "event",
+    "ip_address",
+    "user_agent",
+    "file_id",
+    "file_name",
+    "created_at",
+]
+
+
+@activity_bp.route("/user/export", methods=["GET"])
+@jwt_required()
+def export_user_activities():
+    """Exportar las actividades del usuario autenticado como CSV o NDJSON en streaming
+
+    Usa un cursor del lado del servidor y escribe la respuesta por bloques, por lo
+    que la memoria no crece con el número de filas. 'start' y 'end' son opcionales.
+    """
+    try:
+        user_id = get_jwt_identity()
+        export_format = request.args.get("format", "csv").lower()
+        start = request.args.get("start")
+        end = request.args.get("end")
+
+        if export_format not in ("csv", "ndjson"):
+            return jsonify({"error": "Parámetro 'format' debe ser csv o ndjson"}), 400
+
+        filters = [UserActivity.user_id == user_id]
+        if start:
+            filters.append(UserActivity.created_at >= datetime.fromisoformat(start))
+        if end:
+            filters.append(UserActivity.created_at <= datetime.fromisoformat(end))
+
+    except ValueError:
+        return jsonify({"error": "Formato de fecha inválido. Usa ISO 8601."}), 400
+
+    batch_size = current_app.config.get("ACTIVITY_EXPORT_BATCH_SIZE", 1000)
+    statement = (
+        db.select(
+            UserActivity.id,
+            UserActivity.user_id,
+            UserActivity.event,
+            UserActivity.ip_address,
+            UserActivity.user_agent,
+            UserActivity.file_id,
+            File.name.label("file_name"),
+            UserActivity.created_at,
+        )
+        .outerjoin(File, File.id == UserActivity.file_id)
+        .where(*filters)
+        .order_by(UserActivity.created_at.desc(), UserActivity.id.desc())
+        # yield_per activa stream_results: psycopg2 usa un cursor con nombre
+        .execution_options(yield_per=batch_size)
+    )
+
+    def serialize(row):
+        return {
+            "id": str(row.id),
+            "user_id": str(row.user_id),
+            "event": row.event,
+            "ip_address": row.ip_address,
+            "user_agent": row.user_agent,
+            "file_id": str(row.file_id) if row.file_id else None,
+            "file_name": row.file_name,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+        }
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        if export_format == "csv":
+            writer.writeheader()
+
+        for partition in db.session.execute(statement).partitions():
+            for row in partition:
+                if export_format == "csv":
+                    writer.writerow(serialize(row))
+                else:
+                    buffer.write(json.dumps(serialize(row)) + "\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        remaining = buffer.getvalue()
+        if remaining:
+            yield remaining
+
+    mimetype = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    filename = f"activity-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{export_format}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+def activity_rollup_row(activity):
+    """Dimensiones de una actividad usadas por los agregados"""
+    return {
+        "created_at": activity.created_at,
+        "user_id": activity.user_id,
+        "event": activity.event,
+        "file_id": activity.file_id,
+    }
+
+
+@activity_bp.route("/rollups", methods=["GET"])
+@jwt_required()
+def get_activity_rollups():
+    """Obtener conteos agregados de actividad por hora o día en un rango
+
+    Parámetros: granularity (hour|day), start, end, event, file_id, user_id
+    (solo admin; sin él un admin consulta a todos los usuarios) y group_by
+    con cualquier combinación de user, event y file.
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        granularity = request.args.get("granularity", UserActivityRollup.GRANULARITY_DAY)
+        start = request.args.get("start")
+        end = request.args.get("end")
+        group_by = [
+            dimension.strip()
+            for dimension in request.args.get("group_by", "event").split(",")
+            if dimension.strip()
+        ]
+
+        if granularity not in UserActivityRollup.GRANULARITIES:
+            return jsonify({"error": "Parámetro 'granularity' debe ser hour o day"}), 400
+        if not start or not end:
+            return jsonify({"error": "Parámetros 'start' y 'end' requeridos"}), 400
+
+        dimensions = {
+            "user": UserActivityRollup.user_id,
+            "event": UserActivityRollup.event,
+            "file": UserActivityRollup.file_id,
+        }
+        if any(dimension not in dimensions for dimension in group_by):
+            return jsonify({"error": "Parámetro 'group_by' admite: user, event, file"}), 400
+
+        start_date = UserActivityRollup.bucket(datetime.fromisoformat(start), granularity)
+        end_date = datetime.fromisoformat(end)
+
+        filters = [
+            UserActivityRollup.granularity == granularity,
+            UserActivityRollup.bucket_start >= start_date,
+            UserActivityRollup.bucket_start <= end_date,
+        ]
+
+        # Los usuarios estándar solo ven sus propios agregados
+        if current_user_is_admin():
+            if request.args.get("user_id"):
+                filters.append(UserActivityRollup.user_id == uuid.UUID(request.args["user_id"]))
+        else:
+            filters.append(UserActivityRollup.user_id == current_user_id)
+
+        if request.args.get("event"):
+            filters.append(UserActivityRollup.event == request.args["event"])
+        if request.args.get("file_id"):
+            filters.append(UserActivityRollup.file_id == uuid.UUID(request.args["file_id"]))
+
+        columns = [UserActivityRollup.bucket_start] + [dimensions[d] for d in group_by]
+        rows = db.session.execute(
+            db.select(*columns, db.func.sum(UserActivityRollup.event_count).label("count"))
+            .where(*filters)
+            .group_by(*columns)
+            .order_by(UserActivityRollup.bucket_start)
+        ).all()
+
+        rollups = []
+        for row in rows:
+            item = {"bucket_start": row.bucket_start.isoformat(), "count": int(row.count)}
+            if "user" in group_by:
+                item["user_id"] = str(row.user_id)
+            if "event" in group_by:
+                item["event"] = row.event
+            if "file" in group_by:
+                item["file_id"] = (
+                    None if row.file_id == UserActivityRollup.NO_FILE else str(row.file_id)
+                )
+            rollups.append(item)
+
+        return jsonify({"granularity": granularity, "rollups": rollups}), 200
+
+    except ValueError:
+        return jsonify({"error": "Formato de fecha o identificador inválido"}), 400
+    except Exception:
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+
 @activity_bp.route("/<uuid:activity_id>", methods=["PATCH"])
 @jwt_required()
 def update_activity(activity_id):
     """Actualizar actividad por ID (solo del mismo usuario)"""
     try:
         user_id = get_jwt_identity()
-        activity = UserActivity.query.get_or_404(activity_id)
+        activity = UserActivity.query.filter_by(id=activity_id).first_or_404()
 
         if str(activity.user_id) != str(user_id):
             return jsonify({"error": "Acceso denegado"}), 403
 
         data = update_schema.load(request.json, partial=True)
 
+        previous = activity_rollup_row(activity)
         for key, value in data.items():
             setattr(activity, key, value)
 
+        # Mover el conteo si cambió la dimensión agregada
+        current = activity_rollup_row(activity)
+        if current != previous:
+            UserActivityRollup.increment([previous], sign=-1)
+            UserActivityRollup.increment([current])
+
         db.session.commit()
         return jsonify({"message": "Actividad actualizada"}), 200
 
@@ -134,11 +426,12 @@ def delete_activity(activity_id):
     """Eliminar actividad por ID (solo del mismo usuario)"""
     try:
         user_id = get_jwt_identity()
-        activity = UserActivity.query.get_or_404(activity_id)
+        activity = UserActivity.query.filter_by(id=activity_id).first_or_404()
 
         if str(activity.user_id) != str(user_id):
             return jsonify({"error": "Acceso denegado"}), 403
 
+        UserActivityRollup.increment([activity_rollup_row(activity)], sign=-1)
         db.session.delete(activity)
         db.session.commit()
         return jsonify({"message": "Actividad eliminada"}), 200
@@ -146,3 +439,47 @@ def delete_activity(activity_id):
     except Exception:
         db.session.rollback()
         return jsonify({"error": "Error interno del servidor"}), 500
+
+
+@activity_bp.cli.command("partitions")
+@click.option("--months-ahead", type=int, default=None, help="Meses futuros a preparar")
+def partitions_command(months_ahead):
+    """Crea las particiones mensuales de user_activity por adelantado"""
+    if months_ahead is None:
+        months_ahead = current_app.config.get("ACTIVITY_PARTITION_MONTHS_AHEAD", 3)
+    created = ensure_monthly_partitions(
+        UserActivity.__tablename__,
+        months_ahead,
+        current_app.config.get("ACTIVITY_PARTITION_LOCK_TIMEOUT_MS", 1000),
+    )
+    click.echo(json.dumps({"partitions_created": created}))
+
+
+@activity_bp.cli.command("partition-table")
+@click.option("--keep-old", is_flag=True, help="Conservar la tabla original como user_activity_unpartitioned")
+@click.option("--lock-timeout-ms", type=int, default=5000, help="Espera máxima por el bloqueo de la tabla")
+def partition_table_command(keep_old, lock_timeout_ms):
+    """Convierte una tabla user_activity sin particionar en la tabla particionada por mes
+
+    Crea la tabla particionada con su partición DEFAULT y las mensuales que
+    cubren los datos, copia las filas y sustituye a la original en una sola
+    transacción. Bloquea user_activity durante la copia: ejecutar una vez,
+    tras `flask db upgrade` y con la aplicación detenida.
+    """
+    result = convert_to_partitioned(
+        UserActivity.__table__,
+        months_ahead=current_app.config.get("ACTIVITY_PARTITION_MONTHS_AHEAD", 3),
+        keep_old=keep_old,
+        lock_timeout_ms=lock_timeout_ms,
+    )
+    click.echo(json.dumps(result))
+
+
+@activity_bp.cli.command("rollups-rebuild")
+@click.option("--start", required=True, help="Fecha inicial (ISO 8601, se toma el día completo)")
+@click.option("--end", required=True, help="Fecha final exclusiva (ISO 8601)")
+def rollups_rebuild_command(start, end):
+    """Recalcula los agregados de actividad desde user_activity para un rango de días"""
+    UserActivityRollup.rebuild(datetime.fromisoformat(start), datetime.fromisoformat(end))
+    db.session.commit()
+    click.echo(json.dumps({"rebuilt": {"start": start, "end": end}}))
@@ -8,6 +8,7 @@ from schemas.user_settings_schema import (
     user_settings_update_schema
 )
 from extensions import db
+from utils.user_cache import cached_user_settings, invalidate_user_settings
 from sqlalchemy.exc import IntegrityError
 import uuid
 
@@ -21,18 +22,12 @@ def get_user_settings():
     try:
         current_user_id = get_jwt_identity()
         
-        # Buscar configuraciones existentes
-        settings = UserSettings.query.filter_by(user_id=current_user_id).first()
-        
-        if not settings:
-            # Crear configuraciones por defecto si no existen
-            settings = UserSettings(user_id=current_user_id)
-            db.session.add(settings)
-            db.session.commit()
+        # Desde caché; se crean con los valores por defecto sólo la primera vez
+        settings = cached_user_settings(current_user_id)
         
         return jsonify({
             'success': True,
-            'data': user_settings_schema.dump(settings)
+            'data': settings
         }), 200
         
     except Exception as e:
@@ -75,6 +70,7 @@ def create_user_settings():
         # Crear y guardar las configuraciones
         db.session.add(settings_data)
         db.session.commit()
+        invalidate_user_settings(current_user_id)
         
         return jsonify({
             'success': True,
@@ -123,6 +119,7 @@ def update_user_settings():
                 setattr(settings, field, value)
         
         db.session.commit()
+        invalidate_user_settings(current_user_id)
         
         return jsonify({
             'success': True,
@@ -157,6 +154,7 @@ def delete_user_settings():
         # Eliminar configuraciones
         db.session.delete(settings)
         db.session.commit()
+        invalidate_user_settings(current_user_id)
         
         return jsonify({
             'success': True,
@@ -208,6 +206,7 @@ def reset_user_settings():
         settings.allow_account_aliases = True
         
         db.session.commit()
+        invalidate_user_settings(current_user_id)
         
         return jsonify({
             'success': True,
@@ -1,9 +1,23 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from extensions import db
+from datetime import datetime
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from extensions import db, password_hasher, token_blocklist, account_purger
 from models.user import User
+from models.account_deletion import AccountDeletion
 from schemas.user_schema import UserCreateSchema, UserUpdateSchema, UserResponseSchema
 from marshmallow import ValidationError
+from utils.password_hasher import HasherBusyError
+from utils.user_cache import (
+    current_user_profile,
+    current_user_record,
+    current_user_is_admin,
+    invalidate_user_profile,
+    invalidate_user_settings,
+)
+import click
+import json
 import uuid
 from marshmallow import EXCLUDE
 import re
@@ -27,7 +41,9 @@ def get_users():
         # Limitar per_page a máximo 50
         per_page = min(per_page, 50)
 
-        users = User.query.paginate(page=page, per_page=per_page, error_out=False)
+        users = User.query.filter(User.deleted_at.is_(None)).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
 
         return (
             jsonify(
@@ -55,8 +71,7 @@ def get_users():
 def get_own_user():
     """Obtener el propio usuario según token"""
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_user_profile()
 
         if not user:
             return jsonify({"error": "Usuario no encontrado"}), 404
@@ -73,23 +88,12 @@ def create_user():
     """Crear un nuevo usuario (solo admin)"""
     try:
         # Verificar si el usuario actual es admin
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
-
-        if not current_user or current_user.privilege != "admin":
+        if not current_user_is_admin():
             return jsonify({"error": "Acceso denegado"}), 403
 
         # Validar datos de entrada
         data = user_create_schema.load(request.json)
 
-        # Verificar si el email ya existe
-        if User.query.filter_by(email=data["email"]).first():
-            return jsonify({"error": "El email ya está registrado"}), 400
-
-        # Verificar si el username ya existe
-        if User.query.filter_by(username=data["username"]).first():
-            return jsonify({"error": "El username ya está en uso"}), 400
-        
         # Verificar si el avatar_url es válido
         avatar_url = "https://api.dicebear.com/6.x/bottts-neutral/svg?seed=" + data["username"]
 
@@ -108,22 +112,142 @@ def create_user():
         if "password" in data and data["password"]:
             user.set_password(data["password"])
 
-        # Guardar en base de datos
+        # Un solo INSERT: los índices únicos de email y username detectan los duplicados
         db.session.add(user)
+        db.session.flush()
+        user_data = user_response_schema.dump(user)
         db.session.commit()
 
         return (
             jsonify(
                 {
                     "message": "Usuario creado exitosamente",
-                    "user": user_response_schema.dump(user),
+                    "user": user_data,
                 }
             ),
             201,
         )
 
+    except IntegrityError as e:
+        db.session.rollback()
+        message = User.unique_violation_message(e)
+        if message:
+            return jsonify({"error": message}), 400
+        return jsonify({"error": "Error interno del servidor"}), 500
     except ValidationError as e:
         return jsonify({"error": "Datos inválidos", "details": e.messages}), 400
+    except HasherBusyError:
+        db.session.rollback()
+        return jsonify({"error": "Servidor ocupado, intenta de nuevo en unos segundos"}), 503, {"Retry-After": "1"}
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+
+@users_bp.route("/bulk", methods=["POST"])
+@jwt_required()
+def bulk_create_users():
+    """
+    Alta masiva de usuarios (solo admin)
+
+    Body: {"users": [{email, username, first_name, last_name, password?, login_type?, avatar_url?}, ...]}
+
+    Inserta por lotes de USERS_BULK_BATCH_SIZE con ON CONFLICT DO NOTHING:
+    los emails o usernames ya existentes se omiten y se reportan en skipped.
+
+    Las contraseñas se calculan en el pool acotado de password_hasher; si no
+    terminan en USERS_BULK_HASH_TIMEOUT segundos la petición responde 503 sin
+    crear ningún usuario. Cada hash cuesta ~0.4 s de CPU con el coste por
+    defecto, de ahí el límite bajo de USERS_BULK_MAX_ITEMS.
+    """
+    try:
+        if not current_user_is_admin():
+            return jsonify({"error": "Acceso denegado"}), 403
+
+        payload = request.get_json(silent=True) or {}
+        items = payload.get("users")
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "Se requiere una lista 'users' no vacía"}), 400
+
+        max_items = current_app.config.get("USERS_BULK_MAX_ITEMS", 50)
+        if len(items) > max_items:
+            return jsonify({"error": f"Máximo {max_items} usuarios por petición"}), 400
+
+        users = user_create_schema.load(items, many=True)
+
+        # Duplicados dentro del mismo lote: se queda la primera aparición
+        seen_emails, seen_usernames = set(), set()
+        unique_users, skipped = [], []
+        for data in users:
+            if data["email"] in seen_emails or data["username"] in seen_usernames:
+                skipped.append({"email": data["email"], "username": data["username"]})
+                continue
+            seen_emails.add(data["email"])
+            seen_usernames.add(data["username"])
+            unique_users.append(data)
+
+        passwords = [data.get("password") for data in unique_users]
+        hashes = password_hasher.hash_many(
+            [p for p in passwords if p], timeout=current_app.config.get("USERS_BULK_HASH_TIMEOUT", 20)
+        )
+        hashes = iter(hashes)
+
+        now = datetime.utcnow()
+        rows = []
+        for data, password in zip(unique_users, passwords):
+            rows.append(
+                {
+                    "id": uuid.uuid4(),
+                    "email": data["email"],
+                    "username": data["username"],
+                    "first_name": data["first_name"],
+                    "last_name": data["last_name"],
+                    "password_hash": next(hashes) if password else None,
+                    "privilege": User.PRIVILEGE_STANDARD,
+                    "login_type": data.get("login_type", User.LOGIN_EMAIL),
+                    "email_verified": False,
+                    "avatar_url": data.get("avatar_url")
+                    or "https://api.dicebear.com/6.x/bottts-neutral/svg?seed=" + data["username"],
+                    "description": data.get("description") or "",
+                    "created_at": now,
+                    "updated_at": now,
+                }
+            )
+
+        batch_size = max(1, current_app.config.get("USERS_BULK_BATCH_SIZE", 500))
+        created = []
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            statement = (
+                pg_insert(User.__table__)
+                .values(batch)
+                .on_conflict_do_nothing()
+                .returning(User.__table__.c.id, User.__table__.c.email)
+            )
+            inserted = {email: str(user_id) for user_id, email in db.session.execute(statement)}
+            for row in batch:
+                if row["email"] in inserted:
+                    created.append({"id": inserted[row["email"]], "email": row["email"], "username": row["username"]})
+                else:
+                    skipped.append({"email": row["email"], "username": row["username"]})
+        db.session.commit()
+
+        return (
+            jsonify(
+                {
+                    "message": f"{len(created)} usuarios creados",
+                    "created": created,
+                    "skipped": skipped,
+                }
+            ),
+            201,
+        )
+
+    except ValidationError as e:
+        return jsonify({"error": "Datos inválidos", "details": e.messages}), 400
+    except HasherBusyError:
+        db.session.rollback()
+        return jsonify({"error": "Servidor ocupado, intenta de nuevo en unos segundos"}), 503, {"Retry-After": "1"}
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": "Error interno del servidor"}), 500
@@ -134,8 +258,7 @@ def create_user():
 def update_own_user():
     """Actualizar el propio usuario según token"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = current_user_record()
         if not current_user:
             return jsonify({"error": "Usuario no encontrado"}), 404
 
@@ -157,6 +280,7 @@ def update_own_user():
             setattr(current_user, field, value)
 
         db.session.commit()
+        invalidate_user_profile(current_user.id)
 
         return (
             jsonify(
@@ -180,8 +304,7 @@ def update_own_user():
 def delete_own_user():
     """Eliminar el propio usuario según token"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = current_user_record()
         if not current_user:
             return jsonify({"error": "Usuario no encontrado"}), 404
 
@@ -194,11 +317,64 @@ def delete_own_user():
                 400,
             )
 
-        db.session.delete(current_user)
+        # Marcar la cuenta y revocar el token; los datos se purgan en segundo plano por lotes
+        user_id = current_user.id
+        current_user.deleted_at = datetime.utcnow()
+        deletion = db.session.get(AccountDeletion, user_id) or AccountDeletion(user_id=user_id)
+        deletion.status = AccountDeletion.STATUS_PENDING
+        deletion.requested_at = datetime.utcnow()
+        db.session.add(deletion)
+        token_blocklist.revoke(get_jwt())
+        token_blocklist.revoke_user(user_id, current_app.config["JWT_REFRESH_TOKEN_EXPIRES"])
         db.session.commit()
+        invalidate_user_profile(user_id)
+        invalidate_user_settings(user_id)
+        account_purger.schedule(user_id)
 
-        return jsonify({"message": "Usuario eliminado exitosamente"}), 200
+        return (
+            jsonify(
+                {
+                    "message": "Usuario eliminado exitosamente",
+                    "deletion": deletion.to_dict(),
+                }
+            ),
+            200,
+        )
 
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": "Error interno del servidor"}), 500
+
+
+@users_bp.route("/<user_id>/deletion", methods=["GET"])
+@jwt_required()
+def get_user_deletion(user_id):
+    """Estado y progreso del borrado de una cuenta (solo admin)"""
+    try:
+        if not current_user_is_admin():
+            return jsonify({"error": "Acceso denegado"}), 403
+
+        deletion = db.session.get(AccountDeletion, uuid.UUID(user_id))
+        if not deletion:
+            return jsonify({"error": "Borrado no encontrado"}), 404
+
+        return jsonify({"deletion": deletion.to_dict()}), 200
+
+    except ValueError:
+        return jsonify({"error": "ID de usuario inválido"}), 400
+    except Exception as e:
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+
+@users_bp.cli.command("purge-deletions")
+@click.option("--limit", type=int, default=None, help="Número máximo de cuentas a purgar")
+@click.option("--retry-failed", is_flag=True, help="Reintentar también los borrados fallidos")
+def purge_deletions_command(limit, retry_failed):
+    """Purga los datos de las cuentas eliminadas pendientes o abandonadas"""
+    if retry_failed:
+        AccountDeletion.query.filter_by(status=AccountDeletion.STATUS_FAILED).update(
+            {"status": AccountDeletion.STATUS_PENDING}
+        )
+        db.session.commit()
+    results = account_purger.run_pending(limit)
+    click.echo(json.dumps({"purged": len(results), "deletions": results}))
@@ -1,4 +1,4 @@
-from marshmallow import Schema, fields, validate, post_load
+from marshmallow import Schema, fields, validate, post_load, validates_schema, ValidationError
 from typing import Dict, Any
 import uuid
 from datetime import datetime
@@ -51,8 +51,53 @@ class NotificationCreateSchema(Schema):
     importance = fields.Str(validate=validate.OneOf(['low', 'normal', 'high', 'critical']), default='normal')
 
 
+class NotificationBulkSchema(Schema):
+    """Esquema para operaciones masivas sobre notificaciones seleccionadas"""
+    
+    ids = fields.List(fields.UUID(), required=True, validate=validate.Length(min=1, max=1000))
+
+
+class NotificationBulkDeleteSchema(Schema):
+    """Esquema para eliminar notificaciones por filtro (al menos un filtro es requerido)"""
+    
+    ids = fields.List(fields.UUID(), validate=validate.Length(min=1, max=1000))
+    is_read = fields.Bool()
+    importance = fields.Str(validate=validate.OneOf(['low', 'normal', 'high', 'critical']))
+    before = fields.DateTime()
+    
+    @validates_schema
+    def validate_filters(self, data, **kwargs):
+        """Evita borrar todas las notificaciones por accidente"""
+        if not data:
+            raise ValidationError('At least one filter is required')
+
+
+class NotificationSegmentSchema(Schema):
+    """Esquema para filtrar los usuarios destinatarios de una difusión"""
+    
+    user_ids = fields.List(fields.UUID(), validate=validate.Length(min=1))
+    privilege = fields.Str(validate=validate.OneOf(['standard', 'admin', 'moderator']))
+    login_type = fields.Str(validate=validate.OneOf(['email', 'google', 'facebook', 'twitter']))
+    email_verified = fields.Bool()
+    created_after = fields.DateTime()
+    created_before = fields.DateTime()
+
+
+class NotificationBroadcastSchema(Schema):
+    """Esquema para difundir una notificación del sistema (sin segmento = todos los usuarios)"""
+    
+    title = fields.Str(required=True, validate=validate.Length(min=1, max=255))
+    content = fields.Str(required=True, validate=validate.Length(min=1))
+    importance = fields.Str(validate=validate.OneOf(['low', 'normal', 'high', 'critical']), load_default='normal')
+    segment = fields.Nested(NotificationSegmentSchema, load_default=dict)
+
+
 # Instancias de esquemas
 notification_schema = NotificationSchema()
 notification_list_schema = NotificationSchema(many=True)
 notification_update_schema = NotificationUpdateSchema()
-notification_create_schema = NotificationCreateSchema() 
\ No newline at end of file
+notification_create_schema = NotificationCreateSchema()
+notification_bulk_schema = NotificationBulkSchema()
+notification_bulk_delete_schema = NotificationBulkDeleteSchema()
+notification_broadcast_schema = NotificationBroadcastSchema()
+notification_segment_schema = NotificationSegmentSchema()
@@ -11,6 +11,14 @@ class CreateUserActivitySchema(Schema):
     file_id = fields.UUID(required=False, allow_none=True)
 
 
+class CreateUserActivityBatchSchema(Schema):
+    events = fields.List(
+        fields.Nested(CreateUserActivitySchema),
+        required=True,
+        validate=validate.Length(min=1, max=500),
+    )
+
+
 class UpdateUserActivitySchema(Schema):
     event = fields.Str(required=False, allow_none=True)
     ip_address = fields.Str(required=False, allow_none=True)
@@ -25,4 +33,9 @@ class UserActivityResponseSchema(Schema):
     ip_address = fields.Str()
     user_agent = fields.Str(allow_none=True)
     file_id = fields.UUID(allow_none=True)
+    file_name = fields.Method("get_file_name")
     created_at = fields.DateTime()
+
+    def get_file_name(self, obj):
+        file = getattr(obj, "file", None)
+        return file.name if file is not None else None
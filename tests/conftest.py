@@ -0,0 +1,98 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import pytest
+
+# Los módulos de la aplicación se importan desde la raíz del repositorio
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+class ScriptedUpstream:
+    """Servidor HTTP local que responde según un guion por ruta (estado, cuerpo JSON y demora)"""
+
+    def __init__(self):
+        self.hits = defaultdict(int)
+        self._scripts = defaultdict(deque)
+        self._defaults = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def respond(self, path: str, status: int = 200, body=None, delay: float = 0, times: int = 1):
+        """Encola respuestas de un solo uso para la ruta"""
+        with self._lock:
+            self._scripts[path].extend([(status, body, delay)] * times)
+
+    def always(self, path: str, status: int = 200, body=None, delay: float = 0):
+        """Respuesta para la ruta cuando no quedan respuestas encoladas"""
+        with self._lock:
+            self._defaults[path] = (status, body, delay)
+
+    def wait_for_hits(self, path: str, count: int, timeout: float = 2):
+        deadline = time.monotonic() + timeout
+        while self.hits[path] < count:
+            assert time.monotonic() < deadline, f"{path} recibió {self.hits[path]} de {count} peticiones"
+            time.sleep(0.01)
+
+    def _next(self, path: str):
+        with self._lock:
+            self.hits[path] += 1
+            if self._scripts[path]:
+                return self._scripts[path].popleft()
+            return self._defaults.get(path, (404, {"error": "not scripted"}, 0))
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, body, delay = upstream._next(urlsplit(self.path).path)
+                if delay:
+                    time.sleep(delay)
+                payload = json.dumps(body if body is not None else {}).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # El cliente ya abandonó la petición por timeout
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def upstream():
+    server = ScriptedUpstream()
+    server.start()
+    yield server
+    server.stop()
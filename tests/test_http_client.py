@@ -0,0 +1,186 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from utils.http_client import CircuitBreaker, CircuitOpenError, HttpClient
+
+RESET_TIMEOUT = 0.2
+
+
+@pytest.fixture
+def client():
+    http = HttpClient()
+    http.connect_timeout = 1.0
+    http.read_timeout = 0.3
+    http.failure_threshold = 3
+    http.reset_timeout = RESET_TIMEOUT
+    yield http
+    http.session.close()
+
+
+def _fail(client, upstream, path, status=500, times=3):
+    upstream.respond(path, status=status, times=times)
+    for _ in range(times):
+        client.get("provider", upstream.url(path))
+
+
+def test_5xx_opens_circuit_and_short_circuits_calls(client, upstream):
+    _fail(client, upstream, "/rates")
+
+    assert client.breaker("provider").state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        client.get("provider", upstream.url("/rates"))
+    # La llamada rechazada no llega al proveedor
+    assert upstream.hits["/rates"] == 3
+
+
+def test_429_counts_as_failure(client, upstream):
+    _fail(client, upstream, "/rates", status=429)
+
+    assert client.breaker("provider").snapshot()["state"] == CircuitBreaker.OPEN
+    assert client.health_states()["provider"]["status_code"] == 429
+    assert client.health_states()["provider"]["ok"] is False
+
+
+def test_4xx_is_returned_without_counting_as_failure(client, upstream):
+    upstream.respond("/rates", status=500, times=2)
+    upstream.respond("/rates", status=404)
+    for _ in range(3):
+        client.get("provider", upstream.url("/rates"))
+
+    assert client.breaker("provider").snapshot() == {"state": CircuitBreaker.CLOSED, "failures": 0, "retry_in": None}
+
+
+def test_timeout_counts_as_failure(client, upstream):
+    upstream.always("/slow", delay=client.read_timeout + 0.3)
+    for _ in range(3):
+        with pytest.raises(requests.Timeout):
+            client.get("provider", upstream.url("/slow"))
+
+    assert client.breaker("provider").state == CircuitBreaker.OPEN
+    assert client.health_states()["provider"]["error"] == "ReadTimeout"
+
+
+def test_half_open_lets_a_single_trial_through_and_closes_on_success(client, upstream):
+    _fail(client, upstream, "/rates")
+    assert client.breaker("provider").snapshot()["retry_in"] <= RESET_TIMEOUT
+    time.sleep(RESET_TIMEOUT + 0.05)
+
+    upstream.respond("/rates", status=200, body={"ok": True}, delay=0.2)
+    trial = {}
+    thread = threading.Thread(target=lambda: trial.update(response=client.get("provider", upstream.url("/rates"))))
+    thread.start()
+    upstream.wait_for_hits("/rates", 4)
+
+    # Mientras la prueba está en curso el resto de llamadas se rechazan
+    assert client.breaker("provider").state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        client.get("provider", upstream.url("/rates"))
+
+    thread.join()
+    assert trial["response"].json() == {"ok": True}
+    assert client.breaker("provider").snapshot() == {"state": CircuitBreaker.CLOSED, "failures": 0, "retry_in": None}
+    assert upstream.hits["/rates"] == 4
+
+
+def test_half_open_trial_failure_reopens_circuit(client, upstream):
+    _fail(client, upstream, "/rates")
+    time.sleep(RESET_TIMEOUT + 0.05)
+
+    upstream.respond("/rates", status=503)
+    client.get("provider", upstream.url("/rates"))
+
+    assert client.breaker("provider").state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        client.get("provider", upstream.url("/rates"))
+
+
+def test_circuits_are_per_provider(client, upstream):
+    _fail(client, upstream, "/rates")
+    upstream.respond("/other", body={"ok": True})
+
+    assert client.get("other", upstream.url("/other")).status_code == 200
+    assert client.breaker_states()["provider"]["state"] == CircuitBreaker.OPEN
+    assert client.breaker_states()["other"]["state"] == CircuitBreaker.CLOSED
+
+
+@pytest.fixture
+def currency_app(upstream, monkeypatch):
+    from app import app
+    from extensions import http_client
+
+    monkeypatch.setitem(app.config, "FREE_CURRENCY_API_KEY", "test-key")
+    monkeypatch.setitem(app.config, "FREE_CURRENCY_API_URL", upstream.url("/free/v1/latest"))
+    monkeypatch.setitem(app.config, "FRANKFURTER_API_URL", upstream.url("/frankfurter/latest"))
+    monkeypatch.setitem(app.config, "BING_NEWS_API_KEY", None)
+    monkeypatch.setattr(http_client, "read_timeout", 0.3)
+    monkeypatch.setattr(http_client, "reset_timeout", RESET_TIMEOUT)
+    monkeypatch.setattr(http_client, "_breakers", {})
+    monkeypatch.setattr(http_client, "_health", {})
+    with app.app_context():
+        yield app
+
+
+FRANKFURTER_RATES = {"base": "EUR", "rates": {"USD": 1.25, "GBP": 0.85}}
+
+
+def test_currency_service_fails_over_to_frankfurter(currency_app, upstream):
+    from utils.api_services import CurrencyService
+
+    upstream.always("/free/v1/latest", status=500)
+    upstream.always("/frankfurter/latest", body=FRANKFURTER_RATES)
+    service = CurrencyService()
+
+    for _ in range(3):
+        result = service.fetch_rates()
+        assert result["success"] is True
+        assert result["source"] == "Frankfurter API (converted from EUR base)"
+    assert result["rates"]["EUR"] == pytest.approx(0.8)
+    assert result["rates"]["GBP"] == pytest.approx(0.68)
+
+    # Con el circuito abierto Free Currency ya no se consulta
+    service.fetch_rates()
+    assert upstream.hits["/free/v1/latest"] == 3
+    assert upstream.hits["/frankfurter/latest"] == 4
+
+
+def test_currency_service_reports_failure_when_both_providers_are_down(currency_app, upstream):
+    from utils.api_services import CurrencyService
+
+    upstream.always("/free/v1/latest", status=500)
+    upstream.always("/frankfurter/latest", status=429)
+
+    result = CurrencyService().fetch_rates()
+    assert result["success"] is False
+    assert result["error"] == "Both currency APIs are unavailable"
+
+
+def test_service_status_reports_open_circuit_and_active_source(currency_app, upstream):
+    from utils.api_services import CurrencyService, ServiceStatus
+
+    upstream.always("/free/v1/latest", status=500)
+    upstream.always("/frankfurter/latest", body=FRANKFURTER_RATES)
+    service = CurrencyService()
+    for _ in range(3):
+        service.fetch_rates()
+
+    status = ServiceStatus().get_status()
+    currency = status["currency_service"]
+    assert currency["available"] is True
+    assert currency["source"] == "Frankfurter API"
+    assert currency["providers"]["free_currency"]["available"] is False
+    assert currency["providers"]["free_currency"]["status_code"] == 500
+    assert currency["providers"]["free_currency"]["circuit"]["state"] == "open"
+    assert currency["providers"]["frankfurter"]["available"] is True
+    assert currency["providers"]["frankfurter"]["circuit"]["state"] == "closed"
+    assert status["news_service"]["available"] is False
+
+    # Tras reset_timeout un proveedor recuperado vuelve a estar disponible
+    time.sleep(RESET_TIMEOUT + 0.05)
+    upstream.always("/free/v1/latest", body={"data": {"EUR": 0.8}})
+    assert service.fetch_rates()["source"] == "Free Currency API"
+    providers = ServiceStatus().get_status()["currency_service"]["providers"]
+    assert providers["free_currency"]["available"] is True
+    assert providers["free_currency"]["circuit"]["state"] == "closed"
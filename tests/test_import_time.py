@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+# Presupuesto de `import app` en segundos; ajustable en máquinas lentas de CI
+IMPORT_BUDGET = float(os.environ.get("IMPORT_TIME_BUDGET", 2.0))
+HEAVY_MODULES = ("ledger_cli", "matplotlib", "numpy", "hook.ledger_parser")
+
+PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def _import_app():
+    # Proceso nuevo: los módulos ya importados por pytest no cuentan
+    env = dict(os.environ, LEDGER_WARMUP="off")
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_app_does_not_load_ledger_dependencies():
+    assert _import_app()["loaded"] == []
+
+
+def test_import_app_within_budget():
+    # El mejor de tres descarta el arranque en frío del disco
+    elapsed = min(_import_app()["elapsed"] for _ in range(3))
+    assert elapsed < IMPORT_BUDGET, f"import app tardó {elapsed:.2f}s (presupuesto {IMPORT_BUDGET}s)"
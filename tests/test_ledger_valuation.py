@@ -0,0 +1,83 @@
+from datetime import date
+
+import pytest
+
+from hook.ledger_valuation import CurrencyValuation
+
+RATES = {
+    (date(2024, 1, 10), "MXN"): 17.0,
+    (date(2024, 1, 15), "EUR"): 0.9,
+    (date(2024, 1, 15), "MXN"): 17.2,
+}
+
+TRANSACTIONS = [
+    {
+        "date": "2024/01/10",
+        "accounts": [
+            {"account": "Assets:Bank", "amount": 1700.0, "unit": "$"},
+            {"account": "Income:Salary", "amount": -1700.0, "unit": "$"},
+        ],
+    },
+    {
+        "date": "2024/01/15",
+        "properties": [{"key": "currency", "value": "EUR"}],
+        "accounts": [
+            {"account": "Expenses:Travel", "amount": 90.0, "unit": "$"},
+            {"account": "Assets:Bank", "amount": -90.0, "unit": "$"},
+        ],
+    },
+    {
+        # Sin tasa para GBP: el movimiento se queda en su moneda
+        "date": "2024/01/15",
+        "accounts": [{"account": "Expenses:Food", "amount": 10.0, "unit": "GBP"}],
+    },
+]
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def valuation(calls):
+    def rates_provider(keys):
+        calls.append(set(keys))
+        # Como usd_rates_for: USD->USD vale 1 en cualquier fecha
+        return {key: 1.0 if key[1] == "USD" else RATES[key] for key in keys if key[1] == "USD" or key in RATES}
+
+    return CurrencyValuation("USD", rates_provider, default_currency="MXN")
+
+
+def _amounts(transactions):
+    return [(posting["amount"], posting["unit"]) for transaction in transactions for posting in transaction["accounts"]]
+
+
+def test_converts_postings_to_reporting_currency(valuation):
+    converted = valuation.convert(TRANSACTIONS)
+
+    assert _amounts(converted) == [
+        (100.0, "USD"), (-100.0, "USD"), (100.0, "USD"), (-100.0, "USD"), (10.0, "GBP")
+    ]
+    assert converted[1]["accounts"][0]["original_currency"] == "EUR"
+    # La entrada no se modifica
+    assert TRANSACTIONS[0]["accounts"][0]["amount"] == 1700.0
+
+
+def test_summary_counts_each_posting_once_across_calls(valuation, calls):
+    # parse_ledger y calculates_ledger convierten las mismas transacciones con la misma instancia
+    valuation.convert(TRANSACTIONS)
+    valuation.convert(TRANSACTIONS)
+
+    summary = valuation.summary()
+    assert summary["postings_converted"] == 4
+    assert summary["missing_rates"] == [{"date": "2024-01-15", "currency": "GBP"}]
+    # Las tasas se consultan una sola vez por (fecha, moneda)
+    assert len(calls) == 1
+
+
+def test_summary_accumulates_postings_from_different_calls(valuation):
+    valuation.convert(TRANSACTIONS[:1])
+    valuation.convert(TRANSACTIONS)
+
+    assert valuation.summary()["postings_converted"] == 4
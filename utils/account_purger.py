@@ -0,0 +1,237 @@
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, delete, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+
+class AccountPurger:
+    """Purga en segundo plano los datos de las cuentas marcadas como eliminadas
+
+    El borrado de la cuenta sólo marca al usuario y registra un
+    AccountDeletion. Un hilo de fondo elimina después actividad, agregados,
+    notificaciones, archivos y configuraciones en lotes de batch_size filas,
+    cada uno con su propio commit y una pausa entre lotes, de modo que los
+    bloqueos duran poco y la base de datos no se satura. Al final se elimina
+    la fila del usuario. El progreso queda en AccountDeletion.progress.
+
+    Los borrados que un proceso deja a medias (sin avance durante
+    stale_after segundos) los retoma cualquier otro proceso o el comando
+    `flask users purge-deletions`.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.batch_size = 1000
+        self.batch_pause = 0.05
+        self.stale_after = 300
+        self._queue = None
+        self._worker = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('USER_PURGE_ENABLED', self.enabled)
+        self.batch_size = app.config.get('USER_PURGE_BATCH_SIZE', self.batch_size)
+        self.batch_pause = app.config.get('USER_PURGE_BATCH_PAUSE', self.batch_pause)
+        self.stale_after = app.config.get('USER_PURGE_STALE_AFTER', self.stale_after)
+        self._queue = queue.Queue()
+        app.extensions['account_purger'] = self
+
+    def schedule(self, user_id):
+        """Encola la purga; con USER_PURGE_ENABLED=false queda pendiente para el comando CLI"""
+        if not self.enabled:
+            return
+        self._ensure_worker()
+        self._queue.put(str(user_id))
+
+    def run_pending(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Procesa los borrados pendientes o abandonados; debe llamarse con app context"""
+        results = []
+        while limit is None or len(results) < limit:
+            user_id = self._claim()
+            if user_id is None:
+                break
+            results.append(self.purge(user_id))
+        return results
+
+    def purge(self, user_id) -> Dict[str, Any]:
+        """Purga los datos de un usuario ya reclamado; retorna el estado final del borrado"""
+        from extensions import db
+        from models.account_deletion import AccountDeletion
+
+        user_id = str(user_id)
+        try:
+            self._delete_user(user_id)
+            self._update(user_id, status=AccountDeletion.STATUS_DONE, current_step=None, finished_at=datetime.utcnow())
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Account purge for {user_id} failed: {str(e)}")
+            self._update(user_id, status=AccountDeletion.STATUS_FAILED, error=str(e))
+
+        deletion = db.session.get(AccountDeletion, user_id)
+        return deletion.to_dict() if deletion else {'user_id': user_id}
+
+    @staticmethod
+    def _steps():
+        from models.file import File
+        from models.notification import Notification, NotificationArchive, NotificationCounter
+        from models.user_activity import UserActivity, UserActivityRollup
+        from models.user_settings import UserSettings
+
+        # Orden según las claves foráneas: la actividad referencia archivos
+        return [
+            ('user_activity', UserActivity, (UserActivity.id, UserActivity.created_at)),
+            ('user_activity_rollups', UserActivityRollup, tuple(UserActivityRollup.__table__.primary_key.columns)),
+            ('notifications', Notification, (Notification.id, Notification.created_at)),
+            ('notifications_archive', NotificationArchive, (NotificationArchive.id,)),
+            ('notification_counters', NotificationCounter, (NotificationCounter.user_id,)),
+            ('files', File, (File.id,)),
+            ('user_settings', UserSettings, (UserSettings.id,)),
+        ]
+
+    def _purge_table(self, user_id: str, step: str, model, keys) -> int:
+        from extensions import db
+
+        total = 0
+        while True:
+            candidates = (
+                select(*keys)
+                .where(model.user_id == user_id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            removed = db.session.execute(
+                delete(model).where(tuple_(*keys).in_(candidates))
+            ).rowcount
+            total += removed
+            self._record_progress(user_id, step, removed)
+            db.session.commit()
+            # SKIP LOCKED salta las filas bloqueadas: un lote incompleto no implica que la tabla quede vacía
+            if removed < self.batch_size and not self._has_rows(user_id, model):
+                return total
+            if self.batch_pause:
+                time.sleep(self.batch_pause)
+            elif not removed:
+                time.sleep(0.1)
+
+    @staticmethod
+    def _has_rows(user_id: str, model) -> bool:
+        from extensions import db
+
+        return db.session.execute(
+            select(model.user_id).where(model.user_id == user_id).limit(1)
+        ).first() is not None
+
+    def _delete_user(self, user_id: str, attempts: int = 3):
+        """Purga todas las tablas y elimina la fila del usuario, repitiendo la purga si aparecen filas nuevas"""
+        from extensions import db
+        from models.user import User
+
+        for attempt in range(attempts):
+            for step, model, keys in self._steps():
+                self._purge_table(user_id, step, model, keys)
+            try:
+                removed = db.session.execute(
+                    delete(User).where(User.id == user_id, User.deleted_at.isnot(None))
+                ).rowcount
+                self._record_progress(user_id, 'users', removed)
+                db.session.commit()
+                return
+            except IntegrityError:
+                # Filas creadas mientras se purgaba (buffer de actividad, peticiones en curso)
+                db.session.rollback()
+                if attempt == attempts - 1:
+                    raise
+
+    def _record_progress(self, user_id: str, step: str, removed: int):
+        from extensions import db
+        from models.account_deletion import AccountDeletion
+
+        deletion = db.session.get(AccountDeletion, user_id)
+        if deletion is None:
+            return
+        progress = dict(deletion.progress or {})
+        progress[step] = progress.get(step, 0) + removed
+        deletion.progress = progress
+        deletion.current_step = step
+        deletion.heartbeat_at = datetime.utcnow()
+
+    def _update(self, user_id: str, **values):
+        from extensions import db
+        from models.account_deletion import AccountDeletion
+
+        db.session.execute(
+            update(AccountDeletion).where(AccountDeletion.user_id == user_id).values(**values)
+        )
+        db.session.commit()
+
+    def _claim(self, user_id: Optional[str] = None) -> Optional[str]:
+        """Marca como running un borrado pendiente o abandonado; None si no hay ninguno disponible"""
+        from extensions import db
+        from models.account_deletion import AccountDeletion
+
+        now = datetime.utcnow()
+        available = or_(
+            AccountDeletion.status == AccountDeletion.STATUS_PENDING,
+            and_(
+                AccountDeletion.status == AccountDeletion.STATUS_RUNNING,
+                AccountDeletion.heartbeat_at < now - timedelta(seconds=self.stale_after),
+            ),
+        )
+        candidates = select(AccountDeletion.user_id).where(available)
+        if user_id is not None:
+            candidates = candidates.where(AccountDeletion.user_id == user_id)
+        candidates = candidates.order_by(AccountDeletion.requested_at).limit(1).with_for_update(skip_locked=True)
+
+        claimed = db.session.execute(
+            update(AccountDeletion)
+            .where(AccountDeletion.user_id.in_(candidates))
+            .values(status=AccountDeletion.STATUS_RUNNING, heartbeat_at=now, error=None)
+            .returning(AccountDeletion.user_id)
+        ).scalar()
+        db.session.commit()
+        return str(claimed) if claimed is not None else None
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='account-purger', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        from extensions import db
+
+        with self.app.app_context():
+            # Retomar lo que otros procesos dejaron a medias
+            try:
+                self.run_pending()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Account purge recovery failed: {str(e)}")
+            finally:
+                db.session.remove()
+
+        while True:
+            user_id = self._queue.get()
+            with self.app.app_context():
+                try:
+                    if self._claim(user_id) is not None:
+                        self.purge(user_id)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Account purge for {user_id} failed: {str(e)}")
+                finally:
+                    db.session.remove()
+                    self._queue.task_done()
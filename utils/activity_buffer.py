@@ -0,0 +1,160 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List
+
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityBuffer:
+    """Buffer en memoria para registrar actividad de usuarios sin bloquear la petición
+
+    Las actividades se encolan (cola acotada) y un hilo en segundo plano las
+    inserta en user_activity con INSERT multi-fila cuando se junta un lote o
+    cuando pasa el intervalo de vaciado. Al terminar el proceso se vacía lo
+    pendiente.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.max_size = 10000
+        self.batch_size = 500
+        self.flush_interval = 2.0
+        self._queue = None
+        self._worker = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('ACTIVITY_BUFFER_ENABLED', self.enabled)
+        self.max_size = app.config.get('ACTIVITY_BUFFER_MAX_SIZE', self.max_size)
+        self.batch_size = app.config.get('ACTIVITY_BUFFER_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('ACTIVITY_BUFFER_FLUSH_INTERVAL', self.flush_interval)
+        self._queue = queue.Queue(maxsize=self.max_size)
+        app.extensions['activity_buffer'] = self
+        atexit.register(self.flush)
+
+    def add(self, rows: List[Dict[str, Any]]) -> bool:
+        """
+        Encola actividades para insertarlas en segundo plano
+
+        Returns:
+            False si el buffer no tiene espacio para todas (no se encola ninguna)
+        """
+        if not self.enabled:
+            self._write(rows)
+            return True
+
+        self._ensure_worker()
+        with self._lock:
+            # Todo o nada: un lote no debe quedar a medias
+            if self._queue.qsize() + len(rows) > self.max_size:
+                return False
+            for row in rows:
+                self._queue.put_nowait(row)
+        return True
+
+    def pending(self) -> int:
+        """Número de actividades en espera de ser escritas"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def flush(self) -> int:
+        """Escribe de inmediato todo lo pendiente; retorna cuántas actividades se procesaron"""
+        if self._queue is None:
+            return 0
+        written = 0
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                break
+            try:
+                self._write(batch)
+            finally:
+                self._done(batch)
+            written += len(batch)
+        # Esperar también el lote que el hilo de fondo pudiera estar escribiendo
+        self._queue.join()
+        return written
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='activity-buffer', daemon=True)
+                self._worker.start()
+
+    def _drain(self, limit: int, timeout: float = 0) -> List[Dict[str, Any]]:
+        batch = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < limit:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Espera hasta completar un lote o hasta que venza el intervalo
+            batch = self._drain(self.batch_size, timeout=self.flush_interval)
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    logger.error(f"Activity buffer flush failed, {len(batch)} events dropped: {str(e)}")
+                finally:
+                    self._done(batch)
+
+    def _done(self, batch: List[Dict[str, Any]]):
+        for _ in batch:
+            self._queue.task_done()
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        from extensions import db
+        from models.user_activity import UserActivity, UserActivityRollup
+        from utils.partitions import ensure_current_partitions
+
+        with self._flush_lock, self.app.app_context():
+            # Una vez al mes por proceso: las filas del mes nuevo no se acumulan en DEFAULT
+            ensure_current_partitions(
+                UserActivity.__tablename__,
+                self.app.config.get('ACTIVITY_PARTITION_MONTHS_AHEAD', 3),
+                self.app.config.get('ACTIVITY_PARTITION_LOCK_TIMEOUT_MS', 1000),
+            )
+            try:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(UserActivity.__table__.insert(), rows)
+                    inserted = rows
+                except IntegrityError:
+                    # Un file_id/user_id inválido no debe descartar el lote completo
+                    inserted = []
+                    for row in rows:
+                        try:
+                            with db.session.begin_nested():
+                                db.session.execute(UserActivity.__table__.insert(), [row])
+                            inserted.append(row)
+                        except IntegrityError as e:
+                            logger.warning(f"Dropped invalid activity event: {str(e.orig).strip()}")
+
+                # Los agregados se actualizan en la misma transacción que las actividades
+                UserActivityRollup.increment(inserted)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
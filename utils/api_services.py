@@ -1,11 +1,23 @@
 import requests
 import logging
-from datetime import datetime, timedelta
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Optional, Any
 from flask import current_app
 
+from extensions import http_client
+from utils.cache import TTLCache
+from utils.http_client import CircuitOpenError
+
 logger = logging.getLogger(__name__)
 
+# Shared by every CurrencyService / NewsService instance in the process
+_rates_cache = TTLCache()
+_news_cache = TTLCache()
+
 class CurrencyService:
     """Service class for handling currency exchange rates"""
     
@@ -13,6 +25,8 @@ class CurrencyService:
         self.free_currency_api_key = current_app.config.get('FREE_CURRENCY_API_KEY')
         self.free_currency_url = current_app.config.get('FREE_CURRENCY_API_URL')
         self.frankfurter_url = current_app.config.get('FRANKFURTER_API_URL')
+        self.rates_ttl = current_app.config.get('CURRENCY_RATES_TTL', 300)
+        self.rates_stale_ttl = current_app.config.get('CURRENCY_RATES_STALE_TTL', 3600)
     
     def get_rates_from_free_currency(self) -> Optional[Dict[str, Any]]:
         """Get rates from Free Currency API"""
@@ -20,14 +34,14 @@ class CurrencyService:
             return None
             
         try:
-            response = requests.get(
+            response = http_client.get(
+                'free_currency',
                 self.free_currency_url,
                 params={
                     'apikey': self.free_currency_api_key,
                     'base_currency': 'USD',
                     'currencies': 'EUR,GBP,JPY,CNY,CAD,AUD,CHF,SEK,NOK,DKK,PLN,CZK,HUF,RUB,TRY,BRL,MXN,INR,KRW,SGD,HKD,NZD,ZAR'
-                },
-                timeout=10
+                }
             )
             
             if response.status_code == 200:
@@ -43,6 +57,8 @@ class CurrencyService:
                 logger.warning(f"Free Currency API failed with status {response.status_code}")
                 return None
                 
+        except CircuitOpenError:
+            return None
         except Exception as e:
             logger.error(f"Error with Free Currency API: {str(e)}")
             return None
@@ -50,10 +66,10 @@ class CurrencyService:
     def get_rates_from_frankfurter(self) -> Optional[Dict[str, Any]]:
         """Get rates from Frankfurter API and convert to USD base"""
         try:
-            response = requests.get(
+            response = http_client.get(
+                'frankfurter',
                 self.frankfurter_url,
-                params={'from': 'EUR'},
-                timeout=10
+                params={'from': 'EUR'}
             )
             
             if response.status_code == 200:
@@ -84,12 +100,42 @@ class CurrencyService:
                 logger.error(f"Frankfurter API failed with status {response.status_code}")
                 return None
                 
+        except CircuitOpenError:
+            return None
         except Exception as e:
             logger.error(f"Error with Frankfurter API: {str(e)}")
             return None
     
+    def probe_free_currency(self) -> bool:
+        """Minimal Free Currency API call (status endpoint, no rates)"""
+        try:
+            return http_client.get(
+                'free_currency',
+                self.free_currency_url.rsplit('/', 1)[0] + '/status',
+                params={'apikey': self.free_currency_api_key}
+            ).ok
+        except requests.RequestException:
+            return False
+
+    def probe_frankfurter(self) -> bool:
+        """Minimal Frankfurter call (a single currency pair)"""
+        try:
+            return http_client.get('frankfurter', self.frankfurter_url, params={'from': 'USD', 'to': 'EUR'}).ok
+        except requests.RequestException:
+            return False
+
     def get_rates(self) -> Dict[str, Any]:
-        """Get currency rates with fallback logic"""
+        """Get currency rates from the process cache, fetching them once when missing or expired"""
+        return _rates_cache.get(
+            'latest',
+            self.fetch_rates,
+            ttl=self.rates_ttl,
+            stale_ttl=self.rates_stale_ttl,
+            cacheable=lambda result: result['success'],
+        )
+
+    def fetch_rates(self) -> Dict[str, Any]:
+        """Get currency rates from the providers with fallback logic"""
         # Try Free Currency API first
         result = self.get_rates_from_free_currency()
         if result:
@@ -107,12 +153,110 @@ class CurrencyService:
             'timestamp': datetime.now().isoformat()
         }
 
+    def get_historical_rates(self, start: date, end: date, base: str = 'USD') -> Dict[str, Any]:
+        """Get daily rates between two dates (inclusive) from the Frankfurter time series API"""
+        history_url = self.frankfurter_url.rsplit('/', 1)[0]
+        try:
+            response = http_client.get(
+                'frankfurter',
+                f"{history_url}/{start.isoformat()}..{end.isoformat()}",
+                params={'from': base}
+            )
+
+            if response.status_code == 200:
+                data = response.json()
+                return {
+                    'success': True,
+                    'base_currency': data.get('base', base),
+                    'rates': data.get('rates', {}),
+                    'timestamp': datetime.now().isoformat(),
+                    'source': 'Frankfurter API'
+                }
+            logger.error(f"Frankfurter history failed with status {response.status_code}")
+            error = f'Frankfurter API error: {response.status_code}'
+
+        except CircuitOpenError:
+            error = 'Frankfurter API temporarily unavailable'
+        except Exception as e:
+            logger.error(f"Error with Frankfurter history: {str(e)}")
+            error = 'Network error while fetching historical rates'
+
+        return {
+            'success': False,
+            'error': error,
+            'timestamp': datetime.now().isoformat()
+        }
+
+    def convert_batch(self, conversions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Convert many (amount, from_currency, to_currency) items against one rates snapshot"""
+        # Imported on first use so that loading the app does not pay for numpy
+        import numpy as np
+
+        rates_data = self.get_rates()
+        if not rates_data['success']:
+            return rates_data
+
+        rates = dict(rates_data['rates'])
+        rates['USD'] = 1.0
+        codes = list(rates)
+        index = {code: position for position, code in enumerate(codes)}
+        # Unknown currencies point at the trailing NaN slot
+        table = np.array([rates[code] for code in codes] + [np.nan], dtype=float)
+        unknown = len(codes)
+
+        from_codes = [item['from_currency'] for item in conversions]
+        to_codes = [item['to_currency'] for item in conversions]
+        amounts = np.array([item['amount'] for item in conversions], dtype=float)
+        from_rates = table[[index.get(code, unknown) for code in from_codes]]
+        to_rates = table[[index.get(code, unknown) for code in to_codes]]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = to_rates / from_rates
+        rate[np.array([a == b for a, b in zip(from_codes, to_codes)], dtype=bool)] = 1.0
+        valid = np.isfinite(rate)
+        converted = np.round(amounts * rate, 4).tolist()
+        rounded_rate = np.round(rate, 6).tolist()
+
+        results = []
+        for position, (amount, from_code, to_code) in enumerate(zip(amounts.tolist(), from_codes, to_codes)):
+            if valid[position]:
+                results.append({
+                    'success': True,
+                    'amount': amount,
+                    'from_currency': from_code,
+                    'to_currency': to_code,
+                    'converted_amount': converted[position],
+                    'rate': rounded_rate[position]
+                })
+            else:
+                missing = from_code if not np.isfinite(from_rates[position]) or from_rates[position] == 0 else to_code
+                results.append({
+                    'success': False,
+                    'amount': amount,
+                    'from_currency': from_code,
+                    'to_currency': to_code,
+                    'error': f'Currency {missing} not available'
+                })
+
+        return {
+            'success': True,
+            'base_currency': rates_data.get('base_currency', 'USD'),
+            'count': len(results),
+            'results': results,
+            'timestamp': datetime.now().isoformat(),
+            'source': rates_data.get('source', 'Unknown')
+        }
+
 class NewsService:
     """Service class for handling news from Bing News Search API"""
     
     def __init__(self):
         self.api_key = current_app.config.get('BING_NEWS_API_KEY')
         self.api_url = current_app.config.get('BING_NEWS_API_URL')
+        self.cache_ttl = current_app.config.get('NEWS_CACHE_TTL', 300)
+        self.cache_stale_ttl = current_app.config.get('NEWS_CACHE_STALE_TTL', 3600)
+        # Each category is fetched once at this size and requests get a slice of it
+        self.prefetch_count = current_app.config.get('NEWS_PREFETCH_COUNT', 50)
         
         # Category to query mapping
         self.category_queries = {
@@ -127,6 +271,57 @@ class NewsService:
         return bool(self.api_key)
     
     def get_news(self, category: str = 'finance', count: int = 10) -> Dict[str, Any]:
+        """Get news from the process cache as a slice of the category's prefetched result"""
+        if not self.is_available():
+            return {
+                'success': False,
+                'error': 'Bing News API key not configured',
+                'timestamp': datetime.now().isoformat()
+            }
+
+        news_refresher.ensure_started(current_app._get_current_object())
+        result = _news_cache.get(
+            category,
+            partial(self.fetch_news, category, self.prefetch_count),
+            ttl=self.cache_ttl,
+            stale_ttl=self.cache_stale_ttl,
+            cacheable=lambda result: result['success'],
+        )
+        if not result['success']:
+            return result
+
+        news_items = result['news'][:max(count, 0)]
+        return {**result, 'count': len(news_items), 'news': news_items}
+
+    def probe(self) -> bool:
+        """Minimal Bing News call (one article)"""
+        try:
+            return http_client.get(
+                'bing_news',
+                self.api_url,
+                headers={'Ocp-Apim-Subscription-Key': self.api_key},
+                params={'q': 'news', 'count': 1, 'mkt': 'en-US'}
+            ).ok
+        except requests.RequestException:
+            return False
+
+    def prefetch_all(self) -> Dict[str, bool]:
+        """Refresh the cached result of every category concurrently"""
+        categories = list(self.category_queries)
+        with ThreadPoolExecutor(max_workers=len(categories)) as executor:
+            results = executor.map(
+                lambda category: _news_cache.refresh(
+                    category,
+                    partial(self.fetch_news, category, self.prefetch_count),
+                    ttl=self.cache_ttl,
+                    stale_ttl=self.cache_stale_ttl,
+                    cacheable=lambda result: result['success'],
+                ),
+                categories,
+            )
+            return {category: result['success'] for category, result in zip(categories, results)}
+
+    def fetch_news(self, category: str = 'finance', count: int = 10) -> Dict[str, Any]:
         """Get news from Bing News Search API"""
         if not self.is_available():
             return {
@@ -150,11 +345,11 @@ class NewsService:
                 'sortBy': 'Date'
             }
             
-            response = requests.get(
+            response = http_client.get(
+                'bing_news',
                 self.api_url,
                 headers=headers,
-                params=params,
-                timeout=10
+                params=params
             )
             
             if response.status_code == 200:
@@ -188,6 +383,12 @@ class NewsService:
                     'timestamp': datetime.now().isoformat()
                 }
                 
+        except CircuitOpenError:
+            return {
+                'success': False,
+                'error': 'Bing News API temporarily unavailable',
+                'timestamp': datetime.now().isoformat()
+            }
         except requests.RequestException as e:
             logger.error(f"Request error: {str(e)}")
             return {
@@ -203,26 +404,141 @@ class NewsService:
                 'timestamp': datetime.now().isoformat()
             }
 
+class PeriodicWorker:
+    """Background thread that runs job(app) every interval seconds, started on first use"""
+
+    def __init__(self, name: str, job, interval_key: str, default_interval: float, enabled_key: str = None):
+        self.name = name
+        self.job = job
+        self.interval_key = interval_key
+        self.default_interval = default_interval
+        self.enabled_key = enabled_key
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self, app):
+        if self.enabled_key and not app.config.get(self.enabled_key, True):
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, args=(app,), name=self.name, daemon=True
+                )
+                self._thread.start()
+
+    def _run(self, app):
+        interval = app.config.get(self.interval_key, self.default_interval)
+        while True:
+            try:
+                self.job(app)
+            except Exception as e:
+                logger.error(f"{self.name} error: {str(e)}")
+            time.sleep(interval)
+
+def _prefetch_news(app):
+    with app.app_context():
+        news_service = NewsService()
+    if news_service.is_available():
+        failed = [category for category, ok in news_service.prefetch_all().items() if not ok]
+        if failed:
+            logger.warning(f"News prefetch failed for: {', '.join(failed)}")
+
+def _probe_services(app):
+    with app.app_context():
+        service_status = ServiceStatus()
+    service_status.run_probes()
+
+news_refresher = PeriodicWorker('news-refresher', _prefetch_news, 'NEWS_REFRESH_INTERVAL', 240, 'NEWS_REFRESH_ENABLED')
+status_monitor = PeriodicWorker('service-status-probes', _probe_services, 'SERVICE_STATUS_PROBE_INTERVAL', 300)
+
 class ServiceStatus:
-    """Service class for checking status of external services"""
-    
+    """Service class for reporting the status of external services
+
+    Every upstream call made through http_client records its success and
+    latency. Providers without a recent call are probed with a minimal
+    request, concurrently, on a schedule; get_status only reads the last
+    known state.
+    """
+
+    CURRENCY_PROVIDERS = {
+        'free_currency': 'Free Currency API',
+        'frankfurter': 'Frankfurter API'
+    }
+
     def __init__(self):
         self.currency_service = CurrencyService()
         self.news_service = NewsService()
-    
+        self.probe_interval = current_app.config.get('SERVICE_STATUS_PROBE_INTERVAL', 300)
+
+    def probes(self) -> Dict[str, Any]:
+        """Probe callables for the configured providers"""
+        probes = {'frankfurter': self.currency_service.probe_frankfurter}
+        if self.currency_service.free_currency_api_key:
+            probes['free_currency'] = self.currency_service.probe_free_currency
+        if self.news_service.is_available():
+            probes['bing_news'] = self.news_service.probe
+        return probes
+
+    def run_probes(self, force: bool = False) -> List[str]:
+        """Probe concurrently the providers whose last call is older than the probe interval"""
+        health = http_client.health_states()
+        due = {
+            provider: probe for provider, probe in self.probes().items()
+            if force or provider not in health or health[provider]['age_seconds'] >= self.probe_interval
+        }
+        if due:
+            with ThreadPoolExecutor(max_workers=len(due)) as executor:
+                list(executor.map(lambda probe: probe(), due.values()))
+        return list(due)
+
+    def provider_status(self, provider: str, health: Dict[str, Any], circuits: Dict[str, Any]) -> Dict[str, Any]:
+        state = health.get(provider)
+        circuit = circuits.get(provider, {'state': 'closed', 'failures': 0, 'retry_in': None})
+        if state is None:
+            return {'available': None, 'checked_at': None, 'stale': True, 'circuit': circuit}
+        return {
+            'available': state['ok'] and circuit['state'] != 'open',
+            'latency_ms': state['latency_ms'],
+            'status_code': state['status_code'],
+            'error': state['error'],
+            'checked_at': state['checked_at'],
+            'age_seconds': state['age_seconds'],
+            'stale': state['age_seconds'] > 2 * self.probe_interval,
+            'circuit': circuit
+        }
+
     def get_status(self) -> Dict[str, Any]:
-        """Get status of all external services"""
-        currency_status = self.currency_service.get_rates()
-        news_status = self.news_service.get_news('general', 1)  # Just test with 1 article
-        
+        """Get the last known status of all external services"""
+        configured = self.probes()
+        if not any(provider in configured for provider in http_client.health_states()):
+            # Nothing known yet in this process: one concurrent probe round
+            self.run_probes(force=True)
+        status_monitor.ensure_started(current_app._get_current_object())
+
+        health = http_client.health_states()
+        circuits = http_client.breaker_states()
+        currency_providers = {
+            provider: self.provider_status(provider, health, circuits)
+            for provider in self.CURRENCY_PROVIDERS if provider in configured
+        }
+        source = next(
+            (self.CURRENCY_PROVIDERS[provider] for provider, state in currency_providers.items() if state['available']),
+            'None'
+        )
+        news_provider = self.provider_status('bing_news', health, circuits)
+
         return {
             'currency_service': {
-                'available': currency_status['success'],
-                'source': currency_status.get('source', 'Unknown') if currency_status['success'] else 'None'
+                'available': source != 'None',
+                'source': source,
+                'providers': currency_providers
             },
             'news_service': {
-                'available': news_status['success'],
-                'api_key_configured': self.news_service.is_available()
+                'available': bool(news_provider['available']) and self.news_service.is_available(),
+                'api_key_configured': self.news_service.is_available(),
+                'providers': {'bing_news': news_provider} if self.news_service.is_available() else {}
             },
             'timestamp': datetime.now().isoformat()
-        } 
\ No newline at end of file
+        }
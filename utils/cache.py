@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ('value', 'stored_at', 'ttl', 'stale_ttl')
+
+    def __init__(self, value, ttl, stale_ttl):
+        self.value = value
+        self.stored_at = time.monotonic()
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+
+class _Flight:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """Caché en memoria por proceso con TTL, stale-while-revalidate y single-flight
+
+    - Dentro del TTL se sirve el valor guardado.
+    - Entre el TTL y TTL + stale_ttl se sirve el valor guardado y se recarga en
+      segundo plano.
+    - Sin valor utilizable, una sola llamada ejecuta el loader y las llamadas
+      concurrentes para la misma clave esperan su resultado.
+    - Con max_entries, al superar el límite se descartan primero las entradas
+      vencidas y después las más antiguas.
+    """
+
+    def __init__(self, wait_timeout: float = 30, max_entries: int = None):
+        self.wait_timeout = wait_timeout
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        ttl: float,
+        stale_ttl: float = 0,
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """Obtiene el valor de la clave, cargándolo con loader si hace falta"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = time.monotonic() - entry.stored_at
+                if age < entry.ttl:
+                    return entry.value
+                if age < entry.ttl + entry.stale_ttl:
+                    if key not in self._flights:
+                        flight = self._flights[key] = _Flight()
+                        threading.Thread(
+                            target=self._load,
+                            args=(key, flight, loader, ttl, stale_ttl, cacheable),
+                            name=f'cache-refresh-{key}',
+                            daemon=True,
+                        ).start()
+                    return entry.value
+
+        return self.refresh(key, loader, ttl, stale_ttl, cacheable)
+
+    def refresh(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        ttl: float,
+        stale_ttl: float = 0,
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """Recarga la clave aunque siga vigente, uniéndose a la carga en curso si la hay"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if leader:
+            self._load(key, flight, loader, ttl, stale_ttl, cacheable)
+        elif not flight.done.wait(self.wait_timeout):
+            # El líder tarda demasiado: servir lo que haya o cargar por cuenta propia
+            value, age = self.peek(key)
+            return value if age is not None else loader()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def peek(self, key: Hashable) -> Tuple[Any, Optional[float]]:
+        """Retorna (valor, antigüedad en segundos) sin cargar nada; (None, None) si no existe"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None
+            return entry.value, time.monotonic() - entry.stored_at
+
+    def set(self, key: Hashable, value: Any, ttl: float, stale_ttl: float = 0):
+        """Guarda un valor directamente"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = _Entry(value, ttl, stale_ttl)
+            if self.max_entries and len(self._entries) > self.max_entries:
+                self._evict()
+
+    def invalidate(self, key: Hashable):
+        """Elimina una clave del caché"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Vacía el caché"""
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [
+            key for key, entry in self._entries.items()
+            if now - entry.stored_at >= entry.ttl + entry.stale_ttl
+        ]
+        for key in expired:
+            del self._entries[key]
+        # Los dict conservan el orden de inserción: las primeras son las más antiguas
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def _load(self, key, flight, loader, ttl, stale_ttl, cacheable):
+        try:
+            flight.value = loader()
+            if cacheable is None or cacheable(flight.value):
+                self.set(key, flight.value, ttl, stale_ttl)
+        except Exception as e:
+            logger.error(f"Cache loader for {key!r} failed: {str(e)}")
+            flight.error = e
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
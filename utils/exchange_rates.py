@@ -0,0 +1,187 @@
+import csv
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from sqlalchemy import select
+
+from extensions import db
+from models.exchange_rate import ExchangeRate
+
+# Moneda base con la que se descargan y guardan las tasas; el resto se obtiene cruzando
+HISTORY_BASE = 'USD'
+
+
+def _parse_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value).strip())
+
+
+def backfill_rates(start: date, end: date, base: str = HISTORY_BASE, chunk_days: int = 366) -> Dict[str, object]:
+    """
+    Descarga las tasas diarias entre start y end y las guarda en exchange_rates
+
+    El rango se pide en tramos de chunk_days días y cada tramo hace su propio
+    commit, de modo que un fallo a mitad no pierde lo ya descargado.
+    """
+    from utils.api_services import CurrencyService
+
+    service = CurrencyService()
+    written = 0
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end)
+        result = service.get_historical_rates(chunk_start, chunk_end, base)
+        if not result['success']:
+            return {'success': False, 'error': result['error'], 'rates_written': written,
+                    'failed_from': chunk_start.isoformat()}
+
+        written += ExchangeRate.bulk_upsert(
+            {
+                'base': result['base_currency'],
+                'quote': quote,
+                'rate_date': _parse_date(rate_date),
+                'rate': rate,
+                'source': result['source'],
+            }
+            for rate_date, quotes in result['rates'].items()
+            for quote, rate in quotes.items()
+        )
+        db.session.commit()
+        chunk_start = chunk_end + timedelta(days=1)
+
+    return {'success': True, 'rates_written': written, 'start': start.isoformat(), 'end': end.isoformat()}
+
+
+def refresh_rates(base: str = HISTORY_BASE, lookback_days: int = 7) -> Dict[str, object]:
+    """Completa las tasas desde el último día guardado (o los últimos lookback_days) hasta hoy"""
+    today = date.today()
+    latest = ExchangeRate.latest_date(base)
+    start = latest + timedelta(days=1) if latest else today - timedelta(days=lookback_days)
+    if start > today:
+        return {'success': True, 'rates_written': 0, 'start': start.isoformat(), 'end': today.isoformat()}
+    return backfill_rates(start, today, base)
+
+
+def read_rates_csv(stream: TextIO, source: str = 'csv') -> Iterator[Dict[str, object]]:
+    """Lee filas date,base,quote,rate[,source] de un CSV con cabecera"""
+    for row in csv.DictReader(stream):
+        yield {
+            'base': row['base'].strip(),
+            'quote': row['quote'].strip(),
+            'rate_date': _parse_date(row['date']),
+            'rate': float(row['rate']),
+            'source': (row.get('source') or source).strip(),
+        }
+
+
+def load_rates(rows: Iterable[Dict[str, object]], batch_size: int = 1000) -> int:
+    """Carga masiva de tasas (upsert por lotes) con un único commit al final"""
+    written = ExchangeRate.bulk_upsert(rows, batch_size=batch_size)
+    db.session.commit()
+    return written
+
+
+def rates_as_of(base: str, on: date, quotes: List[str] = None) -> Dict[str, Tuple[float, date]]:
+    """
+    Tasas de base vigentes en la fecha, sólo con datos locales
+
+    Usa las filas guardadas con esa base y completa el resto cruzando por
+    HISTORY_BASE. La fecha de una tasa cruzada es la más antigua de sus dos patas.
+
+    Returns:
+        {quote: (rate, rate_date)}
+    """
+    base = base.upper()
+    quotes = [quote.upper() for quote in quotes] if quotes else None
+
+    rates = ExchangeRate.snapshot_as_of(base, on, quotes) if base != HISTORY_BASE else {}
+    if quotes is not None and all(quote in rates or quote == base for quote in quotes):
+        return rates
+
+    pivot = ExchangeRate.snapshot_as_of(HISTORY_BASE, on, None if quotes is None else quotes + [base])
+    pivot[HISTORY_BASE] = (1.0, on)
+    if base not in pivot:
+        return rates
+
+    base_rate, base_date = pivot[base]
+    for quote, (rate, rate_date) in pivot.items():
+        if quote == base or quote in rates or (quotes is not None and quote not in quotes):
+            continue
+        rates[quote] = (rate / base_rate, min(rate_date, base_date))
+    return rates
+
+
+def rate_as_of(base: str, quote: str, on: date) -> Optional[Tuple[float, date]]:
+    """Tasa base->quote vigente en la fecha, o None si no hay datos locales"""
+    if base.upper() == quote.upper():
+        return 1.0, on
+    return rates_as_of(base, on, [quote]).get(quote.upper())
+
+
+def latest_usd_rates() -> Optional[Dict[str, float]]:
+    """Tasas actuales (caché de CurrencyService) para valorar fechas sin histórico"""
+    from utils.api_services import CurrencyService
+
+    result = CurrencyService().get_rates()
+    return result['rates'] if result['success'] else None
+
+
+def usd_rates_for(keys: Iterable[Tuple[date, str]]) -> Dict[Tuple[date, str], float]:
+    """
+    Tasas HISTORY_BASE->moneda vigentes en cada (fecha, moneda) pedida
+
+    Hace dos consultas (la tasa vigente al inicio del rango y las filas del
+    rango) y resuelve la búsqueda "a fecha" de todas las fechas de cada moneda
+    con searchsorted. Los pares sin datos no aparecen en el resultado.
+    """
+    result = {}
+    dates_by_quote = defaultdict(set)
+    for on, code in keys:
+        if code.upper() == HISTORY_BASE:
+            result[(on, code)] = 1.0
+        else:
+            dates_by_quote[code.upper()].add(on)
+    if not dates_by_quote:
+        return result
+
+    quotes = list(dates_by_quote)
+    first = min(min(dates) for dates in dates_by_quote.values())
+    last = max(max(dates) for dates in dates_by_quote.values())
+
+    series = defaultdict(lambda: ([], []))
+    for quote, (rate, rate_date) in ExchangeRate.snapshot_as_of(HISTORY_BASE, first, quotes).items():
+        series[quote][0].append(rate_date.toordinal())
+        series[quote][1].append(rate)
+    rows = db.session.execute(
+        select(ExchangeRate.quote, ExchangeRate.rate_date, ExchangeRate.rate)
+        .where(
+            ExchangeRate.base == HISTORY_BASE,
+            ExchangeRate.quote.in_(quotes),
+            ExchangeRate.rate_date > first,
+            ExchangeRate.rate_date <= last,
+        )
+        .order_by(ExchangeRate.quote, ExchangeRate.rate_date)
+    )
+    for quote, rate_date, rate in rows:
+        series[quote][0].append(rate_date.toordinal())
+        series[quote][1].append(rate)
+
+    # numpy se importa en el primer uso para no cargarlo al arrancar la app
+    import numpy as np
+
+    for quote, dates in dates_by_quote.items():
+        if quote not in series:
+            continue
+        days, rates = series[quote]
+        wanted = sorted(dates)
+        positions = np.searchsorted(
+            np.array(days), np.array([on.toordinal() for on in wanted]), side='right'
+        ) - 1
+        for on, position in zip(wanted, positions.tolist()):
+            if position >= 0:
+                result[(on, quote)] = rates[position]
+    return result
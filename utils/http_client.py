@@ -0,0 +1,181 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.RequestException):
+    """El proveedor tiene el circuito abierto y la llamada no se intentó"""
+
+
+class CircuitBreaker:
+    """Circuito por proveedor: se abre tras varios fallos seguidos y deja pasar una prueba al vencer reset_timeout"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Indica si se puede intentar una llamada; en half-open sólo pasa una a la vez"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = max(0.0, round(self.reset_timeout - (time.monotonic() - self.opened_at), 1))
+            return {'state': self.state, 'failures': self.failures, 'retry_in': retry_in}
+
+
+class HttpClient:
+    """Cliente HTTP compartido para las APIs externas
+
+    Reutiliza conexiones (keep-alive) con un pool por host, aplica timeouts
+    cortos de conexión y lectura y mantiene un circuit breaker por proveedor
+    para fallar de inmediato mientras un proveedor está caído.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.connect_timeout = 2.0
+        self.read_timeout = 5.0
+        self.pool_maxsize = 20
+        self.failure_threshold = 3
+        self.reset_timeout = 30.0
+        self._session = None
+        self._breakers = {}
+        self._health = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.connect_timeout = app.config.get('HTTP_CONNECT_TIMEOUT', self.connect_timeout)
+        self.read_timeout = app.config.get('HTTP_READ_TIMEOUT', self.read_timeout)
+        self.pool_maxsize = app.config.get('HTTP_POOL_MAXSIZE', self.pool_maxsize)
+        self.failure_threshold = app.config.get('CIRCUIT_BREAKER_FAILURE_THRESHOLD', self.failure_threshold)
+        self.reset_timeout = app.config.get('CIRCUIT_BREAKER_RESET_TIMEOUT', self.reset_timeout)
+        app.extensions['http_client'] = self
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    # Sin reintentos automáticos: el failover lo decide quien llama
+                    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=self.pool_maxsize, max_retries=0)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(provider)
+            if breaker is None:
+                breaker = self._breakers[provider] = CircuitBreaker(
+                    provider, self.failure_threshold, self.reset_timeout
+                )
+            return breaker
+
+    def breaker_states(self) -> Dict[str, Dict[str, Any]]:
+        """Estado actual de los circuitos conocidos"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+    def health_states(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Resultado de la última llamada real a cada proveedor
+
+        Returns:
+            {proveedor: {ok, latency_ms, status_code, error, checked_at, age_seconds}}
+        """
+        now = time.monotonic()
+        with self._lock:
+            health = {provider: dict(state) for provider, state in self._health.items()}
+        for state in health.values():
+            state['age_seconds'] = round(now - state.pop('monotonic'), 1)
+        return health
+
+    def _record(self, provider: str, started: float, status_code: Optional[int] = None, error: str = None):
+        finished = time.monotonic()
+        with self._lock:
+            self._health[provider] = {
+                'ok': error is None and status_code is not None and status_code < 400,
+                'latency_ms': round((finished - started) * 1000, 1),
+                'status_code': status_code,
+                'error': error,
+                'checked_at': datetime.utcnow().isoformat(),
+                'monotonic': finished,
+            }
+
+    def get(self, provider: str, url: str, **kwargs) -> requests.Response:
+        """
+        GET a través del pool compartido y el circuito del proveedor
+
+        Los errores de red y las respuestas 5xx/429 cuentan como fallo del
+        proveedor; el resto de respuestas se devuelven tal cual. Cada llamada
+        queda registrada (éxito y latencia) en health_states().
+
+        Raises:
+            CircuitOpenError: Si el circuito del proveedor está abierto
+            requests.RequestException: Si la llamada falla
+        """
+        breaker = self.breaker(provider)
+        if not breaker.allow():
+            raise CircuitOpenError(f'{provider} circuit is open')
+
+        kwargs.setdefault('timeout', (self.connect_timeout, self.read_timeout))
+        started = time.monotonic()
+        try:
+            response = self.session.get(url, **kwargs)
+        except requests.RequestException as e:
+            breaker.record_failure()
+            self._record(provider, started, error=type(e).__name__)
+            raise
+
+        self._record(provider, started, status_code=response.status_code)
+        if response.status_code >= 500 or response.status_code == 429:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
@@ -0,0 +1,183 @@
+import logging
+import queue
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, or_, select, update
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationBroadcaster:
+    """Reparte en segundo plano las difusiones de notificaciones del sistema
+
+    El endpoint de difusión sólo registra un NotificationBroadcast y lo
+    encola. Un hilo de fondo recorre los usuarios del segmento por id en lotes
+    de batch_size y confirma cada lote junto con su cursor (last_user_id), de
+    modo que una difusión interrumpida continúa donde se quedó y un lote
+    repetido no duplica notificaciones (ver Notification.bulk_create).
+
+    Las difusiones que un proceso deja a medias (sin avance durante
+    stale_after segundos) las retoma cualquier otro proceso o el comando
+    `flask notifications run-broadcasts`.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.batch_size = 5000
+        self.stale_after = 300
+        self._queue = None
+        self._worker = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('NOTIFICATIONS_BROADCAST_ENABLED', self.enabled)
+        self.batch_size = app.config.get('NOTIFICATIONS_BROADCAST_BATCH_SIZE', self.batch_size)
+        self.stale_after = app.config.get('NOTIFICATIONS_BROADCAST_STALE_AFTER', self.stale_after)
+        self._queue = queue.Queue()
+        app.extensions['notification_broadcaster'] = self
+
+    def schedule(self, broadcast_id):
+        """Encola la difusión; con NOTIFICATIONS_BROADCAST_ENABLED=false queda pendiente para el comando CLI"""
+        if not self.enabled:
+            return
+        self._ensure_worker()
+        self._queue.put(str(broadcast_id))
+
+    def run_pending(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Procesa las difusiones pendientes o abandonadas; debe llamarse con app context"""
+        results = []
+        while limit is None or len(results) < limit:
+            broadcast_id = self._claim()
+            if broadcast_id is None:
+                break
+            results.append(self.run(broadcast_id))
+        return results
+
+    def run(self, broadcast_id) -> Dict[str, Any]:
+        """Reparte una difusión ya reclamada; retorna su estado final"""
+        from extensions import db
+        from models.notification_broadcast import NotificationBroadcast
+
+        try:
+            self._fan_out(broadcast_id)
+            self._update(broadcast_id, status=NotificationBroadcast.STATUS_DONE, finished_at=datetime.utcnow())
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Notification broadcast {broadcast_id} failed: {str(e)}")
+            self._update(broadcast_id, status=NotificationBroadcast.STATUS_FAILED, error=str(e))
+
+        broadcast = db.session.get(NotificationBroadcast, broadcast_id)
+        return broadcast.to_dict() if broadcast else {'id': str(broadcast_id)}
+
+    def _fan_out(self, broadcast_id):
+        from extensions import db
+        from models.notification import Notification, NotificationImportance
+        from models.notification_broadcast import NotificationBroadcast
+        from models.user import User
+        from schemas.notification_schema import notification_segment_schema
+        from utils.partitions import ensure_current_partitions
+
+        broadcast = db.session.get(NotificationBroadcast, broadcast_id)
+        ensure_current_partitions(
+            Notification.__tablename__,
+            self.app.config.get('NOTIFICATIONS_PARTITION_MONTHS_AHEAD', 3),
+            self.app.config.get('NOTIFICATIONS_PARTITION_LOCK_TIMEOUT_MS', 1000),
+        )
+        segment = NotificationBroadcast.segment_query(notification_segment_schema.load(broadcast.segment or {}))
+        importance = NotificationImportance(broadcast.importance)
+
+        while True:
+            # Paginación por clave: cada lote es un índice de rango sobre users.id
+            batch_query = segment.with_entities(User.id).order_by(User.id)
+            if broadcast.last_user_id is not None:
+                batch_query = batch_query.filter(User.id > broadcast.last_user_id)
+            user_ids = [row.id for row in batch_query.limit(self.batch_size)]
+            if not user_ids:
+                return
+
+            created = Notification.bulk_create(
+                user_ids, broadcast.title, broadcast.content, importance,
+                batch_id=broadcast.id, created_at=broadcast.created_at
+            )
+            # El cursor se confirma con las notificaciones del lote
+            broadcast.processed += len(user_ids)
+            broadcast.created += created
+            broadcast.last_user_id = user_ids[-1]
+            broadcast.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+
+    def _update(self, broadcast_id, **values):
+        from extensions import db
+        from models.notification_broadcast import NotificationBroadcast
+
+        db.session.execute(
+            update(NotificationBroadcast).where(NotificationBroadcast.id == broadcast_id).values(**values)
+        )
+        db.session.commit()
+
+    def _claim(self, broadcast_id=None) -> Optional[str]:
+        """Marca como running una difusión pendiente o abandonada; None si no hay ninguna disponible"""
+        from extensions import db
+        from models.notification_broadcast import NotificationBroadcast
+
+        now = datetime.utcnow()
+        available = or_(
+            NotificationBroadcast.status == NotificationBroadcast.STATUS_PENDING,
+            and_(
+                NotificationBroadcast.status == NotificationBroadcast.STATUS_RUNNING,
+                NotificationBroadcast.heartbeat_at < now - timedelta(seconds=self.stale_after),
+            ),
+        )
+        candidates = select(NotificationBroadcast.id).where(available)
+        if broadcast_id is not None:
+            candidates = candidates.where(NotificationBroadcast.id == broadcast_id)
+        candidates = candidates.order_by(NotificationBroadcast.created_at).limit(1).with_for_update(skip_locked=True)
+
+        claimed = db.session.execute(
+            update(NotificationBroadcast)
+            .where(NotificationBroadcast.id.in_(candidates))
+            .values(status=NotificationBroadcast.STATUS_RUNNING, heartbeat_at=now, error=None)
+            .returning(NotificationBroadcast.id)
+        ).scalar()
+        db.session.commit()
+        return str(claimed) if claimed is not None else None
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='notification-broadcaster', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        from extensions import db
+
+        with self.app.app_context():
+            # Retomar lo que otros procesos dejaron a medias
+            try:
+                self.run_pending()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Notification broadcast recovery failed: {str(e)}")
+            finally:
+                db.session.remove()
+
+        while True:
+            broadcast_id = self._queue.get()
+            with self.app.app_context():
+                try:
+                    if self._claim(broadcast_id) is not None:
+                        self.run(broadcast_id)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Notification broadcast {broadcast_id} failed: {str(e)}")
+                finally:
+                    db.session.remove()
+                    self._queue.task_done()
@@ -0,0 +1,232 @@
+import json
+import logging
+import queue
+import select
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, func, select as sql_select
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Límite de payload de NOTIFY en Postgres (8000 bytes) con margen
+PG_NOTIFY_MAX_PAYLOAD = 7900
+
+_PENDING_KEY = 'notification_hub_events'
+
+
+class NotificationHub:
+    """Distribuye eventos de notificaciones a los streams SSE abiertos en este proceso
+
+    Con Postgres los eventos se emiten con pg_notify dentro de la transacción que
+    los produce, por lo que sólo se entregan al hacer commit y llegan a todos los
+    workers a través de un hilo que escucha el canal (LISTEN). Con otros motores se
+    publican localmente después del commit.
+
+    Las difusiones masivas emiten un único evento para BROADCAST por lote; cada
+    proceso lo traduce con el resolver registrado (on_broadcast) en eventos
+    para los usuarios que tienen un stream abierto en él.
+    """
+
+    BROADCAST = '*'
+
+    def __init__(self, app=None):
+        self.app = None
+        self.channel = 'ledgerflow_notifications'
+        self.queue_size = 100
+        self.use_pg_notify = True
+        self.max_streams = 4
+        self._open_streams = 0
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._listener = None
+        self._broadcast_resolver = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.channel = app.config.get('NOTIFICATIONS_PG_CHANNEL', self.channel)
+        self.queue_size = app.config.get('NOTIFICATIONS_STREAM_QUEUE_SIZE', self.queue_size)
+        self.use_pg_notify = app.config.get('NOTIFICATIONS_PG_NOTIFY', self.use_pg_notify)
+        self.max_streams = app.config.get('NOTIFICATIONS_STREAM_MAX_PER_WORKER', self.max_streams)
+        app.extensions['notification_hub'] = self
+
+    # Suscripciones locales
+
+    def acquire_stream(self) -> bool:
+        """
+        Reserva un hueco para un stream abierto en este proceso
+
+        Cada stream ocupa un hilo del worker mientras dura; limitarlos deja el
+        resto de hilos para las peticiones normales. Retorna False si ya hay
+        max_streams abiertos (0 = sin límite).
+        """
+        with self._lock:
+            if self.max_streams and self._open_streams >= self.max_streams:
+                return False
+            self._open_streams += 1
+            return True
+
+    def release_stream(self):
+        """Libera el hueco reservado con acquire_stream"""
+        with self._lock:
+            self._open_streams = max(0, self._open_streams - 1)
+
+    def open_streams(self) -> int:
+        return self._open_streams
+
+    def subscribe(self, user_id: str, dsn: Optional[str] = None) -> queue.Queue:
+        """Registra un stream para el usuario y arranca el listener de Postgres si hace falta"""
+        if dsn:
+            self._ensure_listener(dsn)
+        subscription = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[str(user_id)].add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id: str, subscription: queue.Queue):
+        """Elimina un stream del usuario"""
+        with self._lock:
+            subscriptions = self._subscribers.get(str(user_id))
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[str(user_id)]
+
+    def on_broadcast(self, resolver: Callable[[List[str], Dict[str, Any]], List[Tuple[Any, str, Dict[str, Any]]]]):
+        """
+        Registra la función que resuelve un evento de difusión para los streams locales
+
+        resolver(user_ids, data) recibe los usuarios con stream abierto en este
+        proceso y los datos del evento, y retorna [(user_id, evento, datos)].
+        Se ejecuta con app context, así que puede consultar la base de datos.
+        """
+        self._broadcast_resolver = resolver
+        return resolver
+
+    def publish(self, user_id: str, event_name: str, data: Dict[str, Any]):
+        """Entrega un evento a los streams locales del usuario"""
+        if str(user_id) == self.BROADCAST:
+            self._publish_broadcast(data)
+            return
+        with self._lock:
+            subscriptions = list(self._subscribers.get(str(user_id), ()))
+        for subscription in subscriptions:
+            try:
+                subscription.put_nowait((event_name, data))
+            except queue.Full:
+                # Cliente lento: se descarta el evento en lugar de bloquear al productor
+                logger.warning(f"Notification stream queue full for user {user_id}")
+
+    def _publish_broadcast(self, data: Dict[str, Any]):
+        with self._lock:
+            user_ids = list(self._subscribers)
+        # Sin streams abiertos en este proceso no hay nada que resolver
+        if not user_ids or self._broadcast_resolver is None:
+            return
+        try:
+            with self.app.app_context():
+                events = self._broadcast_resolver(user_ids, data)
+        except Exception as e:
+            logger.error(f"Notification broadcast dispatch failed: {str(e)}")
+            return
+        for user_id, event_name, event_data in events:
+            self.publish(user_id, event_name, event_data)
+
+    # Emisión transaccional
+
+    def emit(self, session: Session, user_id, event_name: str, data: Dict[str, Any], connection=None):
+        """Emite un evento que sólo se entregará si la transacción actual hace commit"""
+        self.emit_many(session, [(user_id, event_name, data)], connection=connection)
+
+    def emit_many(self, session: Session, events: List[Tuple[Any, str, Dict[str, Any]]], connection=None):
+        """Emite varios eventos agrupándolos en el menor número posible de NOTIFY"""
+        bind = connection if connection is not None else session.connection()
+        if not (self.use_pg_notify and bind.dialect.name == 'postgresql'):
+            pending = session.info.setdefault(_PENDING_KEY, [])
+            for user_id, event_name, data in events:
+                pending.append((self, str(user_id), event_name, data))
+            return
+
+        batch, size = [], 2
+        for user_id, event_name, data in events:
+            encoded = json.dumps([str(user_id), event_name, data], default=str)
+            encoded_size = len(encoded.encode('utf-8')) + 1
+            if encoded_size + 2 > PG_NOTIFY_MAX_PAYLOAD:
+                logger.warning(f"Notification event '{event_name}' too large for NOTIFY, skipped")
+                continue
+            if size + encoded_size > PG_NOTIFY_MAX_PAYLOAD:
+                self._notify(bind, batch)
+                batch, size = [], 2
+            batch.append(encoded)
+            size += encoded_size
+        if batch:
+            self._notify(bind, batch)
+
+    def _notify(self, bind, encoded_events: List[str]):
+        bind.execute(sql_select(func.pg_notify(self.channel, '[' + ','.join(encoded_events) + ']')))
+
+    # Listener de Postgres
+
+    def _ensure_listener(self, dsn: str):
+        # Con NOTIFICATIONS_PG_NOTIFY=false los eventos se publican en local: no hace falta conexión
+        if not self.use_pg_notify:
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(
+                target=self._listen, args=(dsn,), name='notification-hub-listener', daemon=True
+            )
+            self._listener.start()
+
+    def _listen(self, dsn: str):
+        import psycopg2
+
+        backoff = 1
+        while True:
+            connection = None
+            try:
+                connection = psycopg2.connect(dsn)
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                backoff = 1
+                while True:
+                    if select.select([connection], [], [], 30) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self._dispatch(connection.notifies.pop(0).payload)
+            except Exception as e:
+                logger.error(f"Notification listener error: {str(e)}")
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            threading.Event().wait(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _dispatch(self, payload: str):
+        try:
+            for user_id, event_name, data in json.loads(payload):
+                self.publish(user_id, event_name, data)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Invalid notification payload: {str(e)}")
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_pending(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    for hub, user_id, event_name, data in pending or ():
+        hub.publish(user_id, event_name, data)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy import delete, insert, literal, select, tuple_
+
+from extensions import db
+from models.notification import Notification, NotificationArchive
+from utils.partitions import drop_empty_partitions, ensure_monthly_partitions
+
+
+def archive_read_notifications(
+    older_than_days: int = 90,
+    batch_size: int = 1000,
+    max_batches: int = None,
+    delete_only: bool = False,
+) -> int:
+    """
+    Mueve (o elimina) las notificaciones leídas más antiguas que older_than_days
+
+    Cada lote es una sola sentencia (DELETE ... RETURNING dentro de un INSERT) con
+    su propio commit, de modo que los bloqueos duran poco y el job se puede
+    interrumpir en cualquier momento.
+
+    Returns:
+        Número de notificaciones movidas o eliminadas
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    total = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        candidates = (
+            select(Notification.id, Notification.created_at)
+            .where(Notification.is_read.is_(True), Notification.created_at < cutoff)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        removed = delete(Notification).where(
+            tuple_(Notification.id, Notification.created_at).in_(candidates)
+        )
+
+        if delete_only:
+            moved = db.session.execute(removed).rowcount
+        else:
+            columns = ['id', 'user_id', 'title', 'content', 'is_read', 'importance', 'created_at', 'read_at']
+            moved_cte = removed.returning(
+                *(getattr(Notification, column) for column in columns)
+            ).cte('moved')
+            moved = db.session.execute(
+                insert(NotificationArchive)
+                .from_select(
+                    columns + ['archived_at'],
+                    select(
+                        *(moved_cte.c[column] for column in columns),
+                        literal(datetime.utcnow()).label('archived_at'),
+                    ),
+                )
+                .add_cte(moved_cte)
+            ).rowcount
+
+        db.session.commit()
+        batches += 1
+        total += moved
+        if moved < batch_size:
+            break
+
+    return total
+
+
+def run_retention(
+    older_than_days: int = 90,
+    batch_size: int = 1000,
+    max_batches: int = None,
+    delete_only: bool = False,
+    months_ahead: int = 3,
+    lock_timeout_ms: int = 1000,
+) -> Dict[str, object]:
+    """Ejecuta el ciclo completo: particiones futuras (y meses atascados en DEFAULT), archivado por lotes y limpieza de particiones"""
+    created = ensure_monthly_partitions(Notification.__tablename__, months_ahead, lock_timeout_ms)
+    moved = archive_read_notifications(older_than_days, batch_size, max_batches, delete_only)
+    dropped = drop_empty_partitions(
+        Notification.__tablename__, datetime.utcnow() - timedelta(days=older_than_days), lock_timeout_ms
+    )
+    return {
+        'partitions_created': created,
+        'notifications_deleted' if delete_only else 'notifications_archived': moved,
+        'partitions_dropped': dropped,
+    }
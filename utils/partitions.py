@@ -0,0 +1,319 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import DDL, event, text
+from sqlalchemy.exc import DBAPIError
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def next_month(value: datetime) -> datetime:
+    return datetime(value.year + 1, 1, 1) if value.month == 12 else datetime(value.year, value.month + 1, 1)
+
+
+def partition_name(table_name: str, month: datetime) -> str:
+    return f"{table_name}_{month.year:04d}_{month.month:02d}"
+
+
+def is_postgres() -> bool:
+    return db.engine.dialect.name == 'postgresql'
+
+
+def default_partition_name(table_name: str) -> str:
+    return f"{table_name}_default"
+
+
+def add_default_partition(table):
+    """Crea la partición DEFAULT junto con la tabla para que acepte filas sin particiones mensuales"""
+    event.listen(
+        table,
+        'after_create',
+        DDL(
+            f'CREATE TABLE IF NOT EXISTS {default_partition_name(table.name)} PARTITION OF {table.name} DEFAULT'
+        ).execute_if(dialect='postgresql'),
+    )
+
+
+def _relkind(name: str):
+    """Tipo de relación en pg_class ('r' tabla, 'p' particionada) o None si no existe"""
+    return db.session.execute(
+        text("SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass(:name)"), {'name': name}
+    ).scalar()
+
+
+def _create_month_partition(table_name: str, month: datetime, lock_timeout_ms: int) -> bool:
+    """
+    Crea la partición del mes en la transacción actual; False si ya existía
+
+    CREATE TABLE ... PARTITION OF toma ACCESS EXCLUSIVE sobre la tabla padre,
+    por eso se pide con lock_timeout. Las filas del mes que ya estén en la
+    partición DEFAULT impedirían crearla: se sacan a una tabla temporal, se
+    crea la partición y se vuelven a insertar (ahora caen en la nueva), todo
+    con el bloqueo tomado.
+    """
+    name = partition_name(table_name, month)
+    if _relkind(name) is not None:
+        return False
+
+    upper = next_month(month)
+    bounds = {'lower': month, 'upper': upper}
+    default = default_partition_name(table_name)
+    db.session.execute(text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}"))
+    db.session.execute(text(f"LOCK TABLE {table_name} IN ACCESS EXCLUSIVE MODE"))
+    if _relkind(name) is not None:
+        # Otro worker la creó mientras se esperaba el bloqueo
+        return False
+    stranded =_relkind(default) is not None and db.session.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {default} WHERE created_at >= :lower AND created_at < :upper)"
+    ), bounds).scalar()
+    if stranded:
+        moved = f"{name}_moving"
+        db.session.execute(text(f"CREATE TEMP TABLE {moved} (LIKE {default}) ON COMMIT DROP"))
+        db.session.execute(text(
+            f"WITH rows AS (DELETE FROM {default} WHERE created_at >= :lower AND created_at < :upper RETURNING *) "
+            f"INSERT INTO {moved} SELECT * FROM rows"
+        ), bounds)
+    db.session.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {table_name} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+    ))
+    if stranded:
+        count = db.session.execute(text(f"INSERT INTO {table_name} SELECT * FROM {moved}")).rowcount
+        logger.info(f"Moved {count} rows from {default} into {name}")
+    return True
+
+
+def _stranded_months(table_name: str) -> List[datetime]:
+    """Meses con filas en la partición DEFAULT (normalmente ninguno: se vacía al crear cada mes)"""
+    default = default_partition_name(table_name)
+    if _relkind(default) is None:
+        return []
+    months = db.session.execute(text(
+        f"SELECT DISTINCT date_trunc('month', created_at)::timestamp FROM {default}"
+    )).scalars().all()
+    return [month.replace(tzinfo=None) for month in months]
+
+
+def _ensure_partitions(table_name: str, months_ahead: int, lock_timeout_ms: int):
+    created, skipped = [], []
+    current = month_start(datetime.utcnow())
+    months = [current]
+    for _ in range(months_ahead):
+        months.append(next_month(months[-1]))
+
+    kind = _relkind(table_name)
+    if kind != 'p':
+        db.session.rollback()
+        logger.warning(f"{table_name} is not partitioned; convert it with its partition-table command")
+        return created, skipped
+
+    try:
+        if _relkind(default_partition_name(table_name)) is None:
+            # Tabla creada sin el evento after_create (p. ej. por una migración)
+            db.session.execute(text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}"))
+            db.session.execute(text(
+                f"CREATE TABLE {default_partition_name(table_name)} PARTITION OF {table_name} DEFAULT"
+            ))
+        months = sorted(set(months) | set(_stranded_months(table_name)))
+        db.session.commit()
+    except DBAPIError as e:
+        db.session.rollback()
+        logger.info(f"Skipped default partition of {table_name}: {str(e.orig).strip()}")
+
+    for month in months:
+        name = partition_name(table_name, month)
+        try:
+            # Una transacción por partición: el bloqueo de la tabla padre dura sólo lo de esa partición
+            if _create_month_partition(table_name, month, lock_timeout_ms):
+                created.append(name)
+            db.session.commit()
+        except DBAPIError as e:
+            db.session.rollback()
+            skipped.append(name)
+            logger.info(f"Skipped partition {name}: {str(e.orig).strip()}")
+    return created, skipped
+
+
+def ensure_monthly_partitions(table_name: str, months_ahead: int = 3, lock_timeout_ms: int = 1000) -> List[str]:
+    """
+    Crea las particiones mensuales de la tabla desde el mes actual hasta months_ahead
+
+    También crea la partición DEFAULT si falta y la de cualquier mes que tenga
+    filas en DEFAULT, moviéndolas a su partición. Una partición cuyo bloqueo
+    no se obtiene en lock_timeout_ms se omite hasta la siguiente ejecución.
+
+    Returns:
+        Nombres de las particiones creadas
+    """
+    if not is_postgres():
+        return []
+    return _ensure_partitions(table_name, months_ahead, lock_timeout_ms)[0]
+
+
+_checked_until: Dict[str, datetime] = {}
+_checked_lock = threading.Lock()
+
+
+def ensure_current_partitions(table_name: str, months_ahead: int = 3, lock_timeout_ms: int = 1000):
+    """
+    ensure_monthly_partitions como mucho una vez al mes por proceso
+
+    Pensada para el camino de escritura (antes de una petición o del vaciado
+    de un buffer): tras la primera llamada del mes sólo compara una fecha. Si
+    alguna partición no se pudo crear se reintenta al cabo de un minuto. Los
+    errores se registran y no se propagan; mientras tanto las filas caen en la
+    partición DEFAULT y se mueven al crear la del mes.
+    """
+    now = datetime.utcnow()
+    if now < _checked_until.get(table_name, datetime.min):
+        return
+    with _checked_lock:
+        if now < _checked_until.get(table_name, datetime.min):
+            return
+        try:
+            if not is_postgres():
+                _checked_until[table_name] = datetime.max
+                return
+            skipped = _ensure_partitions(table_name, months_ahead, lock_timeout_ms)[1]
+        except Exception:
+            db.session.rollback()
+            logger.exception(f"Could not ensure partitions of {table_name}")
+            skipped = True
+        _checked_until[table_name] = now + timedelta(minutes=1) if skipped else next_month(month_start(now))
+
+
+def convert_to_partitioned(table, months_ahead: int = 3, keep_old: bool = False, lock_timeout_ms: int = 5000) -> Dict[str, object]:
+    """
+    Convierte una tabla existente sin particionar en la tabla particionada del modelo
+
+    En una sola transacción: renombra la tabla (y sus índices) a
+    <tabla>_unpartitioned, crea la tabla del modelo con su partición DEFAULT y
+    las mensuales que cubren los datos, copia las filas y elimina la antigua
+    (keep_old la conserva para verificarla). La tabla queda bloqueada durante
+    la copia y las claves foráneas nuevas bloquean las escrituras en las
+    tablas referenciadas: es una operación de mantenimiento para ejecutar
+    una sola vez, con la aplicación detenida o en horas sin tráfico.
+
+    Returns:
+        Resumen de la conversión; converted es False si no había nada que convertir
+    """
+    if not is_postgres():
+        return {'converted': False, 'reason': 'not postgresql'}
+
+    name = table.name
+    kind = _relkind(name)
+    if kind == 'p':
+        created = ensure_monthly_partitions(name, months_ahead, lock_timeout_ms)
+        return {'converted': False, 'reason': 'already partitioned', 'partitions_created': created}
+
+    connection = db.session.connection()
+    if kind is None:
+        table.create(bind=connection, checkfirst=True)
+        db.session.commit()
+        created = ensure_monthly_partitions(name, months_ahead, lock_timeout_ms)
+        return {'converted': False, 'reason': 'table created', 'partitions_created': created}
+
+    old = f"{name}_unpartitioned"
+    db.session.execute(text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}"))
+    db.session.execute(text(f"LOCK TABLE {name} IN ACCESS EXCLUSIVE MODE"))
+    first, last = db.session.execute(text(f"SELECT min(created_at)::timestamp, max(created_at)::timestamp FROM {name}")).one()
+
+    # Los nombres de índice son globales en el esquema: liberar los del modelo
+    indexes = db.session.execute(text(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE i.indrelid = to_regclass(:name)"
+    ), {'name': name}).scalars().all()
+    for index in indexes:
+        db.session.execute(text(f'ALTER INDEX "{index}" RENAME TO "{(index + "_unpartitioned")[:63]}"'))
+    db.session.execute(text(f"ALTER TABLE {name} RENAME TO {old}"))
+
+    table.create(bind=connection, checkfirst=True)
+    created = []
+    month = month_start(first or datetime.utcnow())
+    last_month = max(month_start(last or month), month_start(datetime.utcnow()))
+    for _ in range(months_ahead):
+        last_month = next_month(last_month)
+    while month <= last_month:
+        if _create_month_partition(name, month, lock_timeout_ms):
+            created.append(partition_name(name, month))
+        month = next_month(month)
+
+    columns = ", ".join(
+        column for column in db.session.execute(text(
+            "SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = :name"
+        ), {'name': old}).scalars()
+        if column in table.c
+    )
+    copied = db.session.execute(text(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {old}")).rowcount
+    if not keep_old:
+        db.session.execute(text(f"DROP TABLE {old}"))
+    db.session.commit()
+    return {
+        'converted': True,
+        'rows_copied': copied,
+        'partitions_created': created,
+        'old_table': old if keep_old else None,
+    }
+
+
+def drop_empty_partitions(table_name: str, cutoff: datetime, lock_timeout_ms: int = 1000) -> List[str]:
+    """
+    Elimina las particiones mensuales vacías cuyo rango completo es anterior a cutoff
+
+    DETACH PARTITION toma ACCESS EXCLUSIVE sobre la tabla padre y Postgres no
+    admite DETACH ... CONCURRENTLY cuando hay partición DEFAULT (las tablas
+    particionadas de la aplicación la tienen). Cada partición se desconecta
+    en su propia transacción: el bloqueo se pide con lock_timeout, para no
+    dejar encoladas las lecturas y escrituras detrás de una consulta larga,
+    y se retiene sólo durante la comprobación, el DETACH y el DROP de una
+    partición vacía (milisegundos). Si no se obtiene a tiempo, la partición
+    se omite y se vuelve a intentar en la siguiente ejecución.
+
+    Returns:
+        Nombres de las particiones eliminadas
+    """
+    if not is_postgres():
+        return []
+
+    partitions = db.session.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table AND c.relname LIKE :pattern"
+    ), {'table': table_name, 'pattern': f'{table_name}\\_____\\___'}).scalars().all()
+    db.session.commit()
+
+    dropped = []
+    for name in sorted(partitions):
+        try:
+            year, month = int(name[-7:-3]), int(name[-2:])
+        except ValueError:
+            continue
+        if next_month(datetime(year, month, 1)) > cutoff:
+            continue
+        try:
+            # Descartar sin bloquear las que tienen filas; se vuelve a comprobar con el bloqueo tomado
+            if db.session.execute(text(f"SELECT EXISTS (SELECT 1 FROM {name})")).scalar():
+                db.session.rollback()
+                continue
+            db.session.execute(text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}"))
+            db.session.execute(text(f"LOCK TABLE {table_name} IN ACCESS EXCLUSIVE MODE"))
+            if db.session.execute(text(f"SELECT EXISTS (SELECT 1 FROM {name})")).scalar():
+                db.session.rollback()
+                continue
+            db.session.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {name}"))
+            db.session.execute(text(f"DROP TABLE {name}"))
+            db.session.commit()
+            dropped.append(name)
+        except DBAPIError as e:
+            db.session.rollback()
+            logger.info(f"Skipped dropping partition {name}: {str(e.orig).strip()}")
+
+    return dropped
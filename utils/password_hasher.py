@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import bcrypt
+
+
+class HasherBusyError(Exception):
+    """El pool de hashing está lleno; la petición debe reintentarse más tarde"""
+
+
+class PasswordHasher:
+    """Hashing de contraseñas con bcrypt en un pool de hilos acotado
+
+    bcrypt libera el GIL, así que un pool de pocos hilos limita cuántos hashes
+    se calculan a la vez sin bloquear al resto de peticiones. Si ya hay
+    max_pending operaciones en curso o en espera, las nuevas se rechazan de
+    inmediato con HasherBusyError (control de admisión) en lugar de encolarse.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.rounds = 12
+        self.workers = max(1, (os.cpu_count() or 2) // 2)
+        self.max_pending = self.workers * 8
+        self.timeout = 10.0
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', self.rounds)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS') or self.workers
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING') or self.workers * 8
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        app.extensions['password_hasher'] = self
+
+    def hash(self, password: str) -> str:
+        """Hash bcrypt de la contraseña con el coste configurado"""
+        return self._submit(self._hash, password)
+
+    def hash_many(self, passwords: List[str], timeout: Optional[float] = None) -> List[str]:
+        """
+        Hashes de varias contraseñas para importaciones masivas
+
+        A diferencia de hash(), espera turno en lugar de rechazar, pero nunca
+        ocupa más de la mitad de los huecos del pool para no dejar sin servicio
+        a los registros y logins concurrentes. Si el lote completo no termina
+        en timeout segundos (por defecto el de una operación), cancela lo
+        pendiente y lanza HasherBusyError.
+        """
+        self._ensure_pool()
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        window = threading.Semaphore(max(1, self.max_pending // 2))
+        futures = []
+        try:
+            for password in passwords:
+                if not window.acquire(timeout=max(0, deadline - time.monotonic())):
+                    raise HasherBusyError()
+                if not self._slots.acquire(timeout=max(0, deadline - time.monotonic())):
+                    window.release()
+                    raise HasherBusyError()
+                future = self._executor.submit(self._hash, password)
+                future.add_done_callback(lambda _: (self._slots.release(), window.release()))
+                futures.append(future)
+            return [future.result(timeout=max(0, deadline - time.monotonic())) for future in futures]
+        except (HasherBusyError, FutureTimeoutError):
+            # Los cancelados también liberan su hueco (add_done_callback)
+            for future in futures:
+                future.cancel()
+            raise HasherBusyError()
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        """Compara la contraseña con un hash bcrypt"""
+        if not password_hash:
+            return False
+        return self._submit(self._verify, password, password_hash)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """True si el hash se generó con un coste distinto del configurado"""
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return False
+
+    def _hash(self, password: str) -> str:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=self.rounds)).decode('utf-8')
+
+    @staticmethod
+    def _verify(password: str, password_hash: str) -> bool:
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+        except ValueError:
+            # Hash con formato inválido
+            return False
+
+    def _submit(self, func, *args):
+        self._ensure_pool()
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusyError()
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # El hueco se libera al terminar el cálculo, aunque quien espera haya desistido
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise HasherBusyError()
+
+    def _ensure_pool(self):
+        if self._executor is not None:
+            return
+        with self._lock:
+            if self._executor is None:
+                self._slots = threading.BoundedSemaphore(self.max_pending)
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hasher')
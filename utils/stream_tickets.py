@@ -0,0 +1,55 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from extensions import db
+
+
+def _serializer() -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(current_app.config['JWT_SECRET_KEY'], salt='notifications-stream')
+
+
+def ticket_ttl() -> int:
+    return current_app.config.get('NOTIFICATIONS_STREAM_TICKET_TTL', 30)
+
+
+def issue_stream_ticket(user_id) -> str:
+    """
+    Ticket firmado para abrir el stream de notificaciones con EventSource
+
+    EventSource no permite enviar cabeceras, así que la credencial viaja en la
+    URL. En lugar del token de acceso se usa este ticket: sólo sirve para el
+    stream, caduca en NOTIFICATIONS_STREAM_TICKET_TTL segundos y se consume
+    al usarlo, de modo que lo que quede en logs o historiales ya no vale.
+    """
+    return _serializer().dumps({'sub': str(user_id), 'jti': uuid.uuid4().hex})
+
+
+def redeem_stream_ticket(ticket: Optional[str]) -> Optional[str]:
+    """
+    Valida y consume el ticket; retorna el id del usuario o None si no es válido
+
+    El consumo se registra en revoked_tokens (compartida entre procesos), así
+    que un ticket sólo abre un stream aunque se presente a otro worker.
+    """
+    from models.revoked_token import RevokedToken
+
+    if not ticket:
+        return None
+    ttl = ticket_ttl()
+    try:
+        payload = _serializer().loads(ticket, max_age=ttl)
+    except BadSignature:
+        return None
+
+    claimed = RevokedToken.claim(
+        jti=f"ticket:{payload['jti']}",
+        token_type=RevokedToken.STREAM_TICKET,
+        user_id=payload['sub'],
+        expires_at=datetime.utcnow() + timedelta(seconds=ttl),
+    )
+    db.session.commit()
+    return payload['sub'] if claimed else None
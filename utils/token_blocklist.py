@@ -0,0 +1,198 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Filtro de Bloom sobre un bytearray: sin falsos negativos, falsos positivos ~error_rate"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        # Doble hashing: k posiciones a partir de dos hashes independientes
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class TokenBlocklist:
+    """Revocación de JWT con la tabla revoked_tokens como fuente de verdad
+
+    Además de los jti revocados, se rechazan los tokens de usuarios
+    eliminados (o ya purgados) para que ninguna ruta tenga que comprobarlo.
+
+    Cada proceso mantiene un filtro de Bloom con los jti revocados. La
+    comprobación de cada petición autenticada sólo consulta la base de datos
+    cuando el filtro da positivo (token revocado o falso positivo). El filtro
+    se sincroniza de forma incremental cada sync_interval segundos y se
+    reconstruye cada rebuild_interval (o al llenarse) para olvidar tokens
+    expirados. Las revocaciones hechas en el propio proceso se ven al
+    instante; las de otros procesos, tras la siguiente sincronización.
+    """
+
+    # Margen al pedir revocaciones recientes, para no perder filas de transacciones que confirmaron tarde
+    SYNC_OVERLAP = timedelta(seconds=60)
+
+    def __init__(self, app=None, jwt=None):
+        self.app = None
+        self.capacity = 100000
+        self.error_rate = 0.001
+        self.sync_interval = 10.0
+        self.rebuild_interval = 3600.0
+        self._bloom: Optional[BloomFilter] = None
+        self._synced_at = 0.0
+        self._built_at = 0.0
+        self._watermark: Optional[datetime] = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, jwt)
+
+    def init_app(self, app, jwt=None):
+        self.app = app
+        self.capacity = app.config.get('TOKEN_BLOCKLIST_CAPACITY', self.capacity)
+        self.error_rate = app.config.get('TOKEN_BLOCKLIST_ERROR_RATE', self.error_rate)
+        self.sync_interval = app.config.get('TOKEN_BLOCKLIST_SYNC_INTERVAL', self.sync_interval)
+        self.rebuild_interval = app.config.get('TOKEN_BLOCKLIST_REBUILD_INTERVAL', self.rebuild_interval)
+        if jwt is not None:
+            jwt.token_in_blocklist_loader(self._token_in_blocklist)
+        app.extensions['token_blocklist'] = self
+
+    def _token_in_blocklist(self, jwt_header, jwt_payload) -> bool:
+        # Una cuenta eliminada invalida todos sus tokens, no sólo el que pidió el borrado
+        user_id = jwt_payload.get('sub')
+        return (
+            self.is_revoked(jwt_payload.get('jti'))
+            or self.is_revoked(self.user_key(user_id))
+            or not self.is_active_user(user_id)
+        )
+
+    @staticmethod
+    def user_key(user_id) -> Optional[str]:
+        """Entrada de revoked_tokens que revoca todos los tokens del usuario"""
+        return f'user:{user_id}' if user_id else None
+
+    @staticmethod
+    def is_active_user(user_id) -> bool:
+        """False si el usuario no existe o está marcado como eliminado (perfil del caché del proceso)"""
+        if not user_id:
+            return False
+        from utils.user_cache import get_user_profile
+        return get_user_profile(user_id) is not None
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        """True si el jti está revocado; sin consulta a la base de datos si el filtro da negativo"""
+        if not jti:
+            return False
+        self._sync_if_due()
+        bloom = self._bloom
+        if bloom is not None and jti not in bloom:
+            return False
+
+        from models.revoked_token import RevokedToken
+        return RevokedToken.is_revoked(jti)
+
+    def revoke(self, jwt_payload: dict):
+        """Revoca el token descrito por su payload (requiere commit de quien llama)"""
+        from models.revoked_token import RevokedToken
+
+        RevokedToken.revoke(
+            jti=jwt_payload['jti'],
+            token_type=jwt_payload.get('type', 'access'),
+            user_id=jwt_payload.get('sub'),
+            expires_at=datetime.utcfromtimestamp(jwt_payload['exp']) if jwt_payload.get('exp') else datetime.utcnow() + timedelta(days=30),
+        )
+        self._remember([jwt_payload['jti']])
+
+    def revoke_user(self, user_id, expires_in: timedelta):
+        """
+        Revoca todos los tokens del usuario (requiere commit de quien llama)
+
+        Se registra como una entrada más de revoked_tokens, de modo que los
+        demás procesos la reciben con la sincronización del filtro sin esperar
+        a que caduque su caché de perfiles. expires_in debe cubrir la vida del
+        token más largo (el de refresco).
+        """
+        from models.revoked_token import RevokedToken
+
+        key = self.user_key(user_id)
+        RevokedToken.revoke(jti=key, token_type='user', user_id=str(user_id), expires_at=datetime.utcnow() + expires_in)
+        self._remember([key])
+
+    def stats(self) -> dict:
+        bloom = self._bloom
+        return {
+            'entries': bloom.count if bloom else 0,
+            'capacity': bloom.capacity if bloom else self.capacity,
+            'bits': bloom.size if bloom else 0,
+            'hashes': bloom.hashes if bloom else 0,
+            'synced_seconds_ago': round(time.monotonic() - self._synced_at, 1) if self._synced_at else None,
+        }
+
+    def _remember(self, jtis: Iterable[str]):
+        bloom = self._bloom
+        if bloom is not None:
+            for jti in jtis:
+                bloom.add(jti)
+
+    def _sync_if_due(self):
+        now = time.monotonic()
+        if self._synced_at and now - self._synced_at < self.sync_interval:
+            return
+        # Un solo hilo sincroniza; el resto sigue con el filtro actual (sólo la primera carga espera)
+        if not self._lock.acquire(blocking=not self._synced_at):
+            return
+        try:
+            if self._synced_at and now - self._synced_at < self.sync_interval:
+                return
+            self._sync(now)
+        except Exception as e:
+            # Sin filtro, las comprobaciones van a la base de datos hasta el próximo intento
+            logger.error(f"Token blocklist sync failed: {str(e)}")
+        finally:
+            self._synced_at = now
+            self._lock.release()
+
+    def _sync(self, now: float):
+        from models.revoked_token import RevokedToken
+
+        watermark = RevokedToken.database_now()
+        bloom = self._bloom
+        rebuild = (
+            bloom is None
+            or now - self._built_at >= self.rebuild_interval
+            or bloom.count >= bloom.capacity
+        )
+        if rebuild:
+            jtis = RevokedToken.active_jtis()
+            bloom = BloomFilter(max(self.capacity, len(jtis) * 2), self.error_rate)
+            for jti in jtis:
+                bloom.add(jti)
+            self._bloom = bloom
+            self._built_at = now
+        else:
+            for jti in RevokedToken.active_jtis(self._watermark - self.SYNC_OVERLAP):
+                if jti not in bloom:
+                    bloom.add(jti)
+        self._watermark = watermark
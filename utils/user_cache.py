@@ -0,0 +1,148 @@
+import threading
+import time
+from typing import Optional
+
+from flask import g
+from flask_jwt_extended import get_jwt_identity
+
+from extensions import db
+from models.user import User
+from models.user_settings import UserSettings
+from schemas.user_settings_schema import user_settings_schema
+from utils.cache import TTLCache
+
+# Perfiles y configuraciones por proceso: {(tipo, user_id, versión): snapshot}
+_profiles = TTLCache(max_entries=10000)
+_ttl = 60
+# Versión de cada (tipo, user_id) invalidado: {(tipo, user_id): (versión, momento de la invalidación)}
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def init_app(app):
+    """Aplica USER_CACHE_TTL y USER_CACHE_MAX_ENTRIES; se llama una vez desde create_app"""
+    global _ttl
+    _ttl = app.config.get('USER_CACHE_TTL', _ttl)
+    _profiles.max_entries = app.config.get('USER_CACHE_MAX_ENTRIES', _profiles.max_entries)
+
+
+def _version(kind: str, user_id: str) -> int:
+    with _versions_lock:
+        return _versions.get((kind, user_id), (0, None))[0]
+
+
+def _invalidate(kind: str, user_id):
+    # Subir la versión deja inservible una carga en curso con los datos anteriores
+    user_id = str(user_id)
+    now = time.monotonic()
+    with _versions_lock:
+        version = _versions.pop((kind, user_id), (0, None))[0]
+        _versions[(kind, user_id)] = (version + 1, now)
+        if len(_versions) > _profiles.max_entries:
+            _prune_versions(now)
+    _profiles.invalidate((kind, user_id, version))
+
+
+def _prune_versions(now: float):
+    # Pasado el TTL (más lo que puede tardar una carga) ninguna entrada de una versión anterior
+    # sigue vigente, así que el usuario puede volver a la versión 0 sin servir datos viejos
+    horizon = now - _ttl - _profiles.wait_timeout
+    for key, (_, invalidated_at) in list(_versions.items()):
+        if invalidated_at >= horizon:
+            # Orden de inserción: el resto se invalidó después
+            break
+        del _versions[key]
+
+
+def _cached(kind: str, user_id, loader):
+    user_id = str(user_id)
+    return _profiles.get(
+        (kind, user_id, _version(kind, user_id)),
+        lambda: loader(user_id),
+        ttl=_ttl,
+        cacheable=lambda value: value is not None,
+    )
+
+
+def _snapshot(user: User) -> dict:
+    """Copia desacoplada de la sesión con las columnas del usuario (sin password_hash)"""
+    return {
+        column.name: getattr(user, column.name)
+        for column in User.__table__.columns
+        if column.name != 'password_hash'
+    }
+
+
+def _load_profile(user_id: str) -> Optional[dict]:
+    user = db.session.get(User, user_id)
+    if user is None or user.deleted_at is not None:
+        return None
+    return _snapshot(user)
+
+
+def get_user_profile(user_id) -> Optional[dict]:
+    """
+    Perfil del usuario desde el caché del proceso, cargándolo si hace falta
+
+    Retorna un dict con las columnas del usuario (sin password_hash), apto para
+    user_response_schema.dump, o None si el usuario no existe. Los usuarios
+    inexistentes no se cachean.
+    """
+    return _cached('profile', user_id, _load_profile)
+
+
+def invalidate_user_profile(user_id):
+    """
+    Descarta el perfil cacheado tras modificar o eliminar al usuario
+
+    Sube la versión del usuario: una carga que estuviera en curso con los datos
+    anteriores queda guardada bajo la versión vieja y ya no se sirve.
+    """
+    _invalidate('profile', user_id)
+
+
+def _load_settings(user_id: str) -> dict:
+    return user_settings_schema.dump(UserSettings.get_or_create(user_id))
+
+
+def cached_user_settings(user_id) -> dict:
+    """
+    Configuraciones del usuario (dump de user_settings_schema) desde el caché del proceso
+
+    Si el usuario aún no tiene configuraciones se crean con los valores por
+    defecto la primera vez que se cargan.
+    """
+    return _cached('settings', user_id, _load_settings)
+
+
+def invalidate_user_settings(user_id):
+    """Descarta las configuraciones cacheadas tras crearlas, modificarlas o eliminarlas"""
+    _invalidate('settings', user_id)
+
+
+def current_user_profile() -> Optional[dict]:
+    """Perfil del usuario del token; se resuelve una sola vez por petición"""
+    if 'current_user_profile' not in g:
+        g.current_user_profile = get_user_profile(get_jwt_identity())
+    return g.current_user_profile
+
+
+def current_user_record() -> Optional[User]:
+    """Instancia ORM del usuario del token, para las rutas que lo modifican; una consulta por petición"""
+    if 'current_user_record' not in g:
+        user = db.session.get(User, get_jwt_identity())
+        g.current_user_record = user if user is not None and user.deleted_at is None else None
+    return g.current_user_record
+
+
+def current_user_is_admin() -> bool:
+    """
+    Indica si el usuario del token es admin, leyendo el privilegio de la base de datos
+
+    La autorización no usa el perfil cacheado: las invalidaciones sólo
+    alcanzan al proceso que hizo el cambio y un admin degradado o eliminado
+    conservaría sus permisos en los demás workers hasta que venciera el TTL.
+    """
+    user = current_user_record()
+    return user is not None and user.privilege == User.PRIVILEGE_ADMIN
+